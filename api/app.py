@@ -35,6 +35,8 @@ from .patterns.observer import (
     UsuarioObserver,
     CoinReceivedObserver,
     RentalDueObserver,
+    AvailabilityObserver,
+    TrendingObserver,
 )
 from .patterns.pricing_strategy import PrecificacaoStrategy, PorRecorrencia, PorTempo
 from .patterns.singleton import SistemaEconomia
@@ -43,9 +45,79 @@ from .patterns.state import EstadoLivro, Disponivel, Alugado, Reservado
 # Facade
 from .services.saber_facade import SaberFacade
 
+# Recomendador (scripts/getRecommendations.py) e o cache das respostas
+from scripts.availability import AvailabilityIndex
+from scripts.config import RecommenderConfig
+from scripts.getRecommendations import RecommenderEngine
+from .services.recommendation_cache import RecommendationCache
+from .services.recommendation_executor import RecommendationExecutor
+from .services.recommendation_service import RecommendationService
+from .services.trending import TrendingCounter
+
 # Blueprints / rotas
 from .routes.user_routes import user_bp
 from .routes.book_routes import book_bp
+from .routes.recommendation_routes import recommendation_bp
+
+
+def create_availability_index(app):
+    """
+    Exemplares disponíveis por ISBN para o filtro do recomendador: o estado
+    inicial é lido da tabela books no primeiro uso e, depois, acompanhado pelo
+    AvailabilityObserver (eventos do mediador).
+    """
+
+    def carregar():
+        with app.app_context():
+            return (
+                db.session.query(Book.id, Book.ISBN, Book._estado_nome)
+                .filter(Book.ISBN.isnot(None))
+                .all()
+            )
+
+    return AvailabilityIndex(loader=carregar)
+
+
+def create_recommendation_service(app, availability=None):
+    """
+    Motor de recomendação (carregado no primeiro pedido) + cache LRU/TTL.
+    RECOMMENDER_DB_PATH, RECOMMENDER_ARTIFACTS_DIR e RECOMMENDER_REFRESH_INTERVAL
+    na config da app sobrescrevem os valores de RecommenderConfig. Versões novas
+    dos artefatos (python -m scripts.publish_artifacts) são trocadas a quente.
+    Com RECOMMENDER_EXECUTOR_WORKERS > 0, o cálculo roda num pool de processos
+    com prazo por pedido (RECOMMENDER_EXECUTOR_DEADLINE). Com `availability`,
+    só livros com exemplar disponível são recomendados.
+    """
+    overrides = {
+        key[len("RECOMMENDER_"):]: app.config[key]
+        for key in (
+            "RECOMMENDER_DB_PATH",
+            "RECOMMENDER_ARTIFACTS_DIR",
+            "RECOMMENDER_REFRESH_INTERVAL",
+        )
+        if app.config.get(key) is not None
+    }
+    config = RecommenderConfig.with_overrides(**overrides)
+    cache = RecommendationCache(
+        maxsize=app.config.get("RECOMMENDER_CACHE_SIZE", 1024),
+        ttl=app.config.get("RECOMMENDER_CACHE_TTL", 300),
+    )
+    executor = None
+    workers = app.config.get("RECOMMENDER_EXECUTOR_WORKERS", 0)
+    if workers > 0:
+        executor = RecommendationExecutor(
+            config,
+            workers=workers,
+            deadline=app.config.get("RECOMMENDER_EXECUTOR_DEADLINE", 0.5),
+            max_pending=app.config.get("RECOMMENDER_EXECUTOR_MAX_PENDING", 0),
+        )
+    return RecommendationService(
+        RecommenderEngine(config),
+        cache,
+        engine_factory=lambda version: RecommenderEngine(config, version=version),
+        executor=executor,
+        availability=availability,
+    )
 
 
 def create_app(config_class=None):
@@ -83,6 +155,19 @@ def create_app(config_class=None):
     sms_factory = SMSFactory()
     notification_subject.attach(CoinReceivedObserver(email_factory))
     notification_subject.attach(RentalDueObserver(email_factory))
+    availability = None
+    if app.config.get("RECOMMENDER_SOMENTE_DISPONIVEIS"):
+        availability = create_availability_index(app)
+        notification_subject.attach(AvailabilityObserver(availability))
+    trending = TrendingCounter(
+        half_life=app.config.get("TRENDING_HALF_LIFE", 86400),
+        top_k=app.config.get("TRENDING_TOP_K", 50),
+        snapshot_path=app.config.get("TRENDING_SNAPSHOT_PATH") or None,
+        snapshot_interval=app.config.get("TRENDING_SNAPSHOT_INTERVAL", 60),
+    )
+    notification_subject.attach(
+        TrendingObserver(trending, app.config.get("TRENDING_PESO_RESERVA", 0.5))
+    )
 
     default_pricing_strategy: PrecificacaoStrategy = PorTempo(cfg_instance)
 
@@ -95,10 +180,15 @@ def create_app(config_class=None):
     app.facade = facade
     app.db = db
     app.sistema_economia = sistema_economia
+    # O motor atual fica em app.recommendation_service.engine (trocado a cada versão publicada)
+    app.availability = availability
+    app.trending = trending
+    app.recommendation_service = create_recommendation_service(app, availability)
 
     # --- Registro de blueprints ---
     app.register_blueprint(user_bp, url_prefix="/api")
     app.register_blueprint(book_bp, url_prefix="/api")
+    app.register_blueprint(recommendation_bp, url_prefix="/api")
 
     @app.route("/")
     def index():
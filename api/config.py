@@ -47,6 +47,51 @@ class Configuration:
             os.environ.get("RENTAL_PERIOD_DAYS", 7)
         )  # Período de aluguel em dias (padrão 7 dias)
 
+        # Cache das recomendações servidas pela API
+        self.RECOMMENDER_CACHE_SIZE = int(
+            os.environ.get("RECOMMENDER_CACHE_SIZE", 1024)
+        )  # Nº máximo de respostas guardadas
+        self.RECOMMENDER_CACHE_TTL = float(
+            os.environ.get("RECOMMENDER_CACHE_TTL", 300)
+        )  # Validade de cada resposta, em segundos
+
+        # Pool de processos que calcula as recomendações (0 = no próprio processo).
+        # Cada processo carrega o próprio motor: ligar só onde há CPUs sobrando
+        self.RECOMMENDER_EXECUTOR_WORKERS = int(
+            os.environ.get("RECOMMENDER_EXECUTOR_WORKERS", 0)
+        )  # Nº de processos do pool
+        self.RECOMMENDER_EXECUTOR_DEADLINE = float(
+            os.environ.get("RECOMMENDER_EXECUTOR_DEADLINE", 0.5)
+        )  # Prazo de cada pedido, em segundos; depois disso responde com os populares
+        self.RECOMMENDER_EXECUTOR_MAX_PENDING = int(
+            os.environ.get("RECOMMENDER_EXECUTOR_MAX_PENDING", 0)
+        )  # Cálculos simultâneos antes de recusar (0 = 2 por processo)
+
+        # Só recomenda livros com exemplar disponível para aluguel na tabela books.
+        # Desligado por padrão: com o acervo físico vazio ou sem ISBN, as
+        # recomendações sairiam vazias
+        self.RECOMMENDER_SOMENTE_DISPONIVEIS = (
+            os.environ.get("RECOMMENDER_SOMENTE_DISPONIVEIS", "False") == "True"
+        )
+
+        # Livros em alta (GET /api/books/trending): contadores de aluguéis e reservas
+        # com decaimento exponencial, gravados periodicamente para sobreviver a reinícios
+        self.TRENDING_HALF_LIFE = float(
+            os.environ.get("TRENDING_HALF_LIFE", 86400)
+        )  # Meia-vida dos contadores, em segundos
+        self.TRENDING_TOP_K = int(
+            os.environ.get("TRENDING_TOP_K", 50)
+        )  # Livros mantidos no ranking (máximo de n)
+        self.TRENDING_PESO_RESERVA = float(
+            os.environ.get("TRENDING_PESO_RESERVA", 0.5)
+        )  # Peso de uma reserva (um aluguel vale 1)
+        self.TRENDING_SNAPSHOT_PATH = os.environ.get(
+            "TRENDING_SNAPSHOT_PATH", os.path.join(PATH, "..", "bd", "trending.json")
+        )  # Arquivo dos snapshots (vazio = só em memória)
+        self.TRENDING_SNAPSHOT_INTERVAL = float(
+            os.environ.get("TRENDING_SNAPSHOT_INTERVAL", 60)
+        )  # Intervalo mínimo entre gravações, em segundos
+
         # Outras configurações (expanda conforme necessário)
         self.APP_NAME = "SaberIFPB"
         self.DEBUG = os.environ.get("FLASK_DEBUG", "False") == "True"
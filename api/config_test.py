@@ -17,3 +17,16 @@ class TestingConfig(Configuration):
     DEPOSIT_COINS = 10              # quantas moedas concede ao depositar um livro
     PENALTY_COINS_PER_DAY = 1       # penalidade por dia de atraso
     RENTAL_PERIOD_DAYS = 7          # duração padrão do aluguel
+
+    # Para o cache de recomendações
+    RECOMMENDER_CACHE_SIZE = 16
+    RECOMMENDER_CACHE_TTL = 60
+
+    # Recomendações calculadas no próprio processo (sem pool)
+    RECOMMENDER_EXECUTOR_WORKERS = 0
+
+    # Sem filtro de disponibilidade (o banco de testes começa sem livros)
+    RECOMMENDER_SOMENTE_DISPONIVEIS = False
+
+    # Livros em alta só em memória
+    TRENDING_SNAPSHOT_PATH = None
@@ -148,8 +148,9 @@ class BibliotecaMediator:
                 book.alterarEstado(
                     "reservado"
                 )  # Livro agora reservado para o próximo usuário
+                # Evento próprio: a reserva já foi contada quando foi feita
                 self.notification_subject.notify(
-                    "book_reserved", book=book, user=reserved_user
+                    "reservation_fulfilled", book=book, user=reserved_user
                 )
             else:
                 book.reserved_by_id = None  # Limpa reserva inválida
@@ -187,6 +188,7 @@ class BibliotecaMediator:
             amount=deposit_coins,
             source_user=system_user,
         )
+        self.notification_subject.notify("book_deposited", book=book, user=depositor)
         return book, "Livro depositado e moedas concedidas."
 
     def calcularPenalizacao(self, book: Book, user: User):
@@ -265,9 +267,11 @@ class BibliotecaMediator:
     def _execute_reservation(self, book: Book, user: User):
         """Método interno para completar o processo de reserva após a validação do estado."""
         book.reserved_by_id = user.id
-        book.alterarEstado(
-            "reservado"
-        )  # O objeto de estado pode mudar isso, mas garante que o estado da string reflita
+        # Livro alugado continua "alugado" até a devolução ativar a reserva (_execute_return)
+        if book.rentee_id is None:
+            book.alterarEstado(
+                "reservado"
+            )  # O objeto de estado pode mudar isso, mas garante que o estado da string reflita
         self.db.session.commit()
         self.notification_subject.notify("book_reserved", book=book, user=user)
         return book, "Livro reservado com sucesso."
@@ -97,6 +97,12 @@ class RentalDueObserver(Observer):
             message = f"Você reservou o livro '{book.titulo}'."
             notification = self.notifier_factory.criarNotificacao(user.nome, message)
             notification.enviar()
+        elif event == "reservation_fulfilled":
+            book = kwargs.get("book")
+            user = kwargs.get("user")
+            message = f"O livro '{book.titulo}' que você reservou foi devolvido e está separado para você."
+            notification = self.notifier_factory.criarNotificacao(user.nome, message)
+            notification.enviar()
         elif event == "penalty_applied":
             user = kwargs.get("user")
             penalty_amount = kwargs.get("penalty_amount")
@@ -104,3 +110,52 @@ class RentalDueObserver(Observer):
             message = f"Penalização de {penalty_amount} moedas aplicada pelo atraso na devolução do livro '{book.titulo}'."
             notification = self.notifier_factory.criarNotificacao(user.nome, message)
             notification.enviar()
+
+
+class AvailabilityObserver(Observer):
+    """
+    Mantém o AvailabilityIndex do recomendador a partir das transições dos livros:
+    a cada depósito, aluguel, devolução ou reserva (feita ou atendida), o estado atual do livro (já
+    gravado pelo mediador) atualiza os exemplares disponíveis do ISBN.
+    """
+
+    EVENTOS = (
+        "book_deposited",
+        "book_rented",
+        "book_returned",
+        "book_reserved",
+        "reservation_fulfilled",
+    )
+
+    def __init__(self, availability):
+        self.availability = availability
+
+    def update(self, subject, event: str, *args, **kwargs):
+        if event in self.EVENTOS:
+            book = kwargs.get("book")
+            if book is not None:
+                self.availability.update(
+                    book.id, book.ISBN, book._estado_nome == "disponivel"
+                )
+
+
+class TrendingObserver(Observer):
+    """
+    Alimenta o TrendingCounter (livros em alta) com os aluguéis e as reservas.
+    Cada reserva conta uma vez, quando é feita (book_reserved); a devolução que a
+    atende emite reservation_fulfilled, que não entra no contador.
+    """
+
+    def __init__(self, trending, peso_reserva=0.5):
+        self.trending = trending
+        self.peso_reserva = peso_reserva  # um aluguel vale 1
+
+    def update(self, subject, event: str, *args, **kwargs):
+        if event in ("book_rented", "book_reserved"):
+            book = kwargs.get("book")
+            if book is not None:
+                self.trending.add(
+                    book.id,
+                    {"titulo": book.titulo, "autor": book.autor, "ISBN": book.ISBN},
+                    peso=1.0 if event == "book_rented" else self.peso_reserva,
+                )
@@ -33,7 +33,17 @@ def deposit_book_route():
         return jsonify({"error": "ID do depositante deve ser um número inteiro"}), 400
 
     facade = get_facade()
-    book, message = facade.depositarLivro(titulo, autor, depositor_id, categoria_nome)
+    book, message = facade.depositarLivro(
+        titulo,
+        autor,
+        depositor_id,
+        categoria_nome,
+        ISBN=ISBN,
+        resumo=resumo,
+        capa=capa,
+        ano_publicacao=ano_publicacao,
+        paginas=paginas,
+    )
     if book:
         return (
             jsonify(
@@ -84,6 +94,19 @@ def list_books_route():
     return jsonify(book_list)
 
 
+@book_bp.route("/books/trending", methods=["GET"])
+def trending_books_route():
+    # Ranking mantido em memória pelo TrendingObserver: nenhuma consulta ao banco
+    trending = current_app.trending
+    try:
+        n = int(request.args.get("n", 10))
+    except ValueError:
+        return jsonify({"error": "Parâmetro n deve ser um número inteiro"}), 400
+    if n < 1 or n > trending.top_k:
+        return jsonify({"error": f"Parâmetro n deve estar entre 1 e {trending.top_k}"}), 400
+    return jsonify(trending.top(n))
+
+
 @book_bp.route("/books/<book_id>/rent", methods=["POST"])
 def rent_book_route(book_id):
     data = request.json
@@ -0,0 +1,85 @@
+import sqlite3
+
+from flask import Blueprint, request, jsonify, current_app
+
+recommendation_bp = Blueprint("recommendation_bp", __name__)
+
+MAX_RECOMENDACOES = 100
+
+
+def get_recommendation_service():
+    return current_app.recommendation_service
+
+
+def parse_n():
+    """Lê o parâmetro n da query string; retorna (n, resposta de erro ou None)."""
+    try:
+        n = int(request.args.get("n", 10))
+    except ValueError:
+        return None, (jsonify({"error": "Parâmetro n deve ser um número inteiro"}), 400)
+    if n < 1 or n > MAX_RECOMENDACOES:
+        return None, (
+            jsonify({"error": f"Parâmetro n deve estar entre 1 e {MAX_RECOMENDACOES}"}),
+            400,
+        )
+    return n, None
+
+
+@recommendation_bp.route("/users/<int:user_id>/recomendacoes", methods=["GET"])
+def get_recomendacoes(user_id):
+    n, erro = parse_n()
+    if erro:
+        return erro
+
+    # Filtro opcional pela bibliografia do curso/semestre
+    curso = request.args.get("curso")
+    semestre = request.args.get("semestre")
+    if semestre is not None:
+        if curso is None:
+            return jsonify({"error": "Informe o curso junto com o semestre"}), 400
+        try:
+            semestre = int(semestre)
+        except ValueError:
+            return jsonify({"error": "Semestre deve ser um número inteiro"}), 400
+
+    service = get_recommendation_service()
+    try:
+        recomendacoes = service.recomendar(user_id, n, curso=curso, semestre=semestre)
+    except sqlite3.Error as e:
+        return jsonify({"error": f"Recomendador indisponível: {str(e)}"}), 503
+    return jsonify(recomendacoes)
+
+
+@recommendation_bp.route("/books/<isbn>/similares", methods=["GET"])
+def get_similares(isbn):
+    n, erro = parse_n()
+    if erro:
+        return erro
+
+    service = get_recommendation_service()
+    try:
+        similares = service.similares(isbn, n)
+    except sqlite3.Error as e:
+        return jsonify({"error": f"Recomendador indisponível: {str(e)}"}), 503
+    if similares is None:
+        return jsonify({"error": "Livro não encontrado"}), 404
+    return jsonify(similares)
+
+
+@recommendation_bp.route("/books/populares", methods=["GET"])
+def get_populares():
+    n, erro = parse_n()
+    if erro:
+        return erro
+
+    service = get_recommendation_service()
+    try:
+        populares = service.populares(n, categoria=request.args.get("categoria"))
+    except sqlite3.Error as e:
+        return jsonify({"error": f"Recomendador indisponível: {str(e)}"}), 503
+    return jsonify(populares)
+
+
+@recommendation_bp.route("/recomendacoes/metricas", methods=["GET"])
+def get_metricas():
+    return jsonify(get_recommendation_service().metricas())
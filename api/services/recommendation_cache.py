@@ -0,0 +1,73 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class RecommendationCache:
+    """
+    Cache LRU com expiração (TTL) para as respostas de recomendação.
+
+    As chaves são tuplas que começam pelo id do usuário, por exemplo
+    (user_id, n, versao_das_notas), o que permite invalidar de uma vez todas
+    as entradas de um usuário quando as notas dele mudam.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()  # chave -> (expira_em, valor)
+        self._by_user = {}  # user_id -> chaves desse usuário
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    self._remove(key)
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value):
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._by_user.setdefault(key[0], set()).add(key)
+            while len(self._data) > self.maxsize:
+                self._remove(next(iter(self._data)))
+
+    def _remove(self, key):
+        self._data.pop(key, None)
+        keys = self._by_user.get(key[0])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_user[key[0]]
+
+    def invalidate_user(self, user_id):
+        """Remove todas as entradas do usuário."""
+        with self._lock:
+            for key in list(self._by_user.get(user_id, ())):
+                self._remove(key)
+
+    def invalidate_users(self, user_ids):
+        """Remove as entradas dos usuários informados; `None` limpa o cache inteiro."""
+        if user_ids is None:
+            self.clear()
+            return
+        for user_id in user_ids:
+            self.invalidate_user(user_id)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._by_user.clear()
+
+    def __len__(self):
+        return len(self._data)
@@ -0,0 +1,194 @@
+import multiprocessing
+import shutil
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+from scripts.availability import AvailabilityIndex, load_available, save_available
+from scripts.batch_recommendations import LoteRecomendacoes
+from scripts.getRecommendations import RecommenderEngine
+
+# --- Lado do worker ---
+# Cada processo do pool mantém o próprio RecommenderEngine (os artefatos são
+# abertos em memory-map, então as páginas ficam compartilhadas pelo SO); as
+# tarefas só levam a versão dos artefatos e os parâmetros do pedido (e, com o
+# filtro de disponibilidade, a versão do AvailabilityIndex: os ISBNs disponíveis
+# dessa versão são lidos em memory-map do diretório do executor e aplicados a
+# uma réplica local só quando a versão muda).
+
+_worker = {}
+
+
+def _iniciar_worker(config, diretorio_disponibilidade):
+    _worker["config"] = config
+    _worker["engine"] = None
+    _worker["version"] = None
+    _worker["lote"] = LoteRecomendacoes(config.DB_PATH, config.REFRESH_INTERVAL)
+    _worker["diretorio"] = diretorio_disponibilidade
+    _worker["disponibilidade"] = AvailabilityIndex()
+
+
+def _recomendar(version, user_id, n, curso, semestre, disponibilidade=None):
+    # Versão publicada nova (troca a quente no processo principal): outro motor
+    if _worker["engine"] is None or _worker["version"] != version:
+        _worker["engine"] = RecommenderEngine(_worker["config"], version=version)
+        _worker["version"] = version
+    engine = _worker["engine"]
+    if disponibilidade is None:
+        engine.set_availability(None)
+    else:
+        replica = _worker["disponibilidade"]
+        if replica.version != disponibilidade:
+            snapshot = load_available(_worker["diretorio"], disponibilidade)
+            if snapshot is not None:
+                replica.replace(*snapshot)
+        if engine.disponibilidade is None:
+            engine.set_availability(replica)
+    if curso is None:
+        recomendacoes = _worker["lote"].get(engine, user_id, n)
+        if recomendacoes is not None:
+            return recomendacoes
+    return engine.recomendar(user_id, top_n=n, curso=curso, semestre=semestre)
+
+
+class RecommendationExecutor:
+    """
+    Executa o cálculo das recomendações num pool de processos limitado, com prazo
+    por pedido.
+
+    Nenhum pedido fica na fila: com `max_pending` cálculos em andamento o pedido é
+    recusado na hora (sobrecarga), e quem passa do `deadline` deixa de esperar
+    (timeout). Nos dois casos `run` devolve None e quem chamou responde com outra
+    coisa (o ranking de popularidade); o cálculo que estourou o prazo continua no
+    worker e o resultado ainda é entregue a `on_result` (o cache) quando terminar.
+
+    Sem filtro de curso, o worker tenta primeiro o lote pré-calculado
+    (LoteRecomendacoes), então a leitura da tabela também respeita o prazo.
+    """
+
+    def __init__(self, config, workers=2, deadline=0.5, max_pending=0):
+        self.config = config
+        self.workers = workers
+        self.deadline = deadline
+        self.max_pending = max_pending or 2 * workers
+        self._pool = None
+        self._lock = threading.Lock()
+        # Snapshots da disponibilidade lidos pelos workers (save_available)
+        self._diretorio = None
+        self._disponibilidade_publicada = None
+
+        # Contadores expostos em stats()
+        self.pending = 0  # cálculos em andamento no pool (profundidade da fila)
+        self.requests = 0
+        self.completed = 0
+        self.timeouts = 0
+        self.overloads = 0
+        self.errors = 0
+        self.fallbacks = 0  # pedidos que voltaram sem resultado (sobrecarga, timeout, pool quebrado)
+
+    def _get_pool(self):
+        if self._pool is None:
+            # spawn: o processo da API tem threads (servidor, timers do motor) e um
+            # fork no meio delas pode herdar locks presos
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_iniciar_worker,
+                initargs=(self.config, self._diretorio),
+            )
+        return self._pool
+
+    def _publicar(self, disponibilidade):
+        """
+        Grava o snapshot do AvailabilityIndex se a versão dele mudou e devolve a
+        versão, que é o que vai na tarefa.
+        """
+        if disponibilidade.version != self._disponibilidade_publicada:
+            versao, isbns = disponibilidade.snapshot()
+            save_available(self._diretorio, versao, isbns)
+            self._disponibilidade_publicada = versao
+        return self._disponibilidade_publicada
+
+    def run(
+        self, version, user_id, n, curso=None, semestre=None, on_result=None, disponibilidade=None
+    ):
+        """
+        Recomendações calculadas no pool dentro do prazo, ou None se o pool está
+        cheio, o prazo estourou ou o pool quebrou (worker morto). `disponibilidade`
+        é o AvailabilityIndex, se houver filtro.
+        """
+        with self._lock:
+            self.requests += 1
+            if self.pending >= self.max_pending:
+                self.overloads += 1
+                self.fallbacks += 1
+                return None
+            self.pending += 1
+            if self._diretorio is None:
+                self._diretorio = tempfile.mkdtemp(prefix="disponibilidade-")
+            if disponibilidade is not None:
+                disponibilidade = self._publicar(disponibilidade)
+            try:
+                future = self._get_pool().submit(
+                    _recomendar, version, user_id, n, curso, semestre, disponibilidade
+                )
+            except BrokenProcessPool:
+                self.pending -= 1
+                self.errors += 1
+                self.fallbacks += 1
+                self._pool = None  # recriado no próximo pedido
+                return None
+        future.add_done_callback(lambda f: self._done(f, on_result))
+        try:
+            return future.result(timeout=self.deadline)
+        except FutureTimeoutError:
+            with self._lock:
+                self.timeouts += 1
+                self.fallbacks += 1
+            return None
+        except BrokenProcessPool:
+            with self._lock:
+                self.fallbacks += 1
+            return None
+
+    def _done(self, future, on_result):
+        with self._lock:
+            self.pending -= 1
+            erro = None if future.cancelled() else future.exception()
+            if future.cancelled() or erro is not None:
+                self.errors += 1
+                if isinstance(erro, BrokenProcessPool):
+                    self._pool = None
+                return
+            self.completed += 1
+        if on_result is not None:
+            on_result(future.result())
+
+    def stats(self):
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "deadline": self.deadline,
+                "max_pending": self.max_pending,
+                "pending": self.pending,
+                "requests": self.requests,
+                "completed": self.completed,
+                "timeouts": self.timeouts,
+                "overloads": self.overloads,
+                "errors": self.errors,
+                "fallbacks": self.fallbacks,
+                "fallback_rate": self.fallbacks / self.requests if self.requests else 0.0,
+            }
+
+    def shutdown(self, wait=True):
+        """Encerra o pool (com `wait`, espera os cálculos em andamento terminarem)."""
+        with self._lock:
+            pool, self._pool = self._pool, None
+            diretorio, self._diretorio = self._diretorio, None
+            self._disponibilidade_publicada = None
+        if pool is not None:
+            pool.shutdown(wait=wait)
+        if diretorio is not None:
+            shutil.rmtree(diretorio, ignore_errors=True)
@@ -0,0 +1,183 @@
+import threading
+import time
+
+from api.services.recommendation_cache import RecommendationCache
+from scripts.artifacts import current_version
+from scripts.batch_recommendations import LoteRecomendacoes
+
+
+class RecommendationService:
+    """
+    Serve as recomendações do RecommenderEngine com cache por versão das notas.
+
+    Com `engine_factory(versao)`, o serviço também acompanha a versão publicada dos
+    artefatos (ARTIFACTS_DIR/CURRENT): quando o ponteiro muda, o motor da versão
+    nova é criado e carregado numa thread e só então substitui o atual, numa
+    única atribuição. Os pedidos em andamento terminam no motor antigo e nenhum
+    pedido espera pela carga.
+
+    Com `executor` (RecommendationExecutor), o cálculo roda no pool de processos
+    com prazo; se o pool está cheio ou o prazo estoura, a resposta é o ranking de
+    popularidade do usuário (fora do cache) e a resposta completa entra no cache
+    quando o worker terminar. Nesse modo a thread do pedido não toca no banco: a
+    leitura do lote vai para o worker, e a conferência da versão dos dados do
+    motor (refresh) roda numa thread em segundo plano, no máximo a cada
+    REFRESH_INTERVAL segundos.
+
+    Sem filtros, a resposta vem primeiro da tabela Recomendacoes (lote de
+    python -m scripts.batch_recommendations), se o lote foi gerado com os mesmos
+    artefatos e catálogo que o motor tem carregados e o usuário não tem notas
+    novas desde então (LoteRecomendacoes); senão é calculada.
+
+    Com `availability` (AvailabilityIndex), todo motor do serviço só recomenda
+    livros com exemplar disponível; a versão da disponibilidade entra na chave do
+    cache, então um aluguel ou devolução não serve respostas com o acervo antigo.
+    """
+
+    def __init__(
+        self,
+        engine,
+        cache: RecommendationCache,
+        engine_factory=None,
+        executor=None,
+        availability=None,
+    ):
+        self.engine = engine
+        self.cache = cache
+        self.engine_factory = engine_factory
+        self.executor = executor
+        self.availability = availability
+        if availability is not None:
+            engine.set_availability(availability)
+        if executor is not None:
+            engine.refresh_on_read = False
+        self._swap_lock = threading.Lock()
+        self._loading = None  # versão sendo carregada em segundo plano
+        self._checked_at = 0.0
+        self._refreshing = False  # refresh em segundo plano em andamento (com executor)
+        self._refreshed_at = 0.0
+        self.lote = LoteRecomendacoes(engine.config.DB_PATH, engine.config.REFRESH_INTERVAL)
+        # Notas novas ou alteradas de um usuário invalidam as entradas dele
+        engine.add_listener(cache.invalidate_users)
+
+    def check_version(self, background=True):
+        """
+        Confere CURRENT (no máximo a cada REFRESH_INTERVAL segundos) e, se mudou,
+        troca o motor pelo da versão nova; `background=False` carrega na hora.
+        """
+        engine = self.engine
+        if self.engine_factory is None:
+            return
+        agora = time.monotonic()
+        if background and agora - self._checked_at < engine.config.REFRESH_INTERVAL:
+            return
+        self._checked_at = agora
+        versao = current_version(engine.config.ARTIFACTS_DIR)
+        if versao is None or versao == engine.version:
+            return
+        with self._swap_lock:
+            if self._loading is not None:
+                return
+            self._loading = versao
+        if background:
+            threading.Thread(target=self._swap, args=(versao,), daemon=True).start()
+        else:
+            self._swap(versao)
+
+    def _swap(self, versao):
+        try:
+            novo = self.engine_factory(versao)
+            if self.availability is not None:
+                novo.set_availability(self.availability)
+            if self.executor is not None:
+                novo.refresh_on_read = False
+            novo.refresh()  # tudo carregado antes de receber pedidos
+            novo.add_listener(self.cache.invalidate_users)
+            self.engine = novo
+            # As chaves levam a versão; limpar só libera as respostas do modelo antigo
+            self.cache.clear()
+        finally:
+            with self._swap_lock:
+                self._loading = None
+
+    def refresh_in_background(self):
+        """
+        Com executor: confere a versão dos dados do motor numa thread (uma por vez,
+        no máximo a cada REFRESH_INTERVAL segundos), sem segurar o pedido.
+        """
+        engine = self.engine
+        agora = time.monotonic()
+        if agora - self._refreshed_at < engine.config.REFRESH_INTERVAL:
+            return
+        with self._swap_lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+        self._refreshed_at = agora
+        threading.Thread(target=self._refresh, args=(engine,), daemon=True).start()
+
+    def _refresh(self, engine):
+        try:
+            engine.refresh(force=True)
+        finally:
+            with self._swap_lock:
+                self._refreshing = False
+
+    def recomendar(self, user_id: int, n: int, curso=None, semestre=None):
+        self.check_version()
+        if self.executor is not None:
+            self.refresh_in_background()
+        engine = self.engine
+        key = (
+            user_id,
+            n,
+            curso,
+            semestre,
+            engine.version,
+            engine.user_version(user_id),
+            None if self.availability is None else self.availability.version,
+        )
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+        if curso is None and self.executor is None:
+            recomendacoes = self.lote.get(engine, user_id, n)
+            if recomendacoes is not None:
+                self.cache.set(key, recomendacoes)
+                return recomendacoes
+        if self.executor is None:
+            recomendacoes = engine.recomendar(user_id, top_n=n, curso=curso, semestre=semestre)
+            self.cache.set(key, recomendacoes)
+            return recomendacoes
+        recomendacoes = self.executor.run(
+            engine.version,
+            user_id,
+            n,
+            curso,
+            semestre,
+            on_result=lambda resultado: self.cache.set(key, resultado),
+            disponibilidade=self.availability,
+        )
+        if recomendacoes is None:
+            return engine.recomendar_populares(user_id, top_n=n, curso=curso, semestre=semestre)
+        return recomendacoes
+
+    def similares(self, isbn13: str, n: int):
+        """Vizinhos pré-calculados do livro (consulta direta, sem cache)."""
+        self.check_version()
+        return self.engine.similar_books(isbn13, top_n=n)
+
+    def populares(self, n: int, categoria=None):
+        """Fatia do ranking de popularidade pré-calculado (consulta direta, sem cache)."""
+        self.check_version()
+        return self.engine.popular_books(top_n=n, categoria=categoria)
+
+    def metricas(self):
+        """Contadores do cache e, com executor, do pool (fila, timeouts, contingência)."""
+        metricas = {
+            "versao": self.engine.version,
+            "cache": {"hits": self.cache.hits, "misses": self.cache.misses, "tamanho": len(self.cache)},
+        }
+        if self.executor is not None:
+            metricas["executor"] = self.executor.stats()
+        return metricas
@@ -0,0 +1,60 @@
+import sqlite3
+
+from flask import current_app
+
+from api.database import db
+from api.models.book import Book
+from api.models.rental import Rental
+from api.models.user import User
+from scripts.config import RecommenderConfig
+from scripts.implicit_feedback import sync, watermark
+
+ORIGEM = "aluguel"
+
+
+def iter_rentals(desde, chunk_size):
+    """
+    Aluguéis com id > `desde`, em blocos de (id, email do usuário, ISBN do livro),
+    paginados pelo id (cada bloco é uma consulta curta, sem varrer o histórico).
+    """
+    ultimo = desde
+    while True:
+        bloco = (
+            db.session.query(Rental.id, User.email, Book.ISBN)
+            .join(User, Rental.rentee_id == User.id)
+            .join(Book, Rental.book_id == Book.id)
+            .filter(Rental.id > ultimo)
+            .order_by(Rental.id)
+            .limit(chunk_size)
+            .all()
+        )
+        if not bloco:
+            return
+        yield [tuple(linha) for linha in bloco]
+        ultimo = bloco[-1][0]
+
+
+def sync_rentals(db_path=None, peso=None, chunk_size=None):
+    """
+    Uma passada do ETL dos aluguéis (dentro de um app context): lê os aluguéis
+    da API depois do watermark guardado no banco do recomendador e grava cada um
+    como interação implícita (usuário pelo email em `usuarios`, livro pelo ISBN
+    na Biblioteca) com peso PESO_ALUGUEL. Retorna os contadores da passada.
+    """
+    config = RecommenderConfig.get_instance()
+    db_path = db_path or current_app.config.get("RECOMMENDER_DB_PATH") or config.DB_PATH
+    conn = sqlite3.connect(db_path)
+    try:
+        chunks = iter_rentals(watermark(conn, ORIGEM), chunk_size or config.LOAD_CHUNK_SIZE)
+        return sync(conn, ORIGEM, chunks, config.PESO_ALUGUEL if peso is None else peso)
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    # Incremental (ex.: agendado no cron): python -m api.services.rental_etl
+    from api.app import create_app
+
+    app = create_app()
+    with app.app_context():
+        print(sync_rentals())
@@ -0,0 +1,212 @@
+import atexit
+import contextlib
+import heapq
+import json
+import math
+import os
+import threading
+import time
+
+from scripts.artifacts import write_atomic
+
+try:
+    import fcntl
+except ImportError:  # Windows: sem trava entre processos
+    fcntl = None
+
+
+@contextlib.contextmanager
+def _travar(caminho):
+    """Trava exclusiva entre processos no arquivo `caminho`.lock (fcntl.flock)."""
+    if fcntl is None:
+        yield
+        return
+    with open(f"{caminho}.lock", "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+class TrendingCounter:
+    """
+    Livros em alta: contador por livro com decaimento exponencial (meia-vida
+    `half_life` segundos), alimentado pelos aluguéis e reservas.
+
+    Os contadores usam decaimento "para a frente": cada evento soma
+    exp(λ·(t - t0)) em vez de decair todos os contadores a cada instante, então a
+    ordem entre os livros não muda com o tempo e o top-k pode ser mantido de forma
+    incremental num heap limitado a `top_k` livros. O valor atual de um contador é
+    o guardado vezes exp(-λ·(agora - t0)); quando o expoente fica grande, todos são
+    reescalados para um novo t0 (e os que já decaíram a quase zero, descartados).
+
+    Com `snapshot_path`, o estado é gravado em JSON no máximo a cada
+    `snapshot_interval` segundos depois de uma mudança (e lido na criação), então
+    os contadores sobrevivem a reinícios; o tempo parado também conta no decaimento.
+    Vários processos (workers do servidor) podem gravar no mesmo snapshot: cada
+    `save`, sob uma trava de arquivo, soma ao que está em disco só os eventos
+    recebidos desde o seu último save e passa a servir o resultado combinado.
+    """
+
+    # exp(λ·Δt) acima disso: reescala para não estourar o float
+    MAX_EXPOENTE = 50.0
+    # Contadores (já decaídos) abaixo disso são descartados na reescala
+    MIN_CONTADOR = 1e-3
+
+    def __init__(self, half_life=86400.0, top_k=50, snapshot_path=None, snapshot_interval=60.0):
+        self.decay = math.log(2) / half_life  # λ
+        self.top_k = top_k
+        self.snapshot_path = snapshot_path
+        self.snapshot_interval = snapshot_interval
+        self._lock = threading.Lock()
+        self._t0 = time.time()
+        self._contadores = {}  # id do livro -> contador (escala de t0)
+        self._pendentes = {}  # id do livro -> eventos ainda não gravados (escala de t0)
+        self._livros = {}  # id do livro no top -> metadados da resposta
+        self._top = {}  # id do livro -> contador, só os top_k maiores
+        self._heap = []  # (contador, id do livro) do top; entradas antigas são ignoradas
+        self._ranking = None  # top ordenado, refeito só depois de uma mudança
+        self._timer = None
+        if snapshot_path:
+            if os.path.exists(snapshot_path):
+                self.load()
+            atexit.register(self.save)  # o que chegou depois do último snapshot
+
+    def add(self, book_id, info=None, peso=1.0, agora=None):
+        """Registra um evento do livro (`info`: metadados devolvidos no ranking)."""
+        agora = time.time() if agora is None else agora
+        with self._lock:
+            if self.decay * (agora - self._t0) > self.MAX_EXPOENTE:
+                self._rescale(agora)
+            evento = peso * math.exp(self.decay * (agora - self._t0))
+            valor = self._contadores.get(book_id, 0.0) + evento
+            self._contadores[book_id] = valor
+            self._pendentes[book_id] = self._pendentes.get(book_id, 0.0) + evento
+            self._offer(book_id, valor)
+            if book_id in self._top and info is not None:
+                self._livros[book_id] = info
+            self._ranking = None
+        self._schedule_snapshot()
+
+    def _offer(self, book_id, valor):
+        """Atualiza o top-k com o novo valor do livro (os contadores só crescem)."""
+        if book_id in self._top or len(self._top) < self.top_k:
+            self._top[book_id] = valor
+            heapq.heappush(self._heap, (valor, book_id))
+        else:
+            menor, menor_id = self._min()
+            if valor <= menor:
+                return
+            heapq.heappop(self._heap)
+            del self._top[menor_id]
+            self._livros.pop(menor_id, None)
+            self._top[book_id] = valor
+            heapq.heappush(self._heap, (valor, book_id))
+        # Entradas antigas acumuladas: refaz o heap só com o top atual
+        if len(self._heap) > 4 * self.top_k:
+            self._heap = [(v, b) for b, v in self._top.items()]
+            heapq.heapify(self._heap)
+
+    def _min(self):
+        """Menor entrada válida do heap (descarta as desatualizadas do topo)."""
+        while self._heap[0][0] != self._top.get(self._heap[0][1]):
+            heapq.heappop(self._heap)
+        return self._heap[0]
+
+    def _rescale(self, agora):
+        fator = math.exp(-self.decay * (agora - self._t0))
+        self._t0 = agora
+        self._contadores = {
+            b: v * fator for b, v in self._contadores.items() if v * fator >= self.MIN_CONTADOR
+        }
+        self._pendentes = {b: v * fator for b, v in self._pendentes.items() if b in self._contadores}
+        self._top = {b: v * fator for b, v in self._top.items() if b in self._contadores}
+        self._livros = {b: info for b, info in self._livros.items() if b in self._top}
+        self._heap = [(v, b) for b, v in self._top.items()]
+        heapq.heapify(self._heap)
+
+    def top(self, n=10, agora=None):
+        """Os `n` livros em alta (n <= top_k), com o contador decaído até agora."""
+        agora = time.time() if agora is None else agora
+        with self._lock:
+            if self._ranking is None:
+                self._ranking = sorted(self._top.items(), key=lambda item: (-item[1], item[0]))
+            fator = math.exp(-self.decay * (agora - self._t0))
+            return [
+                dict(self._livros.get(book_id, {}), id=book_id, score=valor * fator)
+                for book_id, valor in self._ranking[:n]
+            ]
+
+    def _schedule_snapshot(self):
+        if not self.snapshot_path:
+            return
+        with self._lock:
+            if self._timer is not None:
+                return
+            self._timer = threading.Timer(self.snapshot_interval, self.save)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def save(self):
+        """
+        Soma os eventos desde o último save aos contadores gravados em
+        `snapshot_path` (por este ou por outro processo) e grava o resultado com
+        troca atômica do arquivo, que passa a ser o estado deste contador.
+        """
+        os.makedirs(os.path.dirname(os.path.abspath(self.snapshot_path)), exist_ok=True)
+        with _travar(self.snapshot_path):
+            agora = time.time()
+            contadores, livros = self._ler(agora)
+            with self._lock:
+                self._timer = None
+                fator = math.exp(-self.decay * (agora - self._t0))
+                for book_id, valor in self._pendentes.items():
+                    contadores[book_id] = contadores.get(book_id, 0.0) + valor * fator
+                livros.update(self._livros)
+                self._substituir(contadores, livros, agora)
+                self._pendentes = {}
+                # Pares [id, valor]: chaves de objeto JSON virariam texto e o id 5
+                # voltaria como "5", contado à parte dos eventos novos
+                estado = {
+                    "t0": self._t0,
+                    "decay": self.decay,
+                    "contadores": [[b, v] for b, v in self._contadores.items()],
+                    "livros": [[b, info] for b, info in self._livros.items()],
+                }
+                texto = json.dumps(estado)
+            write_atomic(self.snapshot_path, texto)
+
+    def load(self):
+        """Lê o snapshot salvo, descartando os eventos deste contador ainda não gravados."""
+        agora = time.time()
+        contadores, livros = self._ler(agora)
+        with self._lock:
+            self._substituir(contadores, livros, agora)
+            self._pendentes = {}
+
+    def _ler(self, agora):
+        """
+        Contadores e metadados do snapshot, com os valores decaídos até `agora`
+        pela meia-vida com que foram gravados (vazios se ainda não há snapshot).
+        """
+        try:
+            with open(self.snapshot_path, encoding="utf-8") as f:
+                estado = json.load(f)
+        except FileNotFoundError:
+            return {}, {}
+        fator = math.exp(-estado["decay"] * (agora - estado["t0"]))
+        contadores = {book_id: valor * fator for book_id, valor in estado["contadores"]}
+        return contadores, {book_id: info for book_id, info in estado["livros"]}
+
+    def _substituir(self, contadores, livros, agora):
+        """Troca o estado pelos `contadores` (valores em `agora`), refazendo o top-k."""
+        self._t0 = agora
+        self._contadores = {}
+        self._top, self._heap, self._livros = {}, [], {}
+        for book_id, valor in contadores.items():
+            if valor >= self.MIN_CONTADOR:
+                self._contadores[book_id] = valor
+                self._offer(book_id, valor)
+        self._livros = {b: info for b, info in livros.items() if b in self._top}
+        self._ranking = None
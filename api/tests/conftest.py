@@ -1,12 +1,26 @@
+import os
 import pytest
 from api.app import create_app
 from api.config_test import TestingConfig
 from api.database import db as _db
 from api.models.user import User
+from api.tests.utils import create_recommender_db
 
 @pytest.fixture(scope="session")
-def app():
-    return create_app(TestingConfig)
+def recommender_db(tmp_path_factory):
+    path = tmp_path_factory.mktemp("recomendador") / "saber.db"
+    create_recommender_db(str(path))
+    return str(path)
+
+@pytest.fixture(scope="session")
+def app(recommender_db):
+    class Config(TestingConfig):
+        # Banco e artefatos do recomendador isolados para os testes
+        RECOMMENDER_DB_PATH = recommender_db
+        RECOMMENDER_ARTIFACTS_DIR = os.path.join(os.path.dirname(recommender_db), "artefatos")
+        RECOMMENDER_REFRESH_INTERVAL = 0
+
+    return create_app(Config)
 
 @pytest.fixture(scope="session")
 def client(app):
@@ -1,6 +1,9 @@
 # api/tests/test_books.py
 
-from api.tests.utils import create_user
+import time
+
+from api.services.trending import TrendingCounter
+from api.tests.utils import create_book, create_user
 
 def test_list_books_empty(client):
     resp = client.get("/api/books")
@@ -21,3 +24,80 @@ def test_create_book_data(client):
     # em caso de sucesso, ou virá {"message":..., "book":{...}} ou {"error":...}
     assert "book" in data
     assert data["book"]["titulo"] == "LivroTeste"
+
+def test_trending_books(client):
+    u1 = create_user(email="tr1@x.com", senha="pw", nome="Tr1", matricula="tr1")
+    u2 = create_user(email="tr2@x.com", senha="pw", nome="Tr2", matricula="tr2")
+    alugado = create_book(titulo="Em Alta", autor="A", depositor_id=u1.id)
+    reservado = create_book(titulo="Reservado", autor="B", depositor_id=u1.id)
+    assert client.post(f"/api/books/{alugado.id}/rent", json={"user_id": u2.id}).status_code == 200
+    assert client.post(f"/api/books/{reservado.id}/reserve", json={"user_id": u2.id}).status_code == 200
+
+    resp = client.get("/api/books/trending?n=50")
+    assert resp.status_code == 200
+    ranking = [livro for livro in resp.get_json() if livro["id"] in (alugado.id, reservado.id)]
+    # Um aluguel vale 1 e uma reserva, TRENDING_PESO_RESERVA
+    assert [livro["titulo"] for livro in ranking] == ["Em Alta", "Reservado"]
+    assert abs(ranking[0]["score"] - 1.0) < 1e-3
+    assert abs(ranking[1]["score"] - 0.5) < 1e-3
+
+    assert client.get("/api/books/trending?n=0").status_code == 400
+    assert client.get("/api/books/trending?n=abc").status_code == 400
+
+
+def test_trending_reserva_conta_uma_vez(client):
+    dono = create_user(email="tr3@x.com", senha="pw", nome="Tr3", matricula="tr3")
+    leitor = create_user(email="tr4@x.com", senha="pw", nome="Tr4", matricula="tr4")
+    livro = create_book(titulo="Disputado", autor="C", depositor_id=dono.id)
+    # Aluga, outro usuário reserva e a devolução passa o livro para a reserva
+    assert client.post(f"/api/books/{livro.id}/rent", json={"user_id": dono.id}).status_code == 200
+    assert client.post(f"/api/books/{livro.id}/reserve", json={"user_id": leitor.id}).status_code == 200
+    assert client.post(f"/api/books/{livro.id}/return", json={"user_id": dono.id}).status_code == 200
+
+    ranking = [l for l in client.get("/api/books/trending?n=50").get_json() if l["id"] == livro.id]
+    assert abs(ranking[0]["score"] - 1.5) < 1e-3  # 1 aluguel + 1 reserva
+
+
+def test_trending_counter_decay_top_k_and_snapshot(tmp_path):
+    # Ids inteiros, como os que o TrendingObserver recebe do modelo
+    trending = TrendingCounter(half_life=100.0, top_k=2)
+    t = time.time()
+    trending.add(1, {"titulo": "A"}, agora=t)
+    trending.add(1, agora=t + 100)
+    trending.add(2, {"titulo": "B"}, peso=2.0, agora=t + 100)
+    trending.add(3, {"titulo": "C"}, peso=0.5, agora=t + 100)  # fica fora do top-2
+    top = trending.top(agora=t + 100)
+    assert [(livro["id"], livro["titulo"]) for livro in top] == [(2, "B"), (1, "A")]
+    assert abs(top[1]["score"] - 1.5) < 1e-9  # 1 decaído por uma meia-vida + 1
+    assert abs(trending.top(agora=t + 200)[0]["score"] - 1.0) < 1e-9
+
+    path = str(tmp_path / "trending.json")
+    trending.snapshot_path = path
+    trending.save()
+    restaurado = TrendingCounter(half_life=100.0, top_k=2, snapshot_path=path)
+    assert [livro["id"] for livro in restaurado.top(agora=t + 100)] == [2, 1]
+    assert restaurado.top(agora=t + 100)[0]["titulo"] == "B"
+    # Evento depois da carga soma no mesmo contador (o id não volta como texto)
+    restaurado.add(1, agora=t + 100)
+    top = restaurado.top(agora=t + 100)
+    assert [livro["id"] for livro in top] == [1, 2]
+    assert abs(top[0]["score"] - 2.5) < 1e-6
+
+
+def test_trending_snapshot_soma_os_processos(tmp_path):
+    # Dois contadores no mesmo arquivo, como dois workers do servidor
+    path = str(tmp_path / "trending.json")
+    a = TrendingCounter(half_life=1e9, snapshot_path=path, snapshot_interval=1e9)
+    b = TrendingCounter(half_life=1e9, snapshot_path=path, snapshot_interval=1e9)
+    a.add(1, {"titulo": "A"})
+    b.add(1, {"titulo": "A"})
+    b.add(2, {"titulo": "B"}, peso=0.5)
+    a.save()
+    b.save()
+    a.save()  # nada novo em `a`: não conta de novo, só passa a ver os eventos de `b`
+
+    for contador in (a, TrendingCounter(half_life=1e9, snapshot_path=path)):
+        top = contador.top()
+        assert [livro["id"] for livro in top] == [1, 2]
+        assert abs(top[0]["score"] - 2.0) < 1e-6
+        assert abs(top[1]["score"] - 0.5) < 1e-6
@@ -0,0 +1,884 @@
+# api/tests/test_recommendations.py
+
+import os
+import sqlite3
+import threading
+
+import numpy as np
+import pandas as pd
+import pytest
+import scipy.sparse as sp
+from scipy.spatial.distance import pdist, squareform
+
+from api.patterns.observer import AvailabilityObserver
+from api.services.recommendation_cache import RecommendationCache
+from api.services.recommendation_executor import RecommendationExecutor
+from api.services.recommendation_service import RecommendationService
+from api.services.rental_etl import sync_rentals
+from api.tests.utils import RECOMMENDER_BOOKS, add_ratings, create_recommender_db, create_user
+from scripts import batch_recommendations, getRecommendations
+from scripts.artifacts import current_version, list_versions, set_current
+from scripts.availability import AvailabilityIndex
+from scripts.config import RecommenderConfig
+from scripts.evaluate_recommender import ranking_metrics, split_ratings
+from scripts.getRecommendations import RecommenderEngine
+from scripts.id_dictionary import IdDictionary
+from scripts.interaction_matrix import InteractionMatrix
+from scripts.item_neighbors import build_item_neighbors
+from scripts.loaders import iter_descriptions, iter_ratings, load_catalog, load_ratings
+from scripts.minhash_lsh import MinHashLSH
+from scripts.publish_artifacts import publish
+from scripts.tfidf_index import build_tfidf_index
+
+
+def test_recomendacoes_lista(client):
+    resp = client.get("/api/users/1/recomendacoes?n=3")
+    assert resp.status_code == 200
+    recs = resp.get_json()
+    assert isinstance(recs, list)
+    assert 0 < len(recs) <= 3
+    isbns = {r["isbn13"] for r in recs}
+    # Livros já avaliados pelo usuário não são recomendados
+    assert "9780000000001" not in isbns
+    assert "9780000000003" not in isbns
+    assert {"isbn13", "title", "authors", "score"} <= set(recs[0])
+
+
+def test_recomendacoes_usuario_sem_notas(client):
+    resp = client.get("/api/users/99/recomendacoes?n=3")
+    assert resp.status_code == 200
+    recs = resp.get_json()
+    # Cold start: ranking de popularidade (duas notas 5 para o primeiro livro)
+    assert len(recs) == 3
+    assert recs[0]["isbn13"] == "9780000000001"
+    scores = [r["score"] for r in recs]
+    assert scores == sorted(scores, reverse=True)
+
+
+def test_populares_por_categoria(client):
+    resp = client.get("/api/books/populares?n=5&categoria=Mathematics")
+    assert resp.status_code == 200
+    populares = resp.get_json()
+    assert {r["isbn13"] for r in populares} == {"9780000000005", "9780000000006"}
+    # Sem notas, o livro fica na média global, acima de uma única nota 4
+    assert populares[0]["isbn13"] == "9780000000006"
+    assert client.get("/api/books/populares?categoria=Inexistente").get_json() == []
+
+
+def test_recomendacoes_cache(app, client):
+    cache = app.recommendation_service.cache
+    primeira = client.get("/api/users/2/recomendacoes?n=2").get_json()
+    hits = cache.hits
+    segunda = client.get("/api/users/2/recomendacoes?n=2").get_json()
+    assert segunda == primeira
+    assert cache.hits == hits + 1
+
+
+def test_recomendacoes_invalidadas_por_nova_nota(tmp_path):
+    # Banco próprio: a nota nova não pode vazar para os outros testes
+    db_path = str(tmp_path / "saber.db")
+    create_recommender_db(db_path)
+    config = RecommenderConfig.with_overrides(
+        DB_PATH=db_path, ARTIFACTS_DIR=str(tmp_path / "artefatos"), REFRESH_INTERVAL=0
+    )
+    service = RecommendationService(RecommenderEngine(config), RecommendationCache())
+    antes = service.recomendar(3, 5)
+    versao = service.engine.user_version(3)
+
+    add_ratings(db_path, [(3, "9780000000008", 5)])
+
+    assert service.engine.user_version(3) != versao
+    depois = service.recomendar(3, 5)
+    assert "9780000000008" not in {r["isbn13"] for r in depois}
+    assert depois != antes
+
+
+def test_popularidade_reconstruida_fora_do_lock(tmp_path, monkeypatch):
+    db_path = str(tmp_path / "saber.db")
+    create_recommender_db(db_path)
+    config = RecommenderConfig.with_overrides(
+        DB_PATH=db_path,
+        ARTIFACTS_DIR=str(tmp_path / "artefatos"),
+        REFRESH_INTERVAL=0,
+        POPULARIDADE_INTERVAL=0,
+    )
+    engine = RecommenderEngine(config)
+    engine.refresh()
+
+    # Enquanto o ranking é recalculado, outra thread consegue pegar o lock do motor
+    livre = []
+    original = getRecommendations.load_rating_totals
+
+    def tenta_lock():
+        livre.append(engine._lock.acquire(timeout=1))
+        if livre[-1]:
+            engine._lock.release()
+
+    def load_rating_totals(*args, **kwargs):
+        outra = threading.Thread(target=tenta_lock)
+        outra.start()
+        outra.join()
+        return original(*args, **kwargs)
+
+    monkeypatch.setattr(getRecommendations, "load_rating_totals", load_rating_totals)
+    engine.on_rating_changed(1, "9780000000001", 5, 3)
+    add_ratings(db_path, [(4, "9780000000002", 5)])
+    engine.refresh()
+    assert livre == [True, True]
+    assert engine.populares is not None
+
+
+def test_recomendacoes_n_invalido(client):
+    resp = client.get("/api/users/1/recomendacoes?n=abc")
+    assert resp.status_code == 400
+    assert "error" in resp.get_json()
+    resp = client.get("/api/users/1/recomendacoes?n=0")
+    assert resp.status_code == 400
+
+
+def test_similares(client):
+    resp = client.get("/api/books/9780000000001/similares?n=3")
+    assert resp.status_code == 200
+    similares = resp.get_json()
+    assert 0 < len(similares) <= 3
+    isbns = [s["isbn13"] for s in similares]
+    assert "9780000000001" not in isbns
+    # Mesmo autor e descrição parecida
+    assert isbns[0] == "9780000000002"
+    scores = [s["score"] for s in similares]
+    assert scores == sorted(scores, reverse=True)
+
+
+def test_similares_isbn_inexistente(client):
+    resp = client.get("/api/books/0000000000000/similares")
+    assert resp.status_code == 404
+
+
+def test_recomendacoes_colaborativo_als(recommender_db, tmp_path):
+    config = RecommenderConfig.with_overrides(
+        DB_PATH=recommender_db,
+        ARTIFACTS_DIR=str(tmp_path),
+        REFRESH_INTERVAL=0,
+        COLABORATIVO="als",
+        ALS_FACTORS=4,
+        ALS_ITERATIONS=5,
+    )
+    engine = RecommenderEngine(config)
+    recs = engine.recomendar(1, top_n=3)
+    assert 0 < len(recs) <= 3
+    assert {"9780000000001", "9780000000003"}.isdisjoint(r["isbn13"] for r in recs)
+    colaborativo = engine.als_recommendation(1, top_n=3)
+    assert colaborativo["colaborativo"].max() == 1.0
+
+
+def _em_memory_map(array):
+    """O array (ou o array do qual ele é uma visão) vem de um arquivo em memory-map."""
+    while array is not None:
+        if isinstance(array, np.memmap):
+            return True
+        array = array.base
+    return False
+
+
+def test_artefatos_planos_em_memory_map(tmp_path):
+    # Banco próprio: o teste acrescenta notas depois do snapshot
+    db_path = str(tmp_path / "saber.db")
+    create_recommender_db(db_path)
+    config = RecommenderConfig.with_overrides(
+        DB_PATH=db_path, ARTIFACTS_DIR=str(tmp_path / "artefatos"), REFRESH_INTERVAL=0
+    )
+    primeiro = RecommenderEngine(config)
+    esperado = primeiro.recomendar(1, top_n=5)
+    assert len(os.listdir(os.path.join(config.ARTIFACTS_DIR, "notas"))) == 1
+
+    # Outro processo abre o catálogo, o dicionário de ids e o snapshot das notas em
+    # memory-map, e só lê do banco as notas inseridas depois do snapshot
+    add_ratings(db_path, [(4, "9780000000002", 5)])
+    segundo = RecommenderEngine(config)
+    assert segundo.recomendar(1, top_n=5) == esperado
+    assert _em_memory_map(segundo.livros.columns["title"].data)
+    assert _em_memory_map(segundo.interacoes._base.indices)
+    assert _em_memory_map(segundo.ids._users.saved)
+    codigo = segundo.ids.encode_isbns(["9780000000002"], add=False)[0]
+    assert codigo in segundo.interacoes.user_items(4)
+    # Mesmo resultado de uma carga completa do banco
+    do_zero = RecommenderEngine(
+        RecommenderConfig.with_overrides(**{**vars(config), "ARTIFACTS_DIR": str(tmp_path / "outro")})
+    )
+    assert segundo.recomendar(4, top_n=5) == do_zero.recomendar(4, top_n=5)
+
+
+def test_snapshot_com_codigos_de_outro_dicionario_e_ignorado(tmp_path):
+    db_path = str(tmp_path / "saber.db")
+    create_recommender_db(db_path)
+    config = RecommenderConfig.with_overrides(
+        DB_PATH=db_path, ARTIFACTS_DIR=str(tmp_path / "artefatos"), REFRESH_INTERVAL=0
+    )
+    primeiro = RecommenderEngine(config)
+    esperado = {u: primeiro.recomendar(u, top_n=5) for u in range(1, 5)}
+
+    # Outro processo regravou ids/ com os usuários em outra ordem: os códigos do
+    # snapshot não valem para esse dicionário, então ele é ignorado
+    IdDictionary(primeiro.ids.isbns, primeiro.ids.user_ids[::-1]).write(primeiro.ids_dir)
+    segundo = RecommenderEngine(config)
+    segundo.refresh(force=True)
+    assert list(segundo.ids.user_ids[:4]) == [4, 3, 2, 1]
+    assert {u: segundo.recomendar(u, top_n=5) for u in range(1, 5)} == esperado
+
+    # Novos valores ganham códigos na ordem em que aparecem, e um dicionário que é
+    # prefixo do outro é completado com os códigos que faltam
+    ids = IdDictionary()
+    assert ids.encode_users([30, 10, 30, 20]).tolist() == [0, 1, 0, 2]
+    maior = IdDictionary(user_ids=[30, 10, 20, 5])
+    assert ids.extend(maior) and ids.encode_users([5], add=False).tolist() == [3]
+    assert not ids.extend(IdDictionary(user_ids=[10, 30]))
+
+
+def test_reconstrucao_nao_altera_arrays_ja_abertos(tmp_path):
+    livros = pd.DataFrame(
+        {
+            "isbn13": [b[0] for b in RECOMMENDER_BOOKS],
+            "authors": [b[2] for b in RECOMMENDER_BOOKS],
+            "categories": [b[3] for b in RECOMMENDER_BOOKS],
+            "description": [b[4] for b in RECOMMENDER_BOOKS],
+        }
+    )
+    config = RecommenderConfig.with_overrides(SIMILARES_K=3)
+    index = build_tfidf_index(livros, str(tmp_path / "tfidf"), mode="vocabulary")
+    vizinhos = build_item_neighbors(livros, index.docs, str(tmp_path / "similares"), config)
+    antes = [np.array(a) for a in (index.isbns, index.idf, vizinhos.neighbors, vizinhos.scores)]
+
+    # Outro worker refaz os artefatos no mesmo diretório (catálogo menor): quem já
+    # os abriu em memory-map continua lendo os arquivos antigos, inteiros
+    menor = livros.iloc[:5].reset_index(drop=True)
+    novo = build_tfidf_index(menor, str(tmp_path / "tfidf"), mode="vocabulary")
+    build_item_neighbors(menor, novo.docs, str(tmp_path / "similares"), config)
+    depois = (index.isbns, index.idf, vizinhos.neighbors, vizinhos.scores)
+    assert all(np.array_equal(a, b) for a, b in zip(antes, depois))
+    assert len(novo.isbns) == 5
+
+
+def test_recomendacoes_tfidf_hashing(tmp_path):
+    # Banco próprio: o teste acrescenta um livro ao catálogo
+    db_path = str(tmp_path / "saber.db")
+    create_recommender_db(db_path)
+    hashing = RecommenderEngine(
+        RecommenderConfig.with_overrides(
+            DB_PATH=db_path,
+            ARTIFACTS_DIR=str(tmp_path / "hashing"),
+            REFRESH_INTERVAL=0,
+            TFIDF_MODE="hashing",
+            HASHING_N_FEATURES=2**12,
+        )
+    )
+    vocabulario = RecommenderEngine(
+        RecommenderConfig.with_overrides(
+            DB_PATH=db_path, ARTIFACTS_DIR=str(tmp_path / "vocabulario"), REFRESH_INTERVAL=0
+        )
+    )
+    recs = hashing.recomendar(1, top_n=3)
+    assert hashing.tfidf_index.mode == "hashing"
+    assert [r["isbn13"] for r in recs] == [r["isbn13"] for r in vocabulario.recomendar(1, top_n=3)]
+
+    # Livro novo no fim do catálogo: vetorizado e anexado ao índice, sem refit
+    conn = sqlite3.connect(db_path)
+    conn.execute(
+        "INSERT INTO Biblioteca (isbn13, title, authors, categories, description) VALUES (?, ?, ?, ?, ?)",
+        ("9780000000009", "Python Web", "Gil Souza", "Computers", "python web programming"),
+    )
+    conn.commit()
+    conn.close()
+    hashing.refresh(force=True)
+    assert hashing.tfidf_index.docs.shape == (9, 2**12)
+    assert "9780000000009" in {r["isbn13"] for r in hashing.recomendar(1, top_n=8)}
+
+
+def test_recomendacoes_lsa(recommender_db, tmp_path):
+    config = RecommenderConfig.with_overrides(
+        DB_PATH=recommender_db, ARTIFACTS_DIR=str(tmp_path), REFRESH_INTERVAL=0, LSA_DIMS=4
+    )
+    engine = RecommenderEngine(config)
+    recs = engine.tfidf_recommendation(1, top_n=3)
+    assert engine.lsa.embeddings.dtype == "float32"
+    assert engine.lsa.embeddings.shape == (8, 4)
+    assert 0 < len(recs) <= 3
+    assert {"9780000000001", "9780000000003"}.isdisjoint(recs["isbn13"])
+    # Mais parecido com os livros de programação avaliados pelo usuário
+    assert recs["isbn13"].iloc[0] in {"9780000000002", "9780000000008"}
+
+
+def test_recomendacoes_por_semestre(client):
+    resp = client.get("/api/users/1/recomendacoes?n=5&curso=ADS&semestre=1")
+    assert resp.status_code == 200
+    isbns = {r["isbn13"] for r in resp.get_json()}
+    assert isbns and isbns <= {"9780000000002", "9780000000008"}
+
+    resp = client.get("/api/users/1/recomendacoes?n=5&curso=ADS&semestre=2")
+    isbns = {r["isbn13"] for r in resp.get_json()}
+    assert isbns <= {"9780000000005", "9780000000006"}
+
+    resp = client.get("/api/users/1/recomendacoes?curso=Inexistente")
+    assert resp.get_json() == []
+
+
+def test_recomendacoes_semestre_invalido(client):
+    assert client.get("/api/users/1/recomendacoes?curso=ADS&semestre=x").status_code == 400
+    assert client.get("/api/users/1/recomendacoes?semestre=1").status_code == 400
+
+
+def test_recomendacoes_ordenadas_por_score(client):
+    recs = client.get("/api/users/1/recomendacoes?n=10").get_json()
+    chaves = [(-r["score"], r["isbn13"]) for r in recs]
+    # Score decrescente; empates na ordem do ISBN
+    assert chaves == sorted(chaves)
+
+
+def test_sinais_normalizados_antes_dos_pesos(recommender_db, tmp_path, monkeypatch):
+    config = RecommenderConfig.with_overrides(
+        DB_PATH=recommender_db,
+        ARTIFACTS_DIR=str(tmp_path / "artefatos"),
+        PESO_JACCARD=0.3,
+        PESO_TFIDF=0.7,
+        PESO_AFINIDADE=0.2,
+    )
+    engine = RecommenderEngine(config)
+    engine.refresh(force=True)
+    codigos = engine.linha_codigo[:4].astype(np.int64)
+    afinidade = dict(zip(codigos.tolist(), [0.0, 0.25, 0.5, 0.125]))
+    # Candidatos misturados: 0 só do colaborativo, 1 dos dois, 2 e 3 só do TF-IDF
+    monkeypatch.setattr(
+        engine, "_collaborative_scores", lambda *a: (codigos[[0, 1]], np.ones(2))
+    )
+    monkeypatch.setattr(
+        engine, "_tfidf_scores", lambda *a: (np.array([1, 2, 3]), np.array([0.10, 0.08, 0.02]))
+    )
+    monkeypatch.setattr(
+        engine, "_affinity_scores", lambda u, c: np.array([afinidade[x] for x in c.tolist()])
+    )
+
+    recs = engine.recomendar(1, top_n=4)
+    # TF-IDF / 0.10 e afinidade / 0.5: 0.3*1 + 0.7*1 + 0.2*0.5 = 1.1 para a linha 1,
+    # 0.7*0.8 + 0.2*1 = 0.76 para a 2, 0.3 para a 0 e 0.7*0.2 + 0.2*0.25 = 0.19 para a 3
+    # (sem normalizar, o indicador do colaborativo poria a linha 0 antes da 2)
+    ordem = engine.ids.isbn_array(codigos[[1, 2, 0, 3]]).tolist()
+    assert [r["isbn13"] for r in recs] == ordem
+    assert np.allclose([r["score"] for r in recs], [1.1, 0.76, 0.3, 0.19])
+
+
+def test_afinidade_muda_o_ranking(tmp_path):
+    # Usuário 5 gostou de Python Básico e de Álgebra Linear (Mathematics, Davi Melo)
+    db_path = str(tmp_path / "saber.db")
+    create_recommender_db(db_path)
+    add_ratings(db_path, [(5, "9780000000001", 5), (5, "9780000000006", 5)])
+
+    def ranking(peso):
+        config = RecommenderConfig.with_overrides(
+            DB_PATH=db_path, ARTIFACTS_DIR=str(tmp_path / f"artefatos-{peso}"), PESO_AFINIDADE=peso
+        )
+        return [r["isbn13"] for r in RecommenderEngine(config).recomendar(5, top_n=4)]
+
+    # Cálculo (mesma categoria e autor) não tem termos em comum com o perfil: só a
+    # afinidade o tira do fim da lista
+    sem_afinidade = ranking(0.0)
+    com_afinidade = ranking(1.0)
+    assert sem_afinidade[-1] == "9780000000005"
+    assert com_afinidade.index("9780000000005") < sem_afinidade.index("9780000000005")
+    assert sorted(com_afinidade) == sorted(sem_afinidade)
+
+
+def test_lote_igual_ao_online_e_servido_da_tabela(tmp_path, monkeypatch):
+    db_path = str(tmp_path / "saber.db")
+    create_recommender_db(db_path)
+    config = RecommenderConfig.with_overrides(
+        DB_PATH=db_path, ARTIFACTS_DIR=str(tmp_path / "artefatos"), REFRESH_INTERVAL=0
+    )
+    publish(config, version="v1")
+    online = RecommenderEngine(config)
+    esperado = {u: online.recomendar(u, top_n=3) for u in range(1, 5)}
+
+    # Serial e com dois processos: mesmo top-N, ordem e scores do recomendar online
+    for workers in (1, 2):
+        recomendacoes, estado = batch_recommendations.gerar_recomendacoes(
+            config, top_n=3, workers=workers, shard_size=2, chunk_size=1
+        )
+        assert estado == online.state()
+        for u in range(1, 5):
+            linhas = recomendacoes[recomendacoes["usuario_id"] == u].sort_values("rank")
+            assert linhas["isbn13"].tolist() == [r["isbn13"] for r in esperado[u]]
+            assert np.allclose(linhas["score"], [r["score"] for r in esperado[u]])
+
+    conn = sqlite3.connect(db_path)
+    batch_recommendations.salvar_recomendacoes(conn, recomendacoes, estado, top_n=3)
+    conn.close()
+
+    # O serviço responde da tabela sem calcular (um n menor é prefixo do lote); com
+    # n maior que o do lote a resposta é calculada
+    service = RecommendationService(RecommenderEngine(config), RecommendationCache())
+    calculadas = []
+    recomendar = service.engine.recomendar
+    monkeypatch.setattr(
+        service.engine, "recomendar", lambda *a, **k: calculadas.append(a) or recomendar(*a, **k)
+    )
+    def igual(recebidas, esperadas):
+        assert [r["isbn13"] for r in recebidas] == [r["isbn13"] for r in esperadas]
+        assert np.allclose([r["score"] for r in recebidas], [r["score"] for r in esperadas])
+
+    igual(service.recomendar(1, 3), esperado[1])
+    igual(service.recomendar(1, 2), esperado[1][:2])
+    assert calculadas == []
+    service.recomendar(1, 4)
+    assert len(calculadas) == 1
+
+    # Uma nota nova invalida só o lote de quem a fez
+    add_ratings(db_path, [(1, "9780000000008", 5)])
+    igual(service.recomendar(2, 3), esperado[2])
+    assert len(calculadas) == 1
+    service.recomendar(1, 3)
+    assert len(calculadas) == 2
+
+
+@pytest.mark.parametrize(
+    "modo",
+    [
+        {"JACCARD_MODE": "lsh"},
+        {"COLABORATIVO": "als", "ALS_FACTORS": 4, "ALS_ITERATIONS": 5},
+        {"LSA_DIMS": 4},
+        {"PESO_AFINIDADE": 1.0, "PESO_ALUGUEL": 0.5},
+    ],
+)
+def test_lote_igual_ao_online_em_cada_modo(tmp_path, modo):
+    db_path = str(tmp_path / "saber.db")
+    create_recommender_db(db_path)
+    # Usuário sem nota positiva (só cold start) e outro com perfil mas sem vizinhos
+    add_ratings(db_path, [(5, "9780000000001", 5), (5, "9780000000006", 4), (6, "9780000000002", 1)])
+    add_ratings(db_path, [(7, "9780000000007", 5)])
+    config = RecommenderConfig.with_overrides(
+        DB_PATH=db_path, ARTIFACTS_DIR=str(tmp_path / "artefatos"), REFRESH_INTERVAL=0, **modo
+    )
+    publish(config, version="v1")
+    online = RecommenderEngine(config)
+    # Notas depois da publicação: o lote usa a mesma carga (snapshot + inseridas)
+    add_ratings(db_path, [(2, "9780000000005", 5)])
+    online.refresh(force=True)
+
+    recomendacoes, estado = batch_recommendations.gerar_recomendacoes(
+        config, top_n=3, chunk_size=2
+    )
+    assert estado == online.state()
+    for u in range(1, 8):
+        esperado = online.recomendar(u, top_n=3)
+        linhas = recomendacoes[recomendacoes["usuario_id"] == u].sort_values("rank")
+        assert linhas["isbn13"].tolist() == [r["isbn13"] for r in esperado]
+        assert np.allclose(linhas["score"], [r["score"] for r in esperado])
+
+
+def test_versoes_de_artefatos_troca_a_quente(tmp_path):
+    db_path = str(tmp_path / "saber.db")
+    create_recommender_db(db_path)
+    config = RecommenderConfig.with_overrides(
+        DB_PATH=db_path, ARTIFACTS_DIR=str(tmp_path / "artefatos"), REFRESH_INTERVAL=0
+    )
+    manifest = publish(config, version="v1")
+    assert "tfidf/docs_data.npy" in manifest["files"]
+    assert current_version(config.ARTIFACTS_DIR) == "v1"
+
+    service = RecommendationService(
+        RecommenderEngine(config),
+        RecommendationCache(),
+        engine_factory=lambda version: RecommenderEngine(config, version=version),
+    )
+    assert service.engine.version == "v1"
+    service.recomendar(1, 3)
+    assert len(service.cache) == 1
+
+    # Versão nova publicada: o motor é trocado e as respostas antigas descartadas
+    publish(config, version="v2")
+    service.check_version(background=False)
+    assert service.engine.version == "v2"
+    assert len(service.cache) == 0
+    assert service.recomendar(1, 3)
+
+    # Rollback: só o ponteiro CURRENT muda
+    set_current(config.ARTIFACTS_DIR, "v1")
+    service.check_version(background=False)
+    assert service.engine.version == "v1"
+    assert [m["version"] for m in list_versions(config.ARTIFACTS_DIR)] == ["v1", "v2"]
+
+
+def test_versao_publicada_somente_leitura(tmp_path):
+    db_path = str(tmp_path / "saber.db")
+    create_recommender_db(db_path)
+    config = RecommenderConfig.with_overrides(
+        DB_PATH=db_path, ARTIFACTS_DIR=str(tmp_path / "artefatos"), REFRESH_INTERVAL=0
+    )
+    publish(config, version="v1")
+    publicada = str(tmp_path / "artefatos" / "versions" / "v1")
+
+    def arquivos():
+        return {
+            os.path.relpath(os.path.join(raiz, nome), publicada): os.stat(
+                os.path.join(raiz, nome)
+            ).st_mtime_ns
+            for raiz, _, nomes in os.walk(publicada)
+            for nome in nomes
+        }
+
+    antes = arquivos()
+    engine = RecommenderEngine(config, version="v1")
+    assert engine.recomendar_livros(1, 3)
+
+    # Notas novas e um livro novo no catálogo: o motor regrava o que precisa em
+    # runtime/v1, e a versão publicada continua como foi montada
+    add_ratings(db_path, [(9, "9780000000001", 5), (9, "9780000000002", 4)])
+    conn = sqlite3.connect(db_path)
+    conn.execute(
+        "INSERT INTO Biblioteca (isbn13, title, authors, categories, description) VALUES (?, ?, ?, ?, ?)",
+        ("9780000000009", "Livro novo", "Autor Novo", "Ficção", "Uma história nova sobre dragões."),
+    )
+    conn.commit()
+    conn.close()
+    engine.refresh(force=True)
+    assert engine.recomendar_livros(9, 3)
+    assert "9780000000009" in engine.livros["isbn13"].tolist()
+
+    assert arquivos() == antes
+    assert os.listdir(tmp_path / "artefatos" / "runtime" / "v1")
+
+
+def test_executor_prazo_estourado_usa_populares(recommender_db, tmp_path):
+    config = RecommenderConfig.with_overrides(
+        DB_PATH=recommender_db, ARTIFACTS_DIR=str(tmp_path / "artefatos"), REFRESH_INTERVAL=0
+    )
+    engine = RecommenderEngine(config)
+    # Prazo menor que a subida do worker: o primeiro pedido sempre estoura
+    executor = RecommendationExecutor(config, workers=1, deadline=0.0001, max_pending=1)
+    service = RecommendationService(engine, RecommendationCache(), executor=executor)
+    try:
+        assert service.recomendar(1, 3) == engine.recomendar_populares(1, top_n=3)
+        # Pool cheio (ou prazo estourado de novo): contingência sem entrar na fila
+        assert service.recomendar(2, 3) == engine.recomendar_populares(2, top_n=3)
+        stats = executor.stats()
+        assert stats["fallbacks"] == 2
+        assert stats["fallback_rate"] == 1.0
+    finally:
+        executor.shutdown(wait=True)
+
+    # O cálculo que estourou o prazo terminou no worker e foi para o cache
+    assert executor.stats()["completed"] >= 1
+    assert service.recomendar(1, 3) == engine.recomendar(1, top_n=3)
+    assert service.cache.hits == 1
+
+
+def test_executor_recebe_so_a_versao_da_disponibilidade(recommender_db, tmp_path):
+    config = RecommenderConfig.with_overrides(
+        DB_PATH=recommender_db, ARTIFACTS_DIR=str(tmp_path / "artefatos"), REFRESH_INTERVAL=0
+    )
+    availability = AvailabilityIndex()
+    availability.update(1, "9780000000002", True)
+    executor = RecommendationExecutor(config, workers=1, deadline=60)
+    service = RecommendationService(
+        RecommenderEngine(config), RecommendationCache(), executor=executor, availability=availability
+    )
+    try:
+        assert [r["isbn13"] for r in service.recomendar(1, 3)] == ["9780000000002"]
+        # Outra versão: o worker lê o snapshot novo do diretório do executor
+        availability.update(2, "9780000000008", True)
+        availability.update(1, "9780000000002", False)
+        assert [r["isbn13"] for r in service.recomendar(1, 3)] == ["9780000000008"]
+        assert executor.stats()["completed"] == 2
+    finally:
+        executor.shutdown(wait=True)
+
+
+def test_metricas(client):
+    resp = client.get("/api/recomendacoes/metricas")
+    assert resp.status_code == 200
+    assert {"hits", "misses", "tamanho"} <= set(resp.get_json()["cache"])
+
+
+def test_recomendacoes_so_com_exemplar_disponivel(app, client, recommender_db, tmp_path):
+    config = RecommenderConfig.with_overrides(
+        DB_PATH=recommender_db, ARTIFACTS_DIR=str(tmp_path / "artefatos"), REFRESH_INTERVAL=0
+    )
+    availability = AvailabilityIndex()
+    observer = AvailabilityObserver(availability)
+    app.facade.mediator.notification_subject.attach(observer)
+    try:
+        service = RecommendationService(
+            RecommenderEngine(config), RecommendationCache(), availability=availability
+        )
+        # Nenhum exemplar no acervo: nada para recomendar
+        assert service.recomendar(1, 3) == []
+
+        dono = create_user(nome="Dono", email="dono@x.com")
+        leitor = create_user(nome="Leitor", email="leitor@x.com")
+        livros = {}
+        for isbn in ("978-0-00-000000-2", "9780000000008"):
+            resp = client.post(
+                "/api/books",
+                json={"titulo": "T", "autor": "A", "depositor_id": dono.id, "ISBN": isbn},
+            )
+            livros[isbn] = resp.get_json()["book"]["id"]
+        recs = service.recomendar(1, 3)
+        assert {r["isbn13"] for r in recs} == {"9780000000002", "9780000000008"}
+
+        # Aluguel tira o livro das recomendações; a devolução o traz de volta
+        livro = livros["978-0-00-000000-2"]
+        resp = client.post(f"/api/books/{livro}/rent", json={"user_id": leitor.id})
+        assert resp.status_code == 200
+        assert [r["isbn13"] for r in service.recomendar(1, 3)] == ["9780000000008"]
+        populares = service.engine.recomendar_populares(99, 3)
+        assert [r["isbn13"] for r in populares] == ["9780000000008"]
+        resp = client.post(f"/api/books/{livro}/return", json={"user_id": leitor.id})
+        assert resp.status_code == 200
+        assert {r["isbn13"] for r in service.recomendar(1, 3)} == {"9780000000002", "9780000000008"}
+    finally:
+        app.facade.mediator.notification_subject.detach(observer)
+
+
+def test_alugueis_viram_interacoes_implicitas(client, tmp_path):
+    db_path = str(tmp_path / "saber.db")
+    create_recommender_db(db_path)
+    config = RecommenderConfig.with_overrides(
+        DB_PATH=db_path, ARTIFACTS_DIR=str(tmp_path / "artefatos"), REFRESH_INTERVAL=0
+    )
+    engine = RecommenderEngine(config)
+    versao = engine.user_version(1)
+
+    # Usuário 1 do recomendador (mesmo email) e um usuário que só existe na API
+    leitor = create_user(nome="Leitor", email="usuario1@saber.ifpb")
+    visitante = create_user(nome="Visitante", email="visitante@x.com")
+    resp = client.post(
+        "/api/books",
+        json={"titulo": "T", "autor": "A", "depositor_id": visitante.id, "ISBN": "978-0000000008"},
+    )
+    livro = resp.get_json()["book"]["id"]
+    client.post(f"/api/books/{livro}/rent", json={"user_id": leitor.id})
+    client.post(f"/api/books/{livro}/return", json={"user_id": leitor.id})
+    client.post(f"/api/books/{livro}/rent", json={"user_id": visitante.id})
+
+    stats = sync_rentals(db_path, peso=0.5)
+    assert (stats["lidos"], stats["gravados"], stats["sem_usuario"]) == (2, 1, 1)
+    # Watermark: a próxima passada não relê o histórico
+    assert sync_rentals(db_path, peso=0.5)["lidos"] == 0
+
+    # Incorporado sem recarga completa, com o peso do ETL (o usuário 1 não avaliou o livro)
+    assert engine.user_version(1) == (versao[0], versao[1] + 1)
+    row = engine.interacoes.user_index[1]
+    col = engine.ids.encode_isbns(["9780000000008"], add=False)[0]
+    assert engine.interacoes.user_rows([row])[0, col] == 0.5
+    # Motor novo: snapshot das notas + interações implícitas inseridas depois dele
+    novo = RecommenderEngine(config)
+    novo.refresh()
+    assert novo.interacoes.user_rows([row])[0, col] == 0.5
+
+
+def test_jaccard_esparso_igual_ao_pdist():
+    rng = np.random.default_rng(7)
+    densa = rng.random((12, 15)) < 0.25
+    densa[np.arange(12), np.arange(12)] = True  # todo usuário com ao menos um livro
+    usuarios, livros = np.nonzero(densa)
+    notas = pd.DataFrame(
+        {"usuario_id": usuarios + 100, "isbn13": [f"978{livro:010d}" for livro in livros]}
+    )
+    # Metade na matriz base e metade no buffer, com uma nota repetida
+    matriz = InteractionMatrix.from_ratings(notas.iloc[::2])
+    novas = pd.concat([notas.iloc[1::2], notas.iloc[:1]])
+    matriz.add_ratings(novas["usuario_id"].to_numpy(), novas["isbn13"].to_numpy())
+
+    # Caminho antigo: pdist sobre a matriz densa usuário x livro
+    esperado = 1 - squareform(pdist(densa, metric="jaccard"))
+    np.fill_diagonal(esperado, 0)
+    todas = np.arange(matriz.shape[0])
+    for usuario in range(12):
+        for linhas, sims in (
+            matriz.jaccard_similarity(usuario + 100),
+            matriz.jaccard_with(usuario + 100, todas),
+        ):
+            obtido = np.zeros(12)
+            obtido[matriz.user_ids[linhas] - 100] = sims
+            assert np.allclose(obtido, esperado[usuario])
+
+
+def test_minhash_lsh_recall_e_insercao_incremental():
+    # Usuários em 10 grupos de 30 livros: pares do mesmo grupo têm Jaccard alto
+    rng = np.random.default_rng(3)
+    densa = np.zeros((200, 300), dtype=bool)
+    for usuario in range(200):
+        grupo = rng.integers(10)
+        livros = rng.choice(30, size=rng.integers(4, 12), replace=False) + 30 * grupo
+        densa[usuario, livros] = True
+    jaccard = 1 - squareform(pdist(densa, metric="jaccard"))
+    np.fill_diagonal(jaccard, 0)
+    matriz = sp.csr_matrix(densa.astype(np.float32))
+
+    config = RecommenderConfig.get_instance()
+    lsh = MinHashLSH.from_csr(matriz, num_perm=config.MINHASH_NUM_PERM, bands=config.MINHASH_BANDS)
+    candidatos = np.zeros((200, 200), dtype=bool)
+    for usuario in range(200):
+        candidatos[usuario, lsh.candidates(usuario)] = True
+    # Recall contra o Jaccard exato (ver o cálculo das bandas em RecommenderConfig),
+    # comparando com menos usuários do que o modo exato
+    assert candidatos[jaccard >= 0.3].all()
+    assert candidatos[jaccard >= 0.2].mean() >= 0.95
+    assert candidatos.sum() < (jaccard > 0).sum()
+
+    # Metade das notas na construção e o resto incorporado depois: mesmas
+    # assinaturas e mesmos candidatos de uma construção com tudo
+    usuarios, livros = np.nonzero(densa)
+    primeira = np.arange(len(usuarios)) % 2 == 0
+    parcial = sp.csr_matrix(
+        (np.ones(primeira.sum(), dtype=np.float32), (usuarios[primeira], livros[primeira])),
+        shape=densa.shape,
+    )
+    incremental = MinHashLSH.from_csr(
+        parcial, num_perm=config.MINHASH_NUM_PERM, bands=config.MINHASH_BANDS
+    )
+    incremental.add_many(usuarios[~primeira], livros[~primeira])
+    assert np.array_equal(incremental.signatures, lsh.signatures)
+    for usuario in range(200):
+        assert set(incremental.candidates(usuario)) == set(lsh.candidates(usuario))
+
+
+def test_perfis_incrementais_iguais_a_reconstrucao(tmp_path):
+    db_path = str(tmp_path / "saber.db")
+    create_recommender_db(db_path)
+    config = RecommenderConfig.with_overrides(
+        DB_PATH=db_path, ARTIFACTS_DIR=str(tmp_path / "artefatos"), REFRESH_INTERVAL=0
+    )
+    engine = RecommenderEngine(config)
+    engine.refresh(force=True)
+    geracao = engine._generation
+
+    # Inserções (usuário existente, usuário novo, nota negativa) entram sem recarga
+    add_ratings(
+        db_path,
+        [
+            (1, "9780000000008", 5),
+            (5, "9780000000002", 4),
+            (5, "9780000000006", 5),
+            (4, "9780000000005", 2),
+        ],
+    )
+    engine.refresh(force=True)
+    assert engine._generation == geracao
+
+    # Notas alteradas: positiva que deixa de ser e negativa que passa a ser
+    conn = sqlite3.connect(db_path)
+    for usuario_id, isbn13, anterior, nota in (
+        (2, "9780000000005", 4, 2),
+        (3, "9780000000004", 3, 5),
+    ):
+        conn.execute(
+            "UPDATE NotasLivros SET nota = ? WHERE usuario_id = ? AND isbn13 = ?",
+            (nota, usuario_id, isbn13),
+        )
+        conn.commit()
+        engine.on_rating_changed(usuario_id, isbn13, anterior, nota)
+    conn.close()
+
+    do_zero = RecommenderEngine(
+        RecommenderConfig.with_overrides(**{**vars(config), "ARTIFACTS_DIR": str(tmp_path / "outro")})
+    )
+    do_zero.refresh(force=True)
+    for usuario_id in range(1, 6):
+        assert set(engine.perfis.rated_rows(usuario_id)) == set(do_zero.perfis.rated_rows(usuario_id))
+        incremental, reconstruido = engine.perfis.profile(usuario_id), do_zero.perfis.profile(usuario_id)
+        assert (incremental is None) == (reconstruido is None)
+        if incremental is not None:
+            assert np.allclose(incremental.toarray(), reconstruido.toarray(), atol=1e-6)
+
+
+def test_nota_alterada_sem_aviso_recarrega_as_notas(tmp_path):
+    db_path = str(tmp_path / "saber.db")
+    create_recommender_db(db_path)
+    config = RecommenderConfig.with_overrides(
+        DB_PATH=db_path, ARTIFACTS_DIR=str(tmp_path / "artefatos"), REFRESH_INTERVAL=0
+    )
+    engine = RecommenderEngine(config)
+    engine.refresh(force=True)
+    geracao, versao = engine._generation, engine.user_version(2)
+
+    # UPDATE direto no banco, sem on_rating_changed: o marcador muda a versão
+    conn = sqlite3.connect(db_path)
+    conn.execute("UPDATE NotasLivros SET nota = 2 WHERE usuario_id = 2 AND isbn13 = '9780000000005'")
+    conn.commit()
+    conn.close()
+    engine.refresh(force=True)
+    assert engine._generation == geracao + 1
+    assert engine.user_version(2) != versao
+
+    do_zero = RecommenderEngine(
+        RecommenderConfig.with_overrides(**{**vars(config), "ARTIFACTS_DIR": str(tmp_path / "outro")})
+    )
+    do_zero.refresh(force=True)
+    assert set(engine.perfis.rated_rows(2)) == set(do_zero.perfis.rated_rows(2))
+    assert engine.recomendar(2, top_n=3) == do_zero.recomendar(2, top_n=3)
+
+
+def test_metricas_de_avaliacao():
+    teste = {1: {"a", "b"}, 2: {"c"}}
+    recomendacoes = {1: ["a", "x", "b", "y"], 2: ["z", "w"]}
+    metricas = ranking_metrics(recomendacoes, teste, k=3, n_livros=10)
+    # Usuário 1: a e b no top-3 (2/3); usuário 2: nenhum acerto (0/3)
+    assert metricas["precision@3"] == pytest.approx((2 / 3 + 0) / 2)
+    # 2 acertos de 3 notas de teste; livros distintos no top-3: a, x, b, z, w
+    assert metricas["recall@3"] == pytest.approx(2 / 3)
+    assert metricas["cobertura"] == pytest.approx(5 / 10)
+
+
+def test_separacao_temporal_das_notas():
+    notas = pd.DataFrame(
+        {
+            "id": range(1, 10),
+            "usuario_id": [1, 1, 1, 2, 1, 1, 2, 1, 1],
+            "isbn13": ["a", "b", "c", "a", "d", "e", "b", "f", "g"],
+            "nota": [5, 2, 4, 5, 1, 3, 5, 4, 5],
+        }
+    )
+    treino, teste = split_ratings(notas, k=2, mode="time", min_notas=5)
+    # Usuário 1 (7 notas): as 2 positivas mais recentes (ids 8 e 9); usuário 2
+    # (2 notas) fica só no treino
+    assert teste == {1: {"f", "g"}}
+    assert sorted(treino["id"]) == [1, 2, 3, 4, 5, 6, 7]
+
+    treino, teste = split_ratings(notas, k=2, mode="leave-k-out", min_notas=5, seed=3)
+    assert len(teste[1]) == 2 and teste[1] <= {"a", "c", "f", "g"}
+    assert not set(treino[treino["usuario_id"] == 1]["isbn13"]) & teste[1]
+
+
+def test_carga_em_blocos_igual_a_carga_unica(recommender_db, tmp_path):
+    conn = sqlite3.connect(recommender_db)
+    try:
+        assert len(list(iter_ratings(conn, chunk_size=3))) > 1
+        pd.testing.assert_frame_equal(
+            load_ratings(conn, chunk_size=3), load_ratings(conn, chunk_size=10_000)
+        )
+        pd.testing.assert_frame_equal(
+            load_ratings(conn, since_id=4, chunk_size=3),
+            load_ratings(conn, since_id=4, chunk_size=10_000),
+        )
+        pd.testing.assert_frame_equal(
+            load_catalog(conn, chunk_size=3), load_catalog(conn, chunk_size=10_000)
+        )
+        assert list(iter_descriptions(conn, chunk_size=3)) == list(
+            iter_descriptions(conn, chunk_size=10_000)
+        )
+    finally:
+        conn.close()
+
+    # O motor carregado em blocos de 2 linhas monta as mesmas estruturas
+    motores = []
+    for chunk_size in (2, 10_000):
+        config = RecommenderConfig.with_overrides(
+            DB_PATH=recommender_db,
+            ARTIFACTS_DIR=str(tmp_path / f"artefatos-{chunk_size}"),
+            LOAD_CHUNK_SIZE=chunk_size,
+        )
+        motores.append(RecommenderEngine(config))
+    em_blocos, unica = motores
+    em_blocos.refresh(force=True)
+    unica.refresh(force=True)
+    assert (em_blocos.interacoes.to_csr() != unica.interacoes.to_csr()).nnz == 0
+    for usuario_id in range(1, 5):
+        assert em_blocos.recomendar(usuario_id, top_n=5) == unica.recomendar(usuario_id, top_n=5)
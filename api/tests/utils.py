@@ -1,3 +1,5 @@
+import sqlite3
+
 from api.database import db
 from api.models.user import User
 from api.models.book import Book
@@ -42,3 +44,82 @@ def create_book(titulo="Livro X",
     db.session.add(b)
     db.session.commit()
     return b
+
+RECOMMENDER_BOOKS = [
+    # isbn13, title, authors, categories, description
+    ("9780000000001", "Python Básico", "Ana Lima", "Computers", "python programming language basics"),
+    ("9780000000002", "Python Avançado", "Ana Lima", "Computers", "advanced python programming patterns"),
+    ("9780000000003", "Algoritmos", "Bruno Reis", "Computers", "algorithms data structures programming"),
+    ("9780000000004", "Redes", "Carla Dias", "Computers", "computer networks protocols internet"),
+    ("9780000000005", "Cálculo", "Davi Melo", "Mathematics", "calculus limits derivatives integrals"),
+    ("9780000000006", "Álgebra Linear", "Davi Melo", "Mathematics", "linear algebra matrices vectors"),
+    ("9780000000007", "Romance", "Eva Nunes", "Fiction", "love story novel city"),
+    ("9780000000008", "Python para Dados", "Fábio Rocha", "Computers", "python data analysis programming"),
+]
+
+RECOMMENDER_RATINGS = [
+    # usuario_id, isbn13, nota
+    (1, "9780000000001", 5),
+    (1, "9780000000003", 4),
+    (2, "9780000000001", 5),
+    (2, "9780000000002", 5),
+    (2, "9780000000005", 4),
+    (3, "9780000000003", 4),
+    (3, "9780000000004", 3),
+    (4, "9780000000007", 5),
+]
+
+RECOMMENDER_BIBLIOGRAFIA = [
+    # curso, semestre, isbn13, categoria
+    ("ADS", 1, "9780000000002", None),
+    ("ADS", 1, "9780000000008", None),
+    ("ADS", 2, None, "Mathematics"),
+]
+
+
+def create_recommender_db(path, ratings=RECOMMENDER_RATINGS):
+    """
+    Cria um banco SQLite com as tabelas do recomendador (usuarios, Biblioteca,
+    NotasLivros, como em bd/connect.py) e um catálogo pequeno.
+    """
+    conn = sqlite3.connect(path)
+    conn.executescript(
+        """
+        CREATE TABLE usuarios (id INTEGER PRIMARY KEY AUTOINCREMENT, nome TEXT NOT NULL,
+                               email TEXT UNIQUE, senha TEXT NOT NULL);
+        CREATE TABLE Biblioteca (isbn13 TEXT PRIMARY KEY, isbn10 TEXT, title TEXT, subtitle TEXT,
+                                 authors TEXT, categories TEXT, thumbnail TEXT, description TEXT,
+                                 published_year INTEGER, average_rating REAL, num_pages INTEGER,
+                                 ratings_count INTEGER);
+        CREATE TABLE NotasLivros (id INTEGER PRIMARY KEY AUTOINCREMENT, usuario_id INTEGER,
+                                  isbn13 TEXT, nota INTEGER);
+        CREATE TABLE BibliografiaSemestre (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                                           curso TEXT NOT NULL, semestre INTEGER,
+                                           isbn13 TEXT, categoria TEXT);
+        """
+    )
+    conn.executemany(
+        "INSERT INTO BibliografiaSemestre (curso, semestre, isbn13, categoria) VALUES (?, ?, ?, ?)",
+        RECOMMENDER_BIBLIOGRAFIA,
+    )
+    conn.executemany(
+        "INSERT INTO usuarios (nome, email, senha) VALUES (?, ?, ?)",
+        [(f"Usuario {i}", f"usuario{i}@saber.ifpb", "pwd") for i in range(1, 5)],
+    )
+    conn.executemany(
+        "INSERT INTO Biblioteca (isbn13, title, authors, categories, description) VALUES (?, ?, ?, ?, ?)",
+        RECOMMENDER_BOOKS,
+    )
+    conn.commit()
+    conn.close()
+    add_ratings(path, ratings)
+
+
+def add_ratings(path, ratings):
+    """Insere notas em NotasLivros do banco do recomendador."""
+    conn = sqlite3.connect(path)
+    conn.executemany(
+        "INSERT INTO NotasLivros (usuario_id, isbn13, nota) VALUES (?, ?, ?)", ratings
+    )
+    conn.commit()
+    conn.close()
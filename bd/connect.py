@@ -171,6 +171,20 @@ try:
     conn.commit()
     print("Notas aleatórias inseridas na tabela 'NotasLivros'.")
 
+    # Cria a tabela BibliografiaSemestre (livros ou categorias indicados por curso/semestre),
+    # usada pelo recomendador para restringir os candidatos ao semestre do aluno
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS BibliografiaSemestre (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            curso TEXT NOT NULL,
+            semestre INTEGER,
+            isbn13 TEXT,
+            categoria TEXT
+        )
+    ''')
+    conn.commit()
+    print("Tabela 'BibliografiaSemestre' criada (se não existia).")
+
 
 except Exception as e:
     print(f"Erro: {e}")
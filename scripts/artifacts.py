@@ -0,0 +1,88 @@
+import json
+import os
+
+import numpy as np
+
+# Layout dos artefatos publicados:
+#   ARTIFACTS_DIR/versions/<versão>/{tfidf,ids,als,similares}/... + manifest.json
+#   ARTIFACTS_DIR/CURRENT  -> nome da versão servida (trocado de uma vez)
+#   ARTIFACTS_DIR/runtime/<versão>/...  -> o que os motores da versão refazem em execução
+#                                          (snapshots das notas, índice de catálogo novo)
+# Uma versão publicada nunca é regravada: voltar a ela restaura o que foi publicado.
+# Sem CURRENT, os artefatos ficam direto em ARTIFACTS_DIR e são construídos sob demanda.
+VERSIONS_DIR = "versions"
+RUNTIME_DIR = "runtime"
+CURRENT_FILE = "CURRENT"
+MANIFEST_FILE = "manifest.json"
+
+
+def save_atomic(path, array):
+    """Grava o .npy num arquivo temporário e troca de uma vez (leitores nunca veem meio arquivo)."""
+    tmp = f"{path}.{os.getpid()}.tmp.npy"
+    np.save(tmp, array)
+    os.replace(tmp, path)
+
+
+def write_atomic(path, text):
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp, path)
+
+
+def version_dir(artifacts_dir, version):
+    return os.path.join(artifacts_dir, VERSIONS_DIR, version)
+
+
+def current_version(artifacts_dir):
+    """Versão apontada por CURRENT, ou None se nenhuma versão foi publicada."""
+    try:
+        with open(os.path.join(artifacts_dir, CURRENT_FILE), encoding="utf-8") as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def resolve_dir(artifacts_dir, version=None):
+    """Diretório dos artefatos de `version` (None = layout antigo, direto em ARTIFACTS_DIR)."""
+    if version is None:
+        return artifacts_dir
+    return version_dir(artifacts_dir, version)
+
+
+def runtime_dir(artifacts_dir, version=None):
+    """Onde os motores de `version` gravam em execução (None = o próprio ARTIFACTS_DIR)."""
+    if version is None:
+        return artifacts_dir
+    return os.path.join(artifacts_dir, RUNTIME_DIR, version)
+
+
+def read_manifest(artifacts_dir, version):
+    with open(os.path.join(version_dir(artifacts_dir, version), MANIFEST_FILE), encoding="utf-8") as f:
+        return json.load(f)
+
+
+def write_manifest(directory, manifest):
+    write_atomic(os.path.join(directory, MANIFEST_FILE), json.dumps(manifest, indent=2))
+
+
+def list_versions(artifacts_dir):
+    """Manifestos das versões publicadas (completas), da mais antiga para a mais nova."""
+    base = os.path.join(artifacts_dir, VERSIONS_DIR)
+    if not os.path.isdir(base):
+        return []
+    versoes = []
+    for nome in sorted(os.listdir(base)):
+        if os.path.exists(os.path.join(base, nome, MANIFEST_FILE)):
+            versoes.append(read_manifest(artifacts_dir, nome))
+    return versoes
+
+
+def set_current(artifacts_dir, version):
+    """
+    Aponta CURRENT para `version` (publicar ou voltar atrás é só isso); os workers
+    da API percebem a troca e carregam a versão nova sem reiniciar.
+    """
+    if not os.path.exists(os.path.join(version_dir(artifacts_dir, version), MANIFEST_FILE)):
+        raise ValueError(f"Versão de artefatos inexistente ou incompleta: {version}")
+    write_atomic(os.path.join(artifacts_dir, CURRENT_FILE), version + "\n")
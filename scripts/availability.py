@@ -0,0 +1,169 @@
+import glob
+import os
+import threading
+from collections import deque
+
+import numpy as np
+
+from scripts.artifacts import save_atomic
+
+# Disponibilidade dos livros do acervo físico (tabela books da API): quantos
+# exemplares de cada ISBN-13 podem ser alugados agora. O motor transforma isso num
+# bitmap sobre as linhas do índice TF-IDF e só pontua os livros disponíveis.
+
+
+def normalize_isbn(isbn):
+    """ISBN-13 (só dígitos) de um ISBN-10/13 com ou sem hífens; None se não for válido."""
+    if isbn is None:
+        return None
+    digitos = "".join(c for c in str(isbn).upper() if c.isdigit() or c == "X")
+    if len(digitos) == 13 and digitos.isdigit():
+        return digitos
+    if len(digitos) == 10 and digitos[:9].isdigit():
+        base = "978" + digitos[:9]
+        soma = sum(int(d) * (1 if i % 2 == 0 else 3) for i, d in enumerate(base))
+        return base + str((10 - soma % 10) % 10)
+    return None
+
+
+def _available_path(directory, version):
+    return os.path.join(directory, f"disponiveis-{version}.npy")
+
+
+def _saved_versions(directory):
+    nomes = glob.glob(os.path.join(directory, "disponiveis-*.npy"))
+    return sorted(int(os.path.basename(n)[len("disponiveis-"):-len(".npy")]) for n in nomes)
+
+
+def save_available(directory, version, isbns, keep=8):
+    """
+    Grava o snapshot (`version`, `isbns`) de um AvailabilityIndex como array
+    int64 ordenado dos ISBN-13 (disponiveis-<versão>.npy), que os workers abrem em
+    memory-map recebendo só a versão. Mantém as `keep` versões mais novas.
+    """
+    os.makedirs(directory, exist_ok=True)
+    codigos = np.sort(np.fromiter((int(isbn) for isbn in isbns), dtype=np.int64, count=len(isbns)))
+    save_atomic(_available_path(directory, version), codigos)
+    for antiga in _saved_versions(directory)[:-keep]:
+        try:
+            os.remove(_available_path(directory, antiga))
+        except FileNotFoundError:
+            pass  # outro processo já apagou
+
+
+def load_available(directory, version):
+    """
+    (versão, ISBN-13) gravados por `save_available`; se `version` já foi
+    descartada, os da versão mais nova (None se não há nenhuma).
+    """
+    try:
+        codigos = np.load(_available_path(directory, version), mmap_mode="r")
+    except FileNotFoundError:
+        versoes = _saved_versions(directory)
+        if not versoes:
+            return None
+        version = versoes[-1]
+        codigos = np.load(_available_path(directory, version), mmap_mode="r")
+    return version, [f"{codigo:013d}" for codigo in codigos.tolist()]
+
+
+class AvailabilityIndex:
+    """
+    Exemplares disponíveis por ISBN-13, mantido a partir das transições de estado
+    dos livros (aluguel, devolução, reserva, depósito).
+
+    Cada ISBN que passa a ter (ou deixa de ter) exemplar disponível incrementa
+    `version` e entra num log curto de mudanças, de onde os motores atualizam os
+    próprios bitmaps só nas linhas afetadas; quem ficou para trás do log refaz o
+    bitmap a partir de `snapshot()`.
+
+    O estado inicial vem de `loader` (linhas (id do livro, ISBN, estado)), lido no
+    primeiro uso; sem loader o índice começa vazio (ex.: réplica num worker,
+    preenchida por `replace`).
+    """
+
+    def __init__(self, loader=None, log_size=1024):
+        self._loader = loader
+        self._loaded = loader is None
+        self._lock = threading.Lock()
+        self._livros = {}  # id do livro disponível -> ISBN-13
+        self._copias = {}  # ISBN-13 -> nº de exemplares disponíveis
+        self._log = deque(maxlen=log_size)  # (versão, ISBN-13, disponível)
+        self._version = 0
+
+    @property
+    def version(self):
+        """Muda sempre que algum ISBN ganha ou perde o último exemplar disponível."""
+        self._ensure_loaded()
+        return self._version
+
+    def _ensure_loaded(self):
+        if self._loaded:
+            return
+        linhas = list(self._loader())
+        with self._lock:
+            if self._loaded:
+                return
+            for book_id, isbn, estado in linhas:
+                self._set(book_id, isbn, estado == "disponivel")
+            self._loaded = True
+            # Estado inicial inteiro de uma vez: os bitmaps são refeitos
+            self._version += 1
+            self._log.clear()
+
+    def update(self, book_id, isbn, disponivel):
+        """Registra o estado atual de um livro (idempotente)."""
+        self._ensure_loaded()
+        with self._lock:
+            self._set(book_id, isbn, disponivel)
+
+    def _set(self, book_id, isbn, disponivel):
+        isbn13 = normalize_isbn(isbn) if disponivel else None
+        if isbn13 is not None and self._livros.get(book_id) == isbn13:
+            return  # nada mudou
+        anterior = self._livros.pop(book_id, None)
+        if anterior is not None:
+            self._copias[anterior] -= 1
+            if self._copias[anterior] == 0:
+                del self._copias[anterior]
+                self._changed(anterior, False)
+        if isbn13 is not None:
+            self._livros[book_id] = isbn13
+            self._copias[isbn13] = self._copias.get(isbn13, 0) + 1
+            if self._copias[isbn13] == 1:
+                self._changed(isbn13, True)
+
+    def _changed(self, isbn13, disponivel):
+        self._version += 1
+        self._log.append((self._version, isbn13, disponivel))
+
+    def snapshot(self):
+        """(versão, ISBN-13 com exemplar disponível)."""
+        self._ensure_loaded()
+        with self._lock:
+            return self._version, tuple(self._copias)
+
+    def changes_since(self, version):
+        """
+        (versão atual, [(ISBN-13, disponível), ...]) das mudanças depois de
+        `version`, ou (versão atual, None) se o log já não cobre esse intervalo.
+        """
+        self._ensure_loaded()
+        with self._lock:
+            if version == self._version:
+                return self._version, []
+            cobre = self._log and version is not None and self._log[0][0] <= version + 1
+            if not cobre or version > self._version:
+                return self._version, None
+            return self._version, [(isbn, disp) for v, isbn, disp in self._log if v > version]
+
+    def replace(self, version, isbns):
+        """Troca o estado inteiro por um snapshot de outro índice (réplicas nos workers)."""
+        with self._lock:
+            if self._loaded and version == self._version:
+                return
+            self._livros = {}
+            self._copias = {isbn: 1 for isbn in isbns}
+            self._log.clear()
+            self._loaded = True
+            self._version = version
@@ -0,0 +1,496 @@
+import argparse
+import datetime
+import json
+import sqlite3
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+
+from scripts.artifacts import current_version
+from scripts.book_features import CategoryAuthorAffinity
+from scripts.config import RecommenderConfig
+from scripts.getRecommendations import RecommenderEngine
+from scripts.hybrid_blend import ScoreBlend, top_n_entries, top_n_rows
+from scripts.lsa_index import LsaIndex
+from scripts.tfidf_index import TfidfIndex
+
+
+def _fora_de(linhas, colunas, excluir, n_colunas):
+    """Máscara das entradas (linhas, colunas) que não estão em `excluir` (CSR com as mesmas linhas)."""
+    excluir = excluir.tocoo()
+    return ~np.isin(
+        linhas.astype(np.int64) * n_colunas + colunas,
+        excluir.row.astype(np.int64) * n_colunas + excluir.col,
+    )
+
+
+def _jaccard_bloco(codigos, bloco, m, top_n):
+    """
+    Sinal do Jaccard de um bloco de usuários: (usuário no bloco, linha do índice
+    TF-IDF) dos livros mais populares entre os vizinhos, como _jaccard_codes.
+    """
+    # Vizinhos = quem tem livro em comum (Jaccard > 0), sem o próprio usuário; no
+    # modo LSH, só entre os pares que caem num mesmo bucket
+    vizinhos = sp.csr_matrix(bloco @ m["interacoes_t"])
+    if "pares_lsh" in m:
+        vizinhos = sp.csr_matrix(vizinhos.multiply(m["pares_lsh"][codigos]))
+    dono = np.repeat(np.arange(len(codigos)), np.diff(vizinhos.indptr))
+    vizinhos.data = (vizinhos.indices != codigos[dono]).astype(np.float32)
+    vizinhos.eliminate_zeros()
+    # Interações dos vizinhos por livro, sem os livros que o usuário já tem
+    contagens = sp.csr_matrix(vizinhos @ m["interacoes"]).tocoo()
+    novos = _fora_de(contagens.row, contagens.col, bloco, contagens.shape[1])
+    usuarios, cols = contagens.row[novos], contagens.col[novos]
+    melhores = top_n_entries(usuarios, contagens.data[novos], cols, top_n)
+    usuarios, linhas = usuarios[melhores], m["codigo_linha"][cols[melhores]]
+    return usuarios[linhas >= 0], linhas[linhas >= 0]
+
+
+def _als_bloco(inicio, fim, bloco, m, top_n):
+    """Sinal do ALS de um bloco: (usuário no bloco, linha, score), como _als_scores."""
+    scores = m["fatores_usuario"][inicio:fim] @ np.asarray(m["fatores_item"]).T
+    validos = np.repeat(m["tem_fatores"][inicio:fim, None], scores.shape[1], axis=1)
+    lidos = m["fator_coluna"][bloco.indices]
+    dono = np.repeat(np.arange(bloco.shape[0]), np.diff(bloco.indptr))
+    validos[dono[lidos >= 0], lidos[lidos >= 0]] = False
+    usuarios, cols = top_n_rows(scores, top_n, np.arange(scores.shape[1]), validos)
+    linhas = m["coluna_linha"][cols]
+    no_catalogo = linhas >= 0
+    return usuarios[no_catalogo], linhas[no_catalogo], scores[usuarios, cols][no_catalogo]
+
+
+def _conteudo_bloco(gostou, m, top_n):
+    """
+    Sinal de conteúdo de um bloco (TF-IDF ou LSA): (usuário no bloco, linha, score)
+    dos livros mais parecidos com o perfil, sem os do perfil, como _tfidf_scores.
+    """
+    n_linhas = gostou.shape[1]
+    if "embeddings" in m:
+        lsa = LsaIndex(None, m["embeddings"])
+        scores = lsa.profile_block(gostou) @ np.asarray(m["embeddings"]).T
+        validos = scores > 0
+        perfil = gostou.tocoo()
+        validos[perfil.row, perfil.col] = False
+        usuarios, linhas = top_n_rows(scores, top_n, np.arange(n_linhas), validos)
+        return usuarios, linhas, scores[usuarios, linhas]
+    # TF-IDF: perfis (soma das linhas do perfil) x índice invertido; o cosseno não
+    # depende da escala, então a soma vale o mesmo que a média do modo online
+    indice = TfidfIndex(None, m["docs"], m["postings"])
+    scores = indice.score_block(gostou @ m["docs"]).tocoo()
+    novos = _fora_de(scores.row, scores.col, gostou, n_linhas)
+    usuarios, linhas, valores = scores.row[novos], scores.col[novos], scores.data[novos]
+    melhores = top_n_entries(usuarios, valores, linhas, top_n)
+    return usuarios[melhores], linhas[melhores], valores[melhores]
+
+
+def _populares_bloco(frios, bloco, m, top_n):
+    """
+    Cold start de um bloco (usuários `frios`, sem nenhum dos dois sinais): fatia do
+    ranking de popularidade sem os livros de cada um, como _popular_scores.
+    """
+    if "populares_linhas" not in m or len(frios) == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0)
+    lidos = bloco[frios].tocoo()
+    linhas_lidas = m["codigo_linha"][lidos.col]
+    lido = np.zeros((len(frios), len(m["ordem_isbn"])), dtype=bool)
+    lido[lidos.row[linhas_lidas >= 0], linhas_lidas[linhas_lidas >= 0]] = True
+    prefixo = np.asarray(m["populares_linhas"][: top_n + int(lido.sum(axis=1).max())])
+    manter = ~lido[:, prefixo]
+    manter &= np.cumsum(manter, axis=1) <= top_n
+    usuarios, posicoes = np.nonzero(manter)
+    return (
+        frios[usuarios],
+        prefixo[posicoes].astype(np.int64),
+        np.asarray(m["populares_scores"])[posicoes].astype(np.float64),
+    )
+
+
+def pontuar_bloco(inicio, fim, m, parametros, top_n, config):
+    """
+    Top-N híbrido dos usuários [inicio, fim) do lote com produtos de matrizes
+    sobre o bloco inteiro (X_bloco @ Xᵀ, vizinhos @ X, perfis @ docsᵀ), pelos
+    mesmos sinais de RecommenderEngine._ranked_codes, combinados pelo mesmo
+    ScoreBlend (normalização, pesos e desempate). Retorna arrays (usuário no lote,
+    linha do índice TF-IDF, score), agrupados por usuário e em ordem de ranking.
+    """
+    n_linhas = len(m["ordem_isbn"])
+    codigos = np.asarray(m["usuarios"][inicio:fim])
+    bloco = m["interacoes"][codigos]  # usuário x ISBN (códigos do dicionário)
+    gostou = m["gostou"][inicio:fim]  # usuário x linha: livros do perfil
+    n = fim - inicio
+
+    candidatos = np.zeros((n, n_linhas), dtype=bool)
+    colaborativo = np.zeros((n, n_linhas))
+    if config.COLABORATIVO == "als":
+        usuarios, linhas, scores = _als_bloco(inicio, fim, bloco, m, top_n)
+    else:
+        usuarios, linhas = _jaccard_bloco(codigos, bloco, m, top_n)
+        scores = 1.0
+    colaborativo[usuarios, linhas] = scores
+    candidatos[usuarios, linhas] = True
+
+    conteudo = np.zeros((n, n_linhas))
+    usuarios, linhas, scores = _conteudo_bloco(gostou, m, top_n)
+    conteudo[usuarios, linhas] = scores
+    candidatos[usuarios, linhas] = True
+    com_conteudo = np.zeros(n, dtype=bool)
+    com_conteudo[usuarios] = True
+
+    # Afinidade só dos candidatos (e só de quem tem o sinal de conteúdo)
+    afinidade = CategoryAuthorAffinity.from_features(
+        m["rotulos"], m["rotulos_t"], parametros["n_categorias"], parametros["pesos_afinidade"]
+    )
+    afinidades = afinidade.score_block(afinidade.affinity_block(gostou)).toarray()
+    afinidades[~candidatos | ~com_conteudo[:, None]] = 0
+
+    blend = ScoreBlend(np.arange(n_linhas), n_linhas=n)
+    blend.add_aligned(colaborativo, config.PESO_JACCARD, normalizar=True)
+    blend.add_aligned(conteudo, config.PESO_TFIDF, normalizar=True)
+    blend.add_aligned(afinidades, config.PESO_AFINIDADE, normalizar=True)
+    usuarios, linhas = blend.top_n(top_n, m["ordem_isbn"], validos=candidatos)
+    scores = blend.score[usuarios, linhas]
+
+    frios = np.flatnonzero(~candidatos.any(axis=1))
+    populares = _populares_bloco(frios, bloco, m, top_n)
+    usuarios = np.concatenate([usuarios, populares[0]])
+    ordem = np.argsort(usuarios, kind="stable")
+    return (
+        usuarios[ordem] + inicio,
+        np.concatenate([linhas, populares[1]])[ordem],
+        np.concatenate([scores, populares[2]])[ordem],
+    )
+
+
+def pontuar_faixa(inicio, fim, m, parametros, top_n, chunk_size, config):
+    """Pontua os usuários [inicio, fim) do lote em blocos de `chunk_size`."""
+    return [
+        pontuar_bloco(bloco, min(bloco + chunk_size, fim), m, parametros, top_n, config)
+        for bloco in range(inicio, fim, chunk_size)
+    ]
+
+
+# --- Execução paralela com matrizes em memória compartilhada ---
+# O processo principal copia cada matriz (data/indices/indptr das CSR e os arrays
+# densos) para segmentos de shared memory uma única vez; cada worker se conecta a
+# eles no initializer, somente leitura, e só roda o pontuar_bloco. As tarefas
+# levam apenas a faixa de usuários, sem serializar as matrizes nem abrir um motor.
+
+_worker = {}
+
+
+def _compartilhar_array(array, segmentos):
+    array = np.ascontiguousarray(array)
+    shm = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    segmentos.append(shm)
+    np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf)[...] = array
+    return shm.name, array.shape, array.dtype.str
+
+
+def compartilhar(matrizes):
+    """
+    Copia as matrizes (CSR ou arrays) para shared memory. Retorna (descritores,
+    segmentos); quem criou os segmentos os libera com close() e unlink().
+    """
+    descritores, segmentos = {}, []
+    for nome, matriz in matrizes.items():
+        if sp.issparse(matriz):
+            matriz = sp.csr_matrix(matriz)
+            descritores[nome] = {
+                "shape": matriz.shape,
+                "arrays": [
+                    _compartilhar_array(a, segmentos) for a in (matriz.data, matriz.indices, matriz.indptr)
+                ],
+            }
+        else:
+            descritores[nome] = _compartilhar_array(np.asarray(matriz), segmentos)
+    return descritores, segmentos
+
+
+def _abrir_array(name, shape, dtype):
+    shm = shared_memory.SharedMemory(name=name)
+    _worker.setdefault("segmentos", []).append(shm)
+    array = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+    array.flags.writeable = False
+    return array
+
+
+def abrir(descritores):
+    """Reconstrói (sem copiar, somente leitura) as matrizes de `compartilhar`."""
+    matrizes = {}
+    for nome, descritor in descritores.items():
+        if isinstance(descritor, dict):
+            arrays = tuple(_abrir_array(*a) for a in descritor["arrays"])
+            matrizes[nome] = sp.csr_matrix(arrays, shape=descritor["shape"], copy=False)
+        else:
+            matrizes[nome] = _abrir_array(*descritor)
+    return matrizes
+
+
+def _iniciar_worker(descritores, parametros, top_n, chunk_size, config):
+    _worker["matrizes"] = abrir(descritores)
+    _worker["params"] = (parametros, top_n, chunk_size, config)
+
+
+def _pontuar_shard(faixa):
+    parametros, top_n, chunk_size, config = _worker["params"]
+    return pontuar_faixa(
+        faixa[0], faixa[1], _worker["matrizes"], parametros, top_n, chunk_size, config
+    )
+
+
+def gerar_recomendacoes(
+    config=None, version=None, top_n=10, workers=1, shard_size=512, chunk_size=256
+):
+    """
+    Gera o top-N de todos os usuários com interações sobre a versão publicada
+    `version` (padrão: CURRENT), com os mesmos sinais, pesos e desempate do
+    recomendar online, em blocos de `chunk_size` usuários. Retorna (DataFrame no
+    formato da tabela, estado do motor de onde saíram as matrizes). Com
+    `workers` > 1, as faixas de `shard_size` usuários são distribuídas num
+    ProcessPoolExecutor, sobre uma única cópia das matrizes em shared memory.
+    """
+    config = config or RecommenderConfig.get_instance()
+    version = version or current_version(config.ARTIFACTS_DIR)
+    engine = RecommenderEngine(config, version=version)
+    usuario_ids, matrizes, parametros, estado = engine.batch_inputs()
+    isbns = np.asarray(engine.tfidf_index.isbns)
+
+    if workers <= 1:
+        partes = pontuar_faixa(0, len(usuario_ids), matrizes, parametros, top_n, chunk_size, config)
+        return montar_tabela(usuario_ids, isbns, partes), estado
+
+    faixas = [
+        (inicio, min(inicio + shard_size, len(usuario_ids)))
+        for inicio in range(0, len(usuario_ids), shard_size)
+    ]
+    descritores, segmentos = compartilhar(matrizes)
+    try:
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_iniciar_worker,
+            initargs=(descritores, parametros, top_n, chunk_size, config),
+        ) as executor:
+            partes = [parte for shard in executor.map(_pontuar_shard, faixas) for parte in shard]
+    finally:
+        for shm in segmentos:
+            shm.close()
+            shm.unlink()
+    return montar_tabela(usuario_ids, isbns, partes), estado
+
+
+def montar_tabela(usuario_ids, isbns, partes):
+    generated_at = datetime.datetime.utcnow().isoformat(timespec="seconds")
+    frames = []
+    for usuarios, linhas, scores in partes:
+        # Posição de cada recomendação dentro do grupo do seu usuário
+        rank = np.arange(len(usuarios)) - np.searchsorted(usuarios, usuarios, side="left") + 1
+        frames.append(
+            pd.DataFrame(
+                {
+                    "usuario_id": np.asarray(usuario_ids)[usuarios],
+                    "rank": rank,
+                    "isbn13": isbns[linhas],
+                    "score": scores,
+                    "generated_at": generated_at,
+                }
+            )
+        )
+    if not frames:
+        return pd.DataFrame(columns=["usuario_id", "rank", "isbn13", "score", "generated_at"])
+    return pd.concat(frames, ignore_index=True)
+
+
+def salvar_recomendacoes(conn, recomendacoes, estado, top_n):
+    """
+    Substitui o conteúdo da tabela Recomendacoes numa única transação, com o
+    estado do motor que gerou o lote (em RecomendacoesLote).
+    """
+    with conn:
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS Recomendacoes (
+                usuario_id INTEGER NOT NULL,
+                rank INTEGER NOT NULL,
+                isbn13 TEXT NOT NULL,
+                score REAL NOT NULL,
+                generated_at TEXT NOT NULL,
+                PRIMARY KEY (usuario_id, rank)
+            )
+            """
+        )
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS RecomendacoesLote (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                estado TEXT,
+                top_n INTEGER NOT NULL,
+                generated_at TEXT NOT NULL
+            )
+            """
+        )
+        conn.execute("DELETE FROM Recomendacoes")
+        conn.executemany(
+            "INSERT INTO Recomendacoes (usuario_id, rank, isbn13, score, generated_at) "
+            "VALUES (?, ?, ?, ?, ?)",
+            recomendacoes[["usuario_id", "rank", "isbn13", "score", "generated_at"]]
+            .astype({"usuario_id": int, "rank": int, "score": float})
+            .itertuples(index=False, name=None),
+        )
+        conn.execute(
+            "INSERT OR REPLACE INTO RecomendacoesLote (id, estado, top_n, generated_at) "
+            "VALUES (1, ?, ?, ?)",
+            (
+                None if estado is None else json.dumps(estado, sort_keys=True),
+                top_n,
+                datetime.datetime.utcnow().isoformat(timespec="seconds"),
+            ),
+        )
+
+
+class LoteRecomendacoes:
+    """
+    Lado web do lote: serve o top-N pré-calculado em Recomendacoes, no formato de
+    engine.recomendar, quando o lote vale para o motor carregado; senão None e
+    quem chamou calcula online. Filtros de disponibilidade não entram no lote.
+
+    O estado do lote (RecomendacoesLote) fica em memória e só é relido quando a
+    versão dos dados do motor muda ou a cada `intervalo` segundos (para achar um
+    lote novo). O lote vale se foi gerado com os mesmos artefatos, catálogo e
+    configuração; notas e interações inseridas depois dele invalidam só os
+    usuários que as fizeram (como o cache), e linhas apagadas ou alteradas
+    invalidam o lote todo.
+
+    Um `n` menor que o top_n do lote é servido como prefixo do top-N gravado. O
+    prefixo pode diferir do recomendar online com o mesmo `n`, que corta cada
+    sinal em `n` candidatos antes da combinação (o lote corta em top_n).
+    """
+
+    def __init__(self, db_path, intervalo=5.0):
+        self.db_path = db_path
+        self.intervalo = intervalo
+        self._lock = threading.Lock()
+        self._local = threading.local()  # uma conexão por thread
+        self._chave = None  # versão dos dados do motor quando o estado foi lido
+        self._lido_em = float("-inf")
+        self._lote = None  # (estado gravado, generated_at, top_n, usuários invalidados) ou None
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path)
+            self._local.conn = conn
+        return conn
+
+    def _atual(self, engine):
+        estado = engine.state()
+        chave = (
+            estado["version"],
+            tuple(estado["catalog_version"]),
+            tuple(estado["ratings_version"]),
+            tuple(estado["implicit_version"]),
+        )
+        agora = time.monotonic()
+        with self._lock:
+            if chave != self._chave or agora - self._lido_em >= self.intervalo:
+                self._lote = self._carregar(self._conn(), estado)
+                self._chave = chave
+                self._lido_em = agora
+            return self._lote
+
+    def _carregar(self, conn, estado):
+        try:
+            linha = conn.execute(
+                "SELECT estado, top_n, generated_at FROM RecomendacoesLote WHERE id = 1"
+            ).fetchone()
+        except sqlite3.OperationalError:
+            return None  # lote nunca gerado neste banco
+        if linha is None or linha[0] is None:
+            return None
+        gravado = json.loads(linha[0])
+        if any(gravado[k] != estado[k] for k in ("version", "catalog_version", "config")):
+            return None
+        invalidos = set()
+        for tabela, chave in (
+            ("NotasLivros", "ratings_version"),
+            ("InteracoesImplicitas", "implicit_version"),
+        ):
+            usuarios = self._usuarios_desde(conn, tabela, gravado[chave], estado[chave])
+            if usuarios is None:
+                return None
+            invalidos |= usuarios
+        return linha[0], linha[2], linha[1], frozenset(invalidos)
+
+    @staticmethod
+    def _usuarios_desde(conn, tabela, antiga, atual):
+        """
+        Usuários com linhas inseridas em `tabela` entre a versão (COUNT, MAX(id)) do
+        lote e a do motor, ou None se a contagem ou o marcador de alterações (3º
+        campo da versão das notas) não batem (linhas apagadas ou alteradas).
+        """
+        if list(antiga) == list(atual):
+            return set()
+        if list(antiga[2:]) != list(atual[2:]):
+            return None
+        (n_antiga, max_antiga), (n_atual, max_atual) = antiga[:2], atual[:2]
+        if max_atual < max_antiga:
+            return None
+        usuarios = [
+            u
+            for (u,) in conn.execute(
+                f"SELECT usuario_id FROM {tabela} WHERE id > ? AND id <= ?",
+                (max_antiga, max_atual),
+            )
+        ]
+        return set(usuarios) if len(usuarios) == n_atual - n_antiga else None
+
+    def get(self, engine, usuario_id, top_n=10):
+        if engine.disponibilidade is not None:
+            return None
+        lote = self._atual(engine)
+        if lote is None:
+            return None
+        estado, generated_at, lote_top_n, invalidos = lote
+        if top_n > lote_top_n or usuario_id in invalidos:
+            return None
+        # Só as linhas do lote lido: se outro lote foi gravado depois, nada volta
+        linhas = self._conn().execute(
+            "SELECT r.isbn13, r.score FROM RecomendacoesLote l "
+            "JOIN Recomendacoes r ON r.usuario_id = ? AND r.rank <= ? "
+            "WHERE l.id = 1 AND l.generated_at = ? AND l.estado = ? ORDER BY r.rank",
+            (usuario_id, top_n, generated_at, estado),
+        ).fetchall()
+        if not linhas:
+            return None
+        return engine.records([isbn for isbn, _ in linhas], [score for _, score in linhas])
+
+
+if __name__ == "__main__":
+    # Geração em lote: python -m scripts.batch_recommendations --top-n 10 --workers 8
+    parser = argparse.ArgumentParser(description="Pré-calcula o top-N híbrido de todos os usuários.")
+    parser.add_argument("--top-n", type=int, default=10)
+    parser.add_argument("--shard-size", type=int, default=512, help="usuários por tarefa")
+    parser.add_argument("--chunk-size", type=int, default=256, help="usuários por bloco de matrizes")
+    parser.add_argument("--workers", type=int, default=1, help="processos (padrão: 1)")
+    parser.add_argument("--db", default=RecommenderConfig.get_instance().DB_PATH)
+    args = parser.parse_args()
+
+    config = RecommenderConfig.with_overrides(DB_PATH=args.db)
+    recomendacoes, estado = gerar_recomendacoes(
+        config,
+        top_n=args.top_n,
+        workers=args.workers,
+        shard_size=args.shard_size,
+        chunk_size=args.chunk_size,
+    )
+    conn = sqlite3.connect(args.db)
+    salvar_recomendacoes(conn, recomendacoes, estado, args.top_n)
+    conn.close()
+    print(
+        f"{len(recomendacoes)} recomendações geradas para "
+        f"{recomendacoes['usuario_id'].nunique()} usuários."
+    )
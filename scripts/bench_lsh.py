@@ -0,0 +1,83 @@
+import argparse
+import sqlite3
+import time
+
+import numpy as np
+import pandas as pd
+
+from scripts.config import RecommenderConfig
+from scripts.interaction_matrix import InteractionMatrix
+from scripts.minhash_lsh import MinHashLSH
+
+
+def synthetic_ratings(n_users, n_books=20000, n_clusters=200, per_user=(8, 20), seed=0):
+    """
+    Avaliações sintéticas com estrutura de vizinhança: cada usuário pertence a um
+    grupo e escolhe a maior parte dos livros do acervo do seu grupo.
+    """
+    rng = np.random.default_rng(seed)
+    pools = rng.integers(0, n_books, size=(n_clusters, 60))
+    usuarios, isbns = [], []
+    for usuario_id in range(n_users):
+        n = rng.integers(per_user[0], per_user[1] + 1)
+        pool = pools[usuario_id % n_clusters]
+        do_grupo = rng.choice(pool, size=int(n * 0.8), replace=False)
+        aleatorios = rng.integers(0, n_books, size=n - len(do_grupo))
+        livros = np.unique(np.concatenate([do_grupo, aleatorios]))
+        usuarios.extend([usuario_id] * len(livros))
+        isbns.extend(livros.tolist())
+    return pd.DataFrame({"usuario_id": usuarios, "isbn13": isbns})
+
+
+def top_k(users, sims, k):
+    order = np.argsort(-sims, kind="stable")[:k]
+    return set(users[order][sims[order] > 0].tolist())
+
+
+def run(notas, num_perm, bands, k=10, sample=200, seed=0):
+    interacoes = InteractionMatrix.from_ratings(notas)
+    inicio = time.perf_counter()
+    lsh = MinHashLSH.from_csr(interacoes.to_csr(), num_perm=num_perm, bands=bands)
+    build = time.perf_counter() - inicio
+
+    rng = np.random.default_rng(seed)
+    alvos = rng.choice(interacoes.user_ids, size=min(sample, len(interacoes.user_ids)), replace=False)
+    t_exact, t_lsh, recalls = [], [], []
+    for usuario_id in alvos.tolist():
+        inicio = time.perf_counter()
+        users, sims = interacoes.jaccard_similarity(usuario_id)
+        t_exact.append(time.perf_counter() - inicio)
+        exatos = top_k(users, sims, k)
+
+        inicio = time.perf_counter()
+        candidatos = lsh.candidates(interacoes.user_index[usuario_id])
+        users, sims = interacoes.jaccard_with(usuario_id, candidatos)
+        t_lsh.append(time.perf_counter() - inicio)
+        if exatos:
+            recalls.append(len(exatos & top_k(users, sims, k)) / len(exatos))
+
+    ms = lambda t: 1000 * np.percentile(t, [50, 95])
+    print(f"usuários={interacoes.shape[0]} livros={interacoes.shape[1]} num_perm={num_perm} bands={bands}")
+    print(f"  construção das assinaturas: {build:.2f}s")
+    print("  exato: p50={:.2f}ms p95={:.2f}ms".format(*ms(t_exact)))
+    print("  lsh:   p50={:.2f}ms p95={:.2f}ms".format(*ms(t_lsh)))
+    print(f"  recall@{k} dos vizinhos: {np.mean(recalls):.3f}")
+
+
+if __name__ == "__main__":
+    # python -m scripts.bench_lsh --synthetic 50000 --num-perm 128 --bands 64
+    parser = argparse.ArgumentParser(description="Compara vizinhos MinHash/LSH com o Jaccard exato.")
+    parser.add_argument("--synthetic", type=int, default=0, help="número de usuários sintéticos")
+    parser.add_argument("--num-perm", type=int, default=RecommenderConfig.get_instance().MINHASH_NUM_PERM)
+    parser.add_argument("--bands", type=int, default=RecommenderConfig.get_instance().MINHASH_BANDS)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--sample", type=int, default=200)
+    args = parser.parse_args()
+
+    if args.synthetic:
+        notas = synthetic_ratings(args.synthetic)
+    else:
+        conn = sqlite3.connect(RecommenderConfig.get_instance().DB_PATH)
+        notas = pd.read_sql("SELECT usuario_id, isbn13 FROM NotasLivros", conn)
+        conn.close()
+    run(notas, args.num_perm, args.bands, k=args.k, sample=args.sample)
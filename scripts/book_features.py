@@ -0,0 +1,128 @@
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+
+
+def one_hot(values, sep=";"):
+    """
+    Matriz esparsa livro x rótulo (0/1) a partir de uma coluna com vários rótulos
+    separados por `sep` (ex.: authors, categories), com os rótulos codificados
+    como inteiros uma única vez. Retorna (matriz CSR float32, rótulos).
+    """
+    values = pd.Series(values).fillna("").astype(str).reset_index(drop=True)
+    rotulos = values.str.split(sep).explode().str.strip()
+    rotulos = rotulos[rotulos != ""]
+    codes, labels = pd.factorize(rotulos, sort=True)
+    rows = rotulos.index.to_numpy(dtype=np.int64)
+    matrix = sp.csr_matrix(
+        (np.ones(len(codes), dtype=np.float32), (rows, codes)),
+        shape=(len(values), len(labels)),
+    )
+    matrix.sum_duplicates()
+    matrix.data[:] = 1.0
+    return matrix, np.asarray(labels, dtype=str)
+
+
+def normalize_rows(matrix):
+    """Normaliza as linhas (L2) de uma matriz esparsa; linhas vazias continuam vazias."""
+    matrix = sp.csr_matrix(matrix, dtype=np.float32)
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    norms[norms == 0] = 1.0
+    return sp.csr_matrix(sp.diags(1.0 / norms).astype(np.float32) @ matrix)
+
+
+class CategoryAuthorAffinity:
+    """
+    Afinidade do usuário com categorias e autores, como sinal de pontuação.
+
+    Os livros viram uma matriz one-hot livro x (categorias + autores), montada
+    uma vez por catálogo. A afinidade do usuário é o conjunto de rótulos dos livros
+    que ele avaliou bem (1 para cada categoria/autor presente neles), com cada
+    bloco dividido pelo seu tamanho e multiplicado pelo peso. O score de um livro
+    é o produto esparso afinidade x rótulos do livro:
+    peso_categoria * fração das categorias do usuário presentes no livro
+    + peso_autor * fração dos autores do usuário presentes no livro.
+    """
+
+    def __init__(self, categorias, autores, peso_categoria=0.5, peso_autor=0.5):
+        self.n_categorias = categorias.shape[1]
+        self.pesos = (peso_categoria, peso_autor)
+        self.features = sp.hstack([categorias, autores], format="csr", dtype=np.float32)
+        self.postings = self.features.T.tocsr()  # rótulo x livro (índice invertido)
+
+    @classmethod
+    def from_features(cls, features, postings, n_categorias, pesos):
+        """
+        Reabre a afinidade a partir das matrizes já montadas (ex.: em memória
+        compartilhada pelo lote), sem copiá-las.
+        """
+        afinidade = cls.__new__(cls)
+        afinidade.n_categorias = n_categorias
+        afinidade.pesos = tuple(pesos)
+        afinidade.features = features
+        afinidade.postings = postings
+        return afinidade
+
+    @classmethod
+    def from_livros(cls, livros, peso_categoria=0.5, peso_autor=0.5):
+        """Codifica as colunas categories e authors (separadas por ";") dos livros."""
+        categorias, _ = one_hot(livros["categories"])
+        autores, _ = one_hot(livros["authors"])
+        return cls(categorias, autores, peso_categoria, peso_autor)
+
+    def _weights(self, indicador):
+        """Pesos por rótulo de cada linha de `indicador` (usuário x rótulo, 0/1)."""
+        indicador = sp.csr_matrix(indicador, dtype=np.float32)
+        indicador.data[:] = 1.0
+        blocos = []
+        for inicio, fim, peso in (
+            (0, self.n_categorias, self.pesos[0]),
+            (self.n_categorias, indicador.shape[1], self.pesos[1]),
+        ):
+            bloco = indicador[:, inicio:fim]
+            tamanhos = np.asarray(bloco.sum(axis=1)).ravel()
+            tamanhos[tamanhos == 0] = 1.0
+            blocos.append(sp.diags((peso / tamanhos).astype(np.float32)) @ bloco)
+        return sp.hstack(blocos, format="csr", dtype=np.float32)
+
+    def affinity(self, rows):
+        """Vetor de afinidade (1 x rótulos) a partir das linhas dos livros bem avaliados."""
+        rows = np.asarray(rows, dtype=np.int64)
+        if len(rows) == 0:
+            return None
+        indicador = self.features[rows].sum(axis=0) > 0
+        return self._weights(sp.csr_matrix(indicador))
+
+    def affinity_block(self, gostou):
+        """
+        Afinidades (usuário x rótulo) de várias linhas de `gostou` (usuário x livro,
+        0/1) de uma vez, como `affinity` em cada linha.
+        """
+        return self._weights((gostou @ self.features) > 0)
+
+    def score_block(self, afinidades):
+        """Scores (CSR usuário x livro) de várias afinidades num único produto com o índice invertido."""
+        return sp.csr_matrix(afinidades @ self.postings)
+
+    def score(self, affinity, candidate_rows=None):
+        """
+        Score dos livros com algum rótulo em comum com a afinidade: (linhas, scores).
+        Com `candidate_rows`, só essas linhas são pontuadas.
+        """
+        if candidate_rows is not None:
+            rows = np.asarray(candidate_rows, dtype=np.int64)
+            scores = self.score_rows(affinity, rows)
+            return rows[scores > 0], scores[scores > 0]
+        sub = self.postings[affinity.indices]
+        counts = np.diff(sub.indptr)
+        contrib = sub.data * np.repeat(affinity.data, counts)
+        rows, inverse = np.unique(sub.indices, return_inverse=True)
+        scores = np.bincount(inverse, weights=contrib, minlength=len(rows))
+        return rows, scores
+
+    def score_rows(self, affinity, rows):
+        """Score apenas dos livros de `rows` (ex.: candidatos de outros sinais)."""
+        rows = np.asarray(rows, dtype=np.int64)
+        if affinity is None or len(rows) == 0:
+            return np.zeros(len(rows), dtype=np.float64)
+        return np.asarray(self.features[rows] @ affinity.T.toarray()).ravel()
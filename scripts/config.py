@@ -0,0 +1,114 @@
+import os
+from types import SimpleNamespace
+
+
+class RecommenderConfig:
+    # Singleton, no mesmo formato da Configuration da API
+    _instance = None
+
+    @classmethod
+    def get_instance(cls):
+        """Retorna a instância única da configuração do recomendador."""
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(RecommenderConfig, cls).__new__(cls)
+            cls._instance._load_config()
+        return cls._instance
+
+    def _load_config(self):
+        """Carrega as configurações de ambiente ou valores padrão."""
+        PATH = os.path.dirname(os.path.abspath(__file__))
+
+        # Banco com as tabelas usuarios, Biblioteca e NotasLivros
+        self.DB_PATH = os.environ.get(
+            "RECOMMENDER_DB_PATH", os.path.join(PATH, "..", "bd", "saber.db")
+        )
+        # Diretório dos artefatos pré-construídos (índice TF-IDF etc.)
+        self.ARTIFACTS_DIR = os.environ.get(
+            "RECOMMENDER_ARTIFACTS_DIR", os.path.join(PATH, "..", "bd", "recomendador")
+        )
+
+        # Vetorização das descrições: "vocabulary" (TfidfVectorizer, refeito quando o
+        # catálogo muda) ou "hashing" (HASHING_N_FEATURES colunas fixas, IDF mantido à
+        # parte; livros novos são anexados sem refit)
+        self.TFIDF_MODE = os.environ.get("RECOMMENDER_TFIDF_MODE", "vocabulary")
+        self.HASHING_N_FEATURES = int(os.environ.get("RECOMMENDER_HASHING_N_FEATURES", 2**18))
+
+        # Dimensões do LSA (TruncatedSVD das descrições): com LSA_DIMS > 0 o sinal de
+        # conteúdo pontua embeddings densos float32 em vez da matriz TF-IDF esparsa
+        self.LSA_DIMS = int(os.environ.get("RECOMMENDER_LSA_DIMS", 0))
+
+        # Pesos do híbrido em recomendar_livros
+        self.PESO_JACCARD = float(os.environ.get("RECOMMENDER_PESO_JACCARD", 0.3))
+        self.PESO_TFIDF = float(os.environ.get("RECOMMENDER_PESO_TFIDF", 0.7))
+        # Afinidade com categorias/autores (terceiro sinal) e o peso de cada bloco nela
+        self.PESO_AFINIDADE = float(os.environ.get("RECOMMENDER_PESO_AFINIDADE", 0.2))
+        self.PESO_AFINIDADE_CATEGORIA = float(
+            os.environ.get("RECOMMENDER_PESO_AFINIDADE_CATEGORIA", 0.5)
+        )
+        self.PESO_AFINIDADE_AUTOR = float(os.environ.get("RECOMMENDER_PESO_AFINIDADE_AUTOR", 0.5))
+        self.NOTA_POSITIVA = int(os.environ.get("RECOMMENDER_NOTA_POSITIVA", 4))
+        # Peso de cada aluguel da API (interação implícita, via python -m
+        # api.services.rental_etl) na matriz de interações, onde cada nota vale 1
+        self.PESO_ALUGUEL = float(os.environ.get("RECOMMENDER_PESO_ALUGUEL", 0.5))
+
+        # Vizinhos do Jaccard: "exact" compara com todos os usuários que têm livros em
+        # comum; "lsh" só com os candidatos do índice MinHash/LSH (aproximado). Com
+        # b bandas de r = NUM_PERM / b linhas, um par com Jaccard J vira candidato com
+        # probabilidade 1 - (1 - J^r)^b: 64 x 2 (limiar ~ (1/64)^(1/2) = 0.125) acha
+        # ~47% dos pares com J = 0.1, 93% com J = 0.2 e > 99% a partir de 0.3. Os
+        # usuários têm poucos livros em comum e o modo exato usa todo vizinho com J > 0,
+        # então bandas mais largas perdem vizinhos demais (32 x 4: limiar ~0.42;
+        # 16 x 8: ~0.71)
+        self.JACCARD_MODE = os.environ.get("RECOMMENDER_JACCARD_MODE", "exact")
+        self.MINHASH_NUM_PERM = int(os.environ.get("RECOMMENDER_MINHASH_NUM_PERM", 128))
+        self.MINHASH_BANDS = int(os.environ.get("RECOMMENDER_MINHASH_BANDS", 64))
+
+        # Sinal colaborativo do híbrido: "jaccard" (livros populares entre os vizinhos)
+        # ou "als" (fatores latentes treinados com python -m scripts.matrix_factorization)
+        self.COLABORATIVO = os.environ.get("RECOMMENDER_COLABORATIVO", "jaccard")
+        self.ALS_FACTORS = int(os.environ.get("RECOMMENDER_ALS_FACTORS", 64))
+        self.ALS_REGULARIZATION = float(os.environ.get("RECOMMENDER_ALS_REGULARIZATION", 0.1))
+        self.ALS_ALPHA = float(os.environ.get("RECOMMENDER_ALS_ALPHA", 10.0))
+        self.ALS_ITERATIONS = int(os.environ.get("RECOMMENDER_ALS_ITERATIONS", 10))
+
+        # Livros similares ("mais como este"): k vizinhos por livro, pesos de cada
+        # sinal na similaridade e linhas por bloco no produto esparso (0 = automático)
+        self.SIMILARES_K = int(os.environ.get("RECOMMENDER_SIMILARES_K", 20))
+        self.SIMILARES_PESO_TFIDF = float(os.environ.get("RECOMMENDER_SIMILARES_PESO_TFIDF", 0.6))
+        self.SIMILARES_PESO_CATEGORIA = float(
+            os.environ.get("RECOMMENDER_SIMILARES_PESO_CATEGORIA", 0.2)
+        )
+        self.SIMILARES_PESO_AUTOR = float(os.environ.get("RECOMMENDER_SIMILARES_PESO_AUTOR", 0.2))
+        self.SIMILARES_BLOCK_SIZE = int(os.environ.get("RECOMMENDER_SIMILARES_BLOCK_SIZE", 0))
+
+        # Ranking de popularidade (média bayesiana) para usuários sem notas: peso de cada
+        # nota interna frente às externas da Biblioteca, avaliações equivalentes da média
+        # global (0 = mediana) e atraso (segundos) da reconstrução em segundo plano
+        # depois de notas novas (0 = reconstrói na hora, dentro do refresh)
+        self.POPULARIDADE_PESO_INTERNO = float(
+            os.environ.get("RECOMMENDER_POPULARIDADE_PESO_INTERNO", 1.0)
+        )
+        self.POPULARIDADE_PRIOR = float(os.environ.get("RECOMMENDER_POPULARIDADE_PRIOR", 0))
+        self.POPULARIDADE_INTERVAL = float(os.environ.get("RECOMMENDER_POPULARIDADE_INTERVAL", 60))
+
+        # Linhas por bloco (fetchmany) nas leituras de NotasLivros e Biblioteca
+        self.LOAD_CHUNK_SIZE = int(os.environ.get("RECOMMENDER_LOAD_CHUNK_SIZE", 50000))
+
+        # Intervalo mínimo (segundos) entre verificações de versão dos dados
+        self.REFRESH_INTERVAL = float(os.environ.get("RECOMMENDER_REFRESH_INTERVAL", 5))
+
+    @classmethod
+    def with_overrides(cls, **overrides):
+        """Cópia (não singleton) da configuração atual com alguns valores trocados."""
+        values = dict(vars(cls.get_instance()))
+        values.update(overrides)
+        return SimpleNamespace(**values)
+
+    def reload(self):
+        """Recarrega as configurações, útil para ambientes dinâmicos."""
+        self._load_config()
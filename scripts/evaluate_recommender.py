@@ -0,0 +1,238 @@
+import argparse
+import json
+import os
+import sqlite3
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from scripts.config import RecommenderConfig
+from scripts.getRecommendations import RecommenderEngine
+
+# Algoritmo -> (sobrescritas da configuração, função que devolve os ISBNs recomendados)
+ALGORITMOS = {
+    "tfidf": ({}, lambda e, u, k: e.tfidf_recommendation(u, top_n=k)),
+    "jaccard": ({}, lambda e, u, k: e.jaccard_recommendation(u, top_n=k)),
+    "afinidade": ({}, lambda e, u, k: e.affinity_recommendation(u, top_n=k)),
+    "als": ({"COLABORATIVO": "als"}, lambda e, u, k: e.als_recommendation(u, top_n=k)),
+    "hibrido": ({}, lambda e, u, k: e.recomendar(u, top_n=k)),
+    "hibrido_als": ({"COLABORATIVO": "als"}, lambda e, u, k: e.recomendar(u, top_n=k)),
+    "tfidf_hashing": ({"TFIDF_MODE": "hashing"}, lambda e, u, k: e.tfidf_recommendation(u, top_n=k)),
+    "hibrido_hashing": ({"TFIDF_MODE": "hashing"}, lambda e, u, k: e.recomendar(u, top_n=k)),
+    "tfidf_lsa": ({"LSA_DIMS": 128}, lambda e, u, k: e.tfidf_recommendation(u, top_n=k)),
+    "hibrido_lsa": ({"LSA_DIMS": 128}, lambda e, u, k: e.recomendar(u, top_n=k)),
+}
+
+# Vocabulário das descrições sintéticas
+PALAVRAS = np.array([f"termo{i}" for i in range(4000)])
+
+
+def synthetic_dataset(n_users, n_books=None, n_clusters=None, per_user=(8, 30), seed=0):
+    """
+    Catálogo e notas sintéticos com estrutura de grupos: cada livro pertence a um
+    grupo (categoria, autores e vocabulário próprios) e cada usuário avalia
+    principalmente livros do seu grupo, com notas mais altas para eles.
+    Retorna (livros, notas) nos formatos de Biblioteca e NotasLivros.
+    """
+    rng = np.random.default_rng(seed)
+    n_books = n_books or max(200, n_users // 5)
+    n_clusters = n_clusters or max(5, n_books // 50)
+
+    grupo_livro = rng.integers(0, n_clusters, size=n_books)
+    vocab_grupo = rng.integers(0, len(PALAVRAS), size=(n_clusters, 40))
+    descricoes = [
+        " ".join(PALAVRAS[rng.choice(vocab_grupo[g], size=12)]) for g in grupo_livro.tolist()
+    ]
+    livros = pd.DataFrame(
+        {
+            "isbn13": [f"{9780000000000 + i}" for i in range(n_books)],
+            "title": [f"Livro {i}" for i in range(n_books)],
+            "authors": [f"Autor {g}-{rng.integers(0, 5)}" for g in grupo_livro.tolist()],
+            "categories": [f"Categoria {g}" for g in grupo_livro.tolist()],
+            "thumbnail": None,
+            "description": descricoes,
+            "average_rating": rng.uniform(2.5, 5.0, size=n_books).round(2),
+            "ratings_count": rng.integers(0, 5000, size=n_books),
+        }
+    )
+
+    livros_do_grupo = [np.flatnonzero(grupo_livro == g) for g in range(n_clusters)]
+    usuarios, isbns, notas = [], [], []
+    for usuario_id in range(1, n_users + 1):
+        n = int(rng.integers(per_user[0], per_user[1] + 1))
+        pool = livros_do_grupo[usuario_id % n_clusters]
+        do_grupo = rng.choice(pool, size=min(len(pool), int(n * 0.8)), replace=False)
+        aleatorios = rng.integers(0, n_books, size=n - len(do_grupo))
+        escolhidos, primeira = np.unique(np.concatenate([do_grupo, aleatorios]), return_index=True)
+        no_grupo = primeira < len(do_grupo)
+        usuarios.extend([usuario_id] * len(escolhidos))
+        isbns.extend(livros["isbn13"].to_numpy()[escolhidos].tolist())
+        altas = rng.integers(3, 6, size=len(escolhidos))
+        baixas = rng.integers(1, 4, size=len(escolhidos))
+        notas.extend(np.where(no_grupo, altas, baixas).tolist())
+
+    # A ordem das linhas (id) simula a ordem temporal das avaliações
+    notas = pd.DataFrame({"usuario_id": usuarios, "isbn13": isbns, "nota": notas})
+    notas = notas.sample(frac=1.0, random_state=seed).reset_index(drop=True)
+    notas.insert(0, "id", np.arange(1, len(notas) + 1))
+    return livros, notas
+
+
+def split_ratings(notas, k=2, mode="leave-k-out", nota_positiva=4, min_notas=5, seed=0):
+    """
+    Separa notas de teste por usuário: `k` notas positivas de cada usuário com
+    pelo menos `min_notas` avaliações, escolhidas ao acaso ("leave-k-out") ou as
+    mais recentes pelo id ("time"). Retorna (treino, teste por usuário).
+    """
+    rng = np.random.default_rng(seed)
+    tamanhos = notas.groupby("usuario_id")["id"].transform("size")
+    positivas = notas[(notas["nota"] >= nota_positiva) & (tamanhos >= min_notas)]
+    if mode == "time":
+        teste = positivas.sort_values("id").groupby("usuario_id").tail(k)
+    else:
+        ordem = positivas.assign(_r=rng.random(len(positivas))).sort_values("_r")
+        teste = ordem.groupby("usuario_id").head(k).drop(columns="_r")
+    treino = notas[~notas["id"].isin(teste["id"])]
+    return treino, teste.groupby("usuario_id")["isbn13"].apply(set).to_dict()
+
+
+def write_db(path, livros, notas):
+    """Grava um banco com as tabelas Biblioteca e NotasLivros usadas pelo motor."""
+    conn = sqlite3.connect(path)
+    colunas = ["isbn13", "title", "authors", "categories", "thumbnail", "description",
+               "average_rating", "ratings_count"]
+    livros[colunas].to_sql("Biblioteca", conn, index=False, if_exists="replace")
+    notas[["id", "usuario_id", "isbn13", "nota"]].to_sql(
+        "NotasLivros", conn, index=False, if_exists="replace"
+    )
+    conn.commit()
+    conn.close()
+
+
+def _isbns(resultado):
+    if isinstance(resultado, pd.DataFrame):
+        return resultado["isbn13"].tolist() if "isbn13" in resultado else []
+    return [r["isbn13"] for r in resultado]
+
+
+def ranking_metrics(recomendacoes, teste, k, n_livros):
+    """
+    precision@k (média por usuário, sempre sobre k), recall@k (acertos / notas de
+    teste, somados em todos os usuários) e cobertura do catálogo (livros distintos
+    recomendados / `n_livros`). `recomendacoes`: usuário -> ISBNs em ordem;
+    `teste`: usuário -> conjunto de ISBNs relevantes.
+    """
+    acertos, relevantes, recomendados, precisoes = 0, 0, set(), []
+    for usuario_id, isbns in recomendacoes.items():
+        isbns = isbns[:k]
+        hits = len(teste[usuario_id].intersection(isbns))
+        precisoes.append(hits / k)
+        acertos += hits
+        relevantes += len(teste[usuario_id])
+        recomendados.update(isbns)
+    return {
+        f"precision@{k}": float(np.mean(precisoes)) if precisoes else 0.0,
+        f"recall@{k}": acertos / max(relevantes, 1),
+        "cobertura": len(recomendados) / n_livros,
+    }
+
+
+def evaluate(algoritmo, db_path, teste, n_livros, k=10, sample=500, seed=0):
+    """
+    Avalia um algoritmo: precision@k, recall@k e cobertura do catálogo sobre os
+    usuários de teste, latência (p50/p95 por pedido) e pico de memória
+    (tracemalloc durante a carga do motor e as primeiras consultas).
+    """
+    overrides, recomendar = ALGORITMOS[algoritmo]
+    with tempfile.TemporaryDirectory() as artefatos:
+        config = RecommenderConfig.with_overrides(
+            DB_PATH=db_path, ARTIFACTS_DIR=artefatos, REFRESH_INTERVAL=3600, **overrides
+        )
+        rng = np.random.default_rng(seed)
+        usuarios = np.array(sorted(teste))
+        usuarios = rng.choice(usuarios, size=min(sample, len(usuarios)), replace=False)
+
+        # Pico de memória: carga do motor + algumas consultas (tracemalloc deixa as
+        # consultas mais lentas, então a latência é medida depois, sem ele)
+        tracemalloc.start()
+        inicio = time.perf_counter()
+        engine = RecommenderEngine(config)
+        engine.refresh()
+        carga = time.perf_counter() - inicio
+        for usuario_id in usuarios[:20].tolist():
+            recomendar(engine, usuario_id, k)
+        _, pico = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        latencias, recomendacoes = [], {}
+        for usuario_id in usuarios.tolist():
+            inicio = time.perf_counter()
+            recomendacoes[usuario_id] = _isbns(recomendar(engine, usuario_id, k))[:k]
+            latencias.append(time.perf_counter() - inicio)
+
+    p50, p95 = 1000 * np.percentile(latencias, [50, 95])
+    return {
+        "algoritmo": algoritmo,
+        "usuarios_teste": len(usuarios),
+        **ranking_metrics(recomendacoes, teste, k, n_livros),
+        "carga_s": carga,
+        "latencia_p50_ms": float(p50),
+        "latencia_p95_ms": float(p95),
+        "pico_memoria_mb": pico / 2**20,
+    }
+
+
+def run(livros, notas, algoritmos, k=10, split="leave-k-out", holdout=2, sample=500, seed=0):
+    treino, teste = split_ratings(notas, k=holdout, mode=split, seed=seed)
+    resultados = []
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "saber.db")
+        write_db(db_path, livros, treino)
+        for algoritmo in algoritmos:
+            resultado = evaluate(algoritmo, db_path, teste, len(livros), k=k, sample=sample, seed=seed)
+            resultado.update(usuarios=int(notas["usuario_id"].nunique()), livros=len(livros), split=split)
+            resultados.append(resultado)
+            print(
+                "{algoritmo:>15} P@{k}={p:.4f} R@{k}={r:.4f} cobertura={cobertura:.3f} "
+                "carga={carga_s:.2f}s p50={latencia_p50_ms:.2f}ms p95={latencia_p95_ms:.2f}ms "
+                "memória={pico_memoria_mb:.1f}MB".format(
+                    k=k, p=resultado[f"precision@{k}"], r=resultado[f"recall@{k}"], **resultado
+                )
+            )
+    return resultados
+
+
+if __name__ == "__main__":
+    # python -m scripts.evaluate_recommender --synthetic 100,1000,10000 --k 10
+    parser = argparse.ArgumentParser(description="Avaliação offline e benchmark dos recomendadores.")
+    parser.add_argument("--synthetic", default="", help="usuários sintéticos, ex.: 100,1000,100000")
+    parser.add_argument("--db", default=RecommenderConfig.get_instance().DB_PATH)
+    parser.add_argument("--algoritmos", default=",".join(ALGORITMOS))
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--split", choices=["leave-k-out", "time"], default="leave-k-out")
+    parser.add_argument("--holdout", type=int, default=2, help="notas de teste por usuário")
+    parser.add_argument("--sample", type=int, default=500, help="usuários avaliados por algoritmo")
+    parser.add_argument("--output", help="arquivo JSON Lines onde acrescentar os resultados")
+    args = parser.parse_args()
+
+    algoritmos = args.algoritmos.split(",")
+    resultados = []
+    if args.synthetic:
+        for n_users in [int(n) for n in args.synthetic.split(",")]:
+            print(f"== {n_users} usuários sintéticos")
+            livros, notas = synthetic_dataset(n_users)
+            resultados += run(livros, notas, algoritmos, args.k, args.split, args.holdout, args.sample)
+    else:
+        conn = sqlite3.connect(args.db)
+        livros = pd.read_sql("SELECT * FROM Biblioteca", conn)
+        notas = pd.read_sql("SELECT id, usuario_id, isbn13, nota FROM NotasLivros", conn)
+        conn.close()
+        resultados = run(livros, notas, algoritmos, args.k, args.split, args.holdout, args.sample)
+
+    if args.output:
+        with open(args.output, "a", encoding="utf-8") as f:
+            for resultado in resultados:
+                f.write(json.dumps(resultado) + "\n")
@@ -0,0 +1,139 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from scripts.artifacts import save_atomic, write_atomic
+from scripts.config import RecommenderConfig
+from scripts.loaders import CATALOG_COLUMNS, iter_chunks
+
+# Formato plano dos artefatos somente leitura: cada array é um .npy aberto em
+# memory-map, então todos os processos da API que abrem o mesmo arquivo usam as
+# mesmas páginas (page cache do SO) em vez de uma cópia por processo. Texto de
+# tamanho variável vira bytes UTF-8 concatenados + offsets (sem objetos Python).
+
+
+def default_catalog_dir():
+    return os.path.join(RecommenderConfig.get_instance().ARTIFACTS_DIR, "catalogo")
+
+
+def save_strings(directory, name, values):
+    """
+    Salva uma coluna de texto como `<name>_bytes.npy` (UTF-8 concatenado, uint8),
+    `<name>_offsets.npy` (int64, n + 1) e `<name>_null.npy` (valores ausentes).
+    """
+    values = list(values)
+    nulos = np.fromiter((v is None or v != v for v in values), dtype=bool, count=len(values))
+    codificados = [b"" if nulo else str(v).encode("utf-8") for v, nulo in zip(values, nulos)]
+    offsets = np.zeros(len(values) + 1, dtype=np.int64)
+    np.cumsum([len(b) for b in codificados], out=offsets[1:])
+    data = np.frombuffer(b"".join(codificados), dtype=np.uint8)
+    save_atomic(os.path.join(directory, f"{name}_bytes.npy"), data)
+    save_atomic(os.path.join(directory, f"{name}_offsets.npy"), offsets)
+    save_atomic(os.path.join(directory, f"{name}_null.npy"), nulos)
+
+
+class StringColumn:
+    """Coluna de texto salva por `save_strings`, aberta em memory-map; decodifica sob demanda."""
+
+    def __init__(self, data, offsets, nulos):
+        self.data = data
+        self.offsets = offsets
+        self.nulos = nulos
+
+    @classmethod
+    def load(cls, directory, name, mmap_mode="r"):
+        return cls(
+            np.load(os.path.join(directory, f"{name}_bytes.npy"), mmap_mode=mmap_mode),
+            np.load(os.path.join(directory, f"{name}_offsets.npy"), mmap_mode=mmap_mode),
+            np.load(os.path.join(directory, f"{name}_null.npy"), mmap_mode=mmap_mode),
+        )
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def take(self, positions):
+        """Valores (str ou None) das posições, na ordem recebida."""
+        positions = np.asarray(positions, dtype=np.int64)
+        inicios, fins = self.offsets[positions], self.offsets[positions + 1]
+        nulos = self.nulos[positions]
+        return [
+            None if nulo else self.data[a:b].tobytes().decode("utf-8")
+            for a, b, nulo in zip(inicios.tolist(), fins.tolist(), nulos.tolist())
+        ]
+
+    def to_numpy(self):
+        """Coluna inteira decodificada (array de objetos), para montar estruturas na carga."""
+        buf = self.data.tobytes()
+        offsets = self.offsets.tolist()
+        valores = np.empty(len(self), dtype=object)
+        for i, nulo in enumerate(self.nulos.tolist()):
+            valores[i] = None if nulo else buf[offsets[i] : offsets[i + 1]].decode("utf-8")
+        return valores
+
+
+class FlatCatalog:
+    """
+    Catálogo (Biblioteca) em formato plano, na ordem do rowid: as colunas das
+    respostas ficam em arquivos de bytes + offsets abertos em memory-map, e só as
+    linhas do top-N viram DataFrame. Substitui o DataFrame do catálogo que cada
+    processo montava a partir do banco.
+    """
+
+    def __init__(self, columns, version=None):
+        self.columns = columns  # nome -> StringColumn
+        self.version = version  # (COUNT, MAX(rowid)) da Biblioteca na construção
+
+    def __len__(self):
+        return len(next(iter(self.columns.values())))
+
+    def __getitem__(self, name):
+        """Coluna inteira como Series (mesma interface do DataFrame nas construções)."""
+        return pd.Series(self.columns[name].to_numpy(), name=name)
+
+    def frame(self, positions, columns=CATALOG_COLUMNS):
+        """DataFrame só com as linhas `positions` (na ordem recebida) e as colunas pedidas."""
+        return pd.DataFrame({c: self.columns[c].take(positions) for c in columns})
+
+    @classmethod
+    def load(cls, catalog_dir=None):
+        catalog_dir = catalog_dir or default_catalog_dir()
+        with open(os.path.join(catalog_dir, "catalog.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+        columns = {c: StringColumn.load(catalog_dir, c) for c in meta["columns"]}
+        return cls(columns, tuple(meta["version"]))
+
+    @classmethod
+    def build(cls, conn, catalog_dir=None, version=None, columns=CATALOG_COLUMNS, chunk_size=None):
+        """Lê as colunas da Biblioteca em blocos e grava cada uma em formato plano."""
+        catalog_dir = catalog_dir or default_catalog_dir()
+        os.makedirs(catalog_dir, exist_ok=True)
+        valores = {c: [] for c in columns}
+        sql = f"SELECT {', '.join(columns)} FROM Biblioteca ORDER BY rowid"
+        for chunk in iter_chunks(conn, sql, chunk_size=chunk_size):
+            for c in columns:
+                valores[c].extend(chunk[c].tolist())
+        for c in columns:
+            save_strings(catalog_dir, c, valores.pop(c))
+        # Gravado por último: sem ele (ou com outra versão) o catálogo é refeito
+        meta = {"version": list(version or ()), "columns": list(columns)}
+        write_atomic(os.path.join(catalog_dir, "catalog.json"), json.dumps(meta))
+        return cls.load(catalog_dir)
+
+    @classmethod
+    def load_valid(cls, catalog_dir, version):
+        """Catálogo salvo em `catalog_dir`, se existir e for da versão da Biblioteca; senão None."""
+        if version is None or not os.path.exists(os.path.join(catalog_dir, "catalog.json")):
+            return None
+        catalogo = cls.load(catalog_dir)
+        return catalogo if catalogo.version == tuple(version) else None
+
+    @classmethod
+    def load_or_build(cls, conn, catalog_dir=None, version=None, chunk_size=None):
+        """Abre o catálogo salvo se for da mesma versão da Biblioteca; senão, refaz."""
+        catalog_dir = catalog_dir or default_catalog_dir()
+        catalogo = cls.load_valid(catalog_dir, version)
+        if catalogo is not None:
+            return catalogo
+        return cls.build(conn, catalog_dir, version, chunk_size=chunk_size)
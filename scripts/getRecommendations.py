@@ -1,150 +1,1090 @@
+import json
+import os
+import shutil
 import sqlite3
+import threading
+import time
 import pandas as pd
 import numpy as np
-from scipy.spatial.distance import pdist, squareform
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
 
-conn = sqlite3.connect("../bd/saber.db")
-usuarios = pd.read_sql("SELECT * FROM usuarios", conn)
-livros = pd.read_sql("SELECT * FROM Biblioteca", conn)
-notas = pd.read_sql("SELECT * FROM NotasLivros", conn)
+from scripts.artifacts import current_version, resolve_dir, runtime_dir, write_atomic
+from scripts.flat_store import FlatCatalog
+from scripts.book_features import CategoryAuthorAffinity
+from scripts.config import RecommenderConfig
+from scripts.hybrid_blend import ScoreBlend, scale_by_max
+from scripts.id_dictionary import IdDictionary, invert_codes, lookup
+from scripts.implicit_feedback import table_version as implicit_table_version
+from scripts.interaction_matrix import InteractionMatrix
+from scripts.item_neighbors import ItemNeighbors, build_item_neighbors
+from scripts.lsa_index import LsaIndex, build_lsa_index
+from scripts.loaders import (
+    install_ratings_marker,
+    iter_descriptions,
+    iter_implicit,
+    iter_ratings,
+    load_implicit,
+    load_ratings,
+)
+from scripts.loaders import ratings_version as ratings_table_version
+from scripts.matrix_factorization import FactorModel
+from scripts.minhash_lsh import MinHashLSH
+from scripts.popularity import PopularityRanking, load_rating_totals
+from scripts.semester_index import SemesterIndex, table_version
+from scripts.tfidf_index import TfidfIndex, build_tfidf_index
+from scripts.user_profiles import UserProfileStore
 
 
-def get_positive_ratings(notas, livros):
-    notas_pos = notas[notas["nota"] >= 4].merge(
-        livros[["isbn13", "categories", "authors", "title"]], on="isbn13"
-    )
-    notas_pos["categories"] = notas_pos["categories"].str.split(";")
-    notas_pos["authors"] = notas_pos["authors"].str.split(";")
-    return notas_pos
+# Configurações que mudam o top-N de recomendar (entram no estado do motor)
+CONFIG_DO_RANKING = (
+    "TFIDF_MODE",
+    "LSA_DIMS",
+    "PESO_JACCARD",
+    "PESO_TFIDF",
+    "PESO_AFINIDADE",
+    "PESO_AFINIDADE_CATEGORIA",
+    "PESO_AFINIDADE_AUTOR",
+    "NOTA_POSITIVA",
+    "PESO_ALUGUEL",
+    "JACCARD_MODE",
+    "COLABORATIVO",
+)
 
 
-def get_user_cat_aut_matrix(notas_pos):
-    notas_cat = notas_pos.explode("categories")
-    notas_aut = notas_pos.explode("authors")
-    user_cat_matrix = pd.crosstab(notas_cat["usuario_id"], notas_cat["categories"])
-    user_cat_matrix = (user_cat_matrix > 0).astype(float)
-    user_aut_matrix = pd.crosstab(notas_aut["usuario_id"], notas_aut["authors"])
-    user_aut_matrix = (user_aut_matrix > 0).astype(float)
-    return notas_cat, notas_aut, user_cat_matrix, user_aut_matrix
+def _alteracoes(version):
+    """Nº de alterações de uma versão das notas (versões antigas, só (COUNT, MAX(id)): 0)."""
+    return int(version[2]) if len(version) > 2 else 0
 
 
-def tfidf_recommendation(usuario_id, top_n=5):
-    # Livros avaliados positivamente pelo usuário (nota >= 4)
-    notas_user = notas[(notas["usuario_id"] == usuario_id) & (notas["nota"] >= 4)]
-    livros_user = livros[livros["isbn13"].isin(notas_user["isbn13"])]
-
-    # Livros ainda não avaliados pelo usuário
-    livros_nao_lidos = livros[~livros["isbn13"].isin(notas_user["isbn13"])].copy()
-
-    # Junta as descrições dos livros do usuário
-    descricoes_user = livros_user["description"].dropna().tolist()
-    descricoes_all = livros_nao_lidos["description"].fillna("").tolist()
-    if descricoes_user:
-        tfidf = TfidfVectorizer(stop_words="english")
-        tfidf_matrix = tfidf.fit_transform(descricoes_user + descricoes_all)
-        user_vec = np.asarray(tfidf_matrix[: len(descricoes_user)].mean(axis=0))
-        outros_vecs = tfidf_matrix[len(descricoes_user) :]
-        tfidf_scores = cosine_similarity(user_vec, outros_vecs).flatten()
-        livros_nao_lidos["tfidf"] = tfidf_scores
-    else:
-        return pd.DataFrame()
-
-    recomendados = livros_nao_lidos.sort_values("tfidf", ascending=False).head(top_n)
-    return recomendados
+class RecommenderEngine:
+    """
+    Motor de recomendação com carga preguiçosa dos dados de bd/saber.db.
 
+    Nada é lido na importação: os dados são carregados no primeiro uso e, depois,
+    a versão dos dados (contagem e maior id de NotasLivros / Biblioteca, mais o
+    marcador de alterações de NotasLivros) é conferida
+    no máximo a cada REFRESH_INTERVAL segundos. Quando ela muda, só as estruturas
+    afetadas são refeitas: o catálogo e o índice TF-IDF quando a Biblioteca muda;
+    a matriz de interações e os perfis quando as notas mudam (apenas as linhas novas
+    são incorporadas se houve só inserções).
 
-def jaccard_recommendation(usuario_id, top_n=5):
-    # Cria uma matriz binária de usuário x livro (1 se o usuário avaliou o livro, 0 caso contrário)
-    user_book = notas.pivot_table(
-        index="usuario_id",
-        columns="isbn13",
-        values="nota",
-        aggfunc="count",
-        fill_value=0,
-    )
-    # Calcula a distância de Jaccard entre todos os usuários
-    jaccard_dist = pdist(user_book.values, metric="jaccard")
-    jaccard_sim = 1 - squareform(jaccard_dist)
-    # Encontra o índice do usuário na matriz
-    user_idx = user_book.index.get_loc(usuario_id)
-    # Similaridade do usuário alvo com todos os outros
-    sim_scores = jaccard_sim[user_idx]
-    # Seleciona os usuários mais similares (excluindo ele mesmo)
-    similar_users = user_book.index[(sim_scores > 0) & (user_book.index != usuario_id)]
-    # Livros que o usuário ainda não leu
-    livros_lidos = set(notas[notas["usuario_id"] == usuario_id]["isbn13"])
-    candidatos = notas[
-        notas["usuario_id"].isin(similar_users) & (~notas["isbn13"].isin(livros_lidos))
-    ]
-
-    # Recomenda os livros mais populares entre os similares
-    recomendados = candidatos["isbn13"].value_counts().head(top_n).index
-    recs = livros[livros["isbn13"].isin(recomendados)][
-        ["isbn13", "title", "authors", "categories", "thumbnail"]
-    ]
-    recs["match_type"] = "jaccard"
-    return recs
-
-
-def recomendar_livros(usuario_id, top_n=10):
-    # Jaccard recommendations
-    jaccard_df = jaccard_recommendation(usuario_id, top_n=top_n)
-    # TF-IDF recommendations
-    tfidf_df = tfidf_recommendation(usuario_id, top_n=top_n)
-
-    # Se o jaccard_df estiver vazio (usuário sem avaliações suficientes), retorna apenas TF-IDF
-    if jaccard_df.empty:
-        recomendados = tfidf_df.sort_values("tfidf", ascending=False).head(top_n)
-        return recomendados[
-            ["isbn13", "title", "authors", "categories", "thumbnail", "tfidf"]
-        ]
-    elif tfidf_df.empty:
-        recomendados = jaccard_df.sort_values("isbn13").head(top_n)
-        return recomendados[["isbn13", "title", "authors", "categories", "thumbnail"]]
-    elif jaccard_df.empty and tfidf_df.empty:
-        return "Não há recomendações disponíveis."
-
-    # Merge on isbn13 to align recommendations
-    merged = pd.merge(
-        jaccard_df[["isbn13", "title", "authors", "categories", "thumbnail"]],
-        tfidf_df[["isbn13", "tfidf"]],
-        on="isbn13",
-        how="outer",
-    )
+    Um único lock protege carga e consultas, então uma instância pode ser
+    compartilhada entre as threads de um worker do Flask. Entre processos, os
+    arrays somente leitura (catálogo, dicionário de ids, índice TF-IDF, matriz de
+    interações e perfis do último snapshot das notas) ficam em arquivos .npy
+    abertos em memory-map, e cada worker a mais só ocupa memória com o que mudou
+    depois do snapshot.
 
-    # Preencher informações faltantes de título, autor e categoria usando o DataFrame de livros
-    merged = pd.merge(
-        merged,
-        livros[["isbn13", "title", "authors", "categories", "thumbnail"]],
-        on="isbn13",
-        how="left",
-        suffixes=("", "_livro"),
-    )
-    for col in ["title", "authors", "categories", "thumbnail"]:
-        merged[col] = merged[col].combine_first(merged[f"{col}_livro"])
-
-    merged = merged.drop(
-        columns=[
-            "title_livro",
-            "authors_livro",
-            "categories_livro",
-            "thumbnail_livro",
+    Os artefatos vêm da versão publicada `version` (ARTIFACTS_DIR/versions/...,
+    por padrão a apontada por CURRENT na criação do motor), que nunca é regravada:
+    o que o motor refaz em execução (snapshots das notas, dicionário de ids que
+    cresceu, índice de um catálogo mais novo que a versão) vai para
+    ARTIFACTS_DIR/runtime/<versão>, compartilhado pelos processos dessa versão. Sem
+    versões publicadas, tudo fica direto em ARTIFACTS_DIR e é construído sob demanda.
+    """
+
+    def __init__(self, config=None, version=None):
+        self.config = config or RecommenderConfig.get_instance()
+        self.version = version or current_version(self.config.ARTIFACTS_DIR)
+        self._lock = threading.RLock()
+        self._checked_at = 0.0
+        # False: as consultas não conferem a versão dos dados (só a carga inicial);
+        # quem usa o motor chama refresh(force=True) fora das threads dos pedidos
+        self.refresh_on_read = True
+        self.catalog_version = None
+        self.ratings_version = None  # (COUNT, MAX(id), nº de alterações) de NotasLivros
+        self._marcador_criado = False  # marcador de alterações (loaders.CREATE_RATINGS_MARKER)
+        self.implicit_version = None  # InteracoesImplicitas (aluguéis), (0, 0) sem a tabela
+        self.semester_version = None
+
+        # ISBN-13 e usuario_id -> índices int32 (compartilhado e persistido); as estruturas
+        # abaixo trabalham nesses códigos e o texto só aparece no top-N final
+        self.ids = None
+        self.linha_codigo = None  # linha do índice TF-IDF -> código do ISBN
+        self.codigo_linha = None  # código do ISBN -> linha do índice TF-IDF (-1 fora do catálogo)
+        self.linha_livro = None  # linha do índice TF-IDF -> posição no catálogo (self.livros)
+        self.coluna_codigo = None  # coluna dos fatores ALS -> código do ISBN
+        self.fator_coluna = None  # código do ISBN -> coluna dos fatores ALS
+
+        self.livros = None  # FlatCatalog: colunas do catálogo em memory-map
+        self.tfidf_index = None
+        self.lsa = None  # embeddings densos das descrições, só com LSA_DIMS > 0
+        self.vizinhos = None  # livros similares, abertos no primeiro uso
+        self.afinidade = None  # categorias/autores one-hot nas linhas do índice TF-IDF
+        self.semestres = SemesterIndex()  # candidatos por curso/semestre (BibliografiaSemestre)
+        self.interacoes = None
+        self.lsh = None  # só com JACCARD_MODE = "lsh"
+        self.fatores = None  # só com COLABORATIVO = "als"
+        self.perfis = None  # perfis TF-IDF (soma + quantidade) por usuário
+        self.populares = None  # ranking de popularidade para quem não tem notas
+        # Acervo físico (AvailabilityIndex, opcional): bitmap por linha do índice TF-IDF
+        # dos livros com exemplar disponível, atualizado só nas linhas que mudaram
+        self.disponibilidade = None
+        self.disponivel = None
+        self._disponivel_versao = None
+        self._linhas_disponiveis = None
+        self._popularidade_timer = None  # reconstrução agendada em segundo plano
+
+        # Versão das notas por usuário: (geração da carga completa, nº de alterações)
+        self._generation = 0
+        self._user_versions = {}
+        self._listeners = []
+
+    @property
+    def artifacts_dir(self):
+        """Artefatos publicados da versão (somente leitura)."""
+        return resolve_dir(self.config.ARTIFACTS_DIR, self.version)
+
+    @property
+    def runtime_dir(self):
+        """Onde o motor grava o que refaz em execução (fora da versão publicada)."""
+        return runtime_dir(self.config.ARTIFACTS_DIR, self.version)
+
+    # Onde cada artefato é gravado (os publicados são lidos antes, ver _open_or_build)
+    @property
+    def index_dir(self):
+        return os.path.join(self.runtime_dir, "tfidf")
+
+    @property
+    def lsa_dir(self):
+        return os.path.join(self.runtime_dir, "lsa")
+
+    @property
+    def catalog_dir(self):
+        return os.path.join(self.runtime_dir, "catalogo")
+
+    @property
+    def ratings_dir(self):
+        return os.path.join(self.runtime_dir, "notas")
+
+    @property
+    def ids_dir(self):
+        return os.path.join(self.runtime_dir, "ids")
+
+    @property
+    def factors_dir(self):
+        return os.path.join(self.runtime_dir, "als")
+
+    @property
+    def neighbors_dir(self):
+        return os.path.join(self.runtime_dir, "similares")
+
+    def _artifact_dirs(self, nome):
+        """Diretórios de `nome`: o da versão publicada e o de execução (um só sem versões)."""
+        return list(
+            dict.fromkeys(
+                (os.path.join(self.artifacts_dir, nome), os.path.join(self.runtime_dir, nome))
+            )
+        )
+
+    def _open_or_build(self, nome, abrir, construir):
+        """
+        Artefato `nome`: o da versão publicada se `abrir(diretório)` o aceitar (None
+        se falta ou é de outro catálogo/configuração), senão o do diretório de
+        execução, refeito ali por `construir(diretório)` se preciso.
+        """
+        for diretorio in self._artifact_dirs(nome):
+            artefato = abrir(diretorio)
+            if artefato is not None:
+                return artefato
+        return construir(os.path.join(self.runtime_dir, nome))
+
+    def _connect(self):
+        return sqlite3.connect(self.config.DB_PATH)
+
+    def refresh(self, force=False):
+        """Confere a versão dos dados e recarrega o que tiver mudado."""
+        reconstruir = False
+        with self._lock:
+            agora = time.monotonic()
+            if (
+                not force
+                and self.ratings_version is not None
+                and (
+                    not self.refresh_on_read
+                    or agora - self._checked_at < self.config.REFRESH_INTERVAL
+                )
+            ):
+                return
+            self._checked_at = agora
+
+            if self.ids is None:
+                # O de execução, se existir, é o publicado mais os códigos acrescentados depois
+                salvos = [
+                    d
+                    for d in self._artifact_dirs("ids")
+                    if os.path.exists(os.path.join(d, "isbn13.npy"))
+                ]
+                self.ids = IdDictionary.load(salvos[-1]) if salvos else IdDictionary()
+            conn = self._connect()
+            try:
+                catalog_version = conn.execute(
+                    "SELECT COUNT(*), COALESCE(MAX(rowid), 0) FROM Biblioteca"
+                ).fetchone()
+                if not self._marcador_criado:
+                    # Uma vez por motor; num banco só de leitura, as alterações ficam em 0
+                    install_ratings_marker(conn)
+                    self._marcador_criado = True
+                ratings_version = ratings_table_version(conn)
+                implicit_version = implicit_table_version(conn)
+                semester_version = table_version(conn)
+                if catalog_version != self.catalog_version:
+                    self._load_catalog(conn, catalog_version)
+                    self.catalog_version = catalog_version
+                    # Os perfis apontam para linhas do índice TF-IDF: recarrega as notas
+                    self.ratings_version = None
+                    self.semester_version = None
+                if semester_version != self.semester_version:
+                    self.semestres = SemesterIndex.from_db(
+                        conn, self.livros.frame(self.linha_livro, ("isbn13", "categories"))
+                    )
+                    self.semester_version = semester_version
+                notas_mudaram = ratings_version != self.ratings_version
+                if notas_mudaram or implicit_version != self.implicit_version:
+                    catalogo_mudou = self.ratings_version is None
+                    self._load_ratings(conn, ratings_version, implicit_version)
+                    self.ratings_version = ratings_version
+                    self.implicit_version = implicit_version
+                    # Com catálogo novo as linhas do ranking mudam: refaz na hora (o
+                    # ranking só usa as notas, não as interações implícitas)
+                    if notas_mudaram:
+                        reconstruir = self._popularity_changed(imediato=catalogo_mudou)
+                self.ids.save(self.ids_dir)
+            finally:
+                conn.close()
+        # Fora do lock: os outros pedidos não esperam a leitura das notas
+        if reconstruir:
+            self._rebuild_popularity()
+
+    def _load_catalog(self, conn, catalog_version=None):
+        # Só as colunas das respostas, gravadas uma vez em formato plano e abertas em
+        # memory-map (as mesmas páginas em todos os processos); as descrições são
+        # lidas em blocos e apenas se o índice precisar ser (re)construído
+        chunk_size = self.config.LOAD_CHUNK_SIZE
+        self.livros = self._open_or_build(
+            "catalogo",
+            lambda d: FlatCatalog.load_valid(d, catalog_version),
+            lambda d: FlatCatalog.build(conn, d, catalog_version, chunk_size=chunk_size),
+        )
+        isbns = self.livros["isbn13"].to_numpy(dtype="U13")
+        # Índice TF-IDF publicado (python -m scripts.publish_artifacts) e aberto em
+        # memory-map; só é refeito se o catálogo mudou desde a publicação
+        mode, n_features = self.config.TFIDF_MODE, self.config.HASHING_N_FEATURES
+        index = self._open_or_build(
+            "tfidf",
+            lambda d: TfidfIndex.load_valid(d, mode, n_features, isbns),
+            lambda d: self._build_index(conn, d, isbns),
+        )
+        self.tfidf_index = index
+        self.lsa = None
+        if self.config.LSA_DIMS > 0:
+            dims = self.config.LSA_DIMS
+            self.lsa = self._open_or_build(
+                "lsa",
+                lambda d: LsaIndex.load_valid(d, index.isbns, dims),
+                lambda d: build_lsa_index(index.isbns, index.docs, d, dims),
+            )
+        self.linha_codigo = self.ids.encode_isbns(index.isbns)
+        self.codigo_linha = invert_codes(self.linha_codigo)
+        self.linha_livro = pd.Index(isbns).get_indexer(index.isbns)
+        self.vizinhos = None
+        self.disponivel = None  # linhas novas: o bitmap é refeito no próximo pedido
+        self.populares = None  # aponta para as linhas antigas: refeito no fim do refresh
+        # Rótulos codificados uma vez, nas mesmas linhas dos perfis TF-IDF
+        self.afinidade = CategoryAuthorAffinity.from_livros(
+            self.livros.frame(self.linha_livro, ("categories", "authors")),
+            peso_categoria=self.config.PESO_AFINIDADE_CATEGORIA,
+            peso_autor=self.config.PESO_AFINIDADE_AUTOR,
+        )
+
+    def _build_index(self, conn, index_dir, isbns):
+        """
+        Constrói o índice TF-IDF do catálogo atual em `index_dir`. No modo "hashing",
+        se um índice salvo cobre o começo do catálogo, só os livros acrescentados ao
+        fim são vetorizados e anexados.
+        """
+        chunk_size = self.config.LOAD_CHUNK_SIZE
+        mode, n_features = self.config.TFIDF_MODE, self.config.HASHING_N_FEATURES
+        if mode == "hashing":
+            for diretorio in self._artifact_dirs("tfidf"):
+                anterior = TfidfIndex.load_valid(diretorio, mode, n_features)
+                n = 0 if anterior is None else len(anterior.isbns)
+                if 0 < n < len(isbns) and np.array_equal(anterior.isbns, isbns[:n]):
+                    return anterior.append(
+                        self.livros.frame(np.arange(n, len(isbns)), ("isbn13",)),
+                        iter_descriptions(conn, chunk_size, offset=n),
+                        index_dir,
+                    )
+        return build_tfidf_index(
+            self.livros, index_dir, iter_descriptions(conn, chunk_size), mode, n_features
+        )
+
+    def _load_ratings(self, conn, version, implicit_version=(0, 0)):
+        if self.ratings_version is not None:
+            novas = self._inserted_since(conn, load_ratings, self.ratings_version, version)
+            implicitas = self._inserted_since(
+                conn, load_implicit, self.implicit_version, implicit_version
+            )
+            # Só houve inserções: incorpora as linhas novas sem recarregar tudo
+            if novas is not None and implicitas is not None:
+                self._add_ratings(novas)
+                self._add_implicit(implicitas)
+                return
+
+        self._generation += 1
+        self._user_versions = {}
+        # Snapshot em memory-map (compartilhado entre processos) + as linhas inseridas
+        # depois dele; sem snapshot compatível, lê tudo do banco e grava um novo
+        inseridas = self._open_snapshot(conn, version, implicit_version)
+        if inseridas is None:
+            self._load_all_ratings(conn)
+            self._save_snapshot(version, implicit_version)
+            inseridas = self._open_snapshot(conn, version, implicit_version)
+        if self.config.JACCARD_MODE == "lsh":
+            self.lsh = MinHashLSH.from_csr(
+                self.interacoes.to_csr(),
+                num_perm=self.config.MINHASH_NUM_PERM,
+                bands=self.config.MINHASH_BANDS,
+            )
+        if self.config.COLABORATIVO == "als":
+            self.fatores = self._open_or_build(
+                "als",
+                lambda d: FactorModel.load_valid(d, self.config),
+                lambda d: FactorModel.train(self.interacoes, d, self.config),
+            )
+            self.coluna_codigo = self.ids.encode_isbns(np.asarray(self.fatores.isbns))
+            self.fator_coluna = invert_codes(self.coluna_codigo)
+        if inseridas is not None:
+            self._add_ratings(inseridas[0])
+            self._add_implicit(inseridas[1])
+        self._notify(None)
+
+    def _inserted_since(self, conn, loader, antiga, atual):
+        """
+        Linhas inseridas numa tabela entre duas versões (COUNT, MAX(id)[, nº de
+        alterações]), ou None se o marcador de alterações mudou ou a contagem não
+        bate (linhas apagadas ou alteradas: é preciso recarregar tudo).
+        """
+        if tuple(atual) == tuple(antiga):
+            return pd.DataFrame()
+        if _alteracoes(atual) != _alteracoes(antiga):
+            return None
+        old_count, old_max_id = antiga[:2]
+        novas = loader(conn, since_id=old_max_id, chunk_size=self.config.LOAD_CHUNK_SIZE)
+        return novas if len(novas) == atual[0] - old_count else None
+
+    def _load_all_ratings(self, conn):
+        # Uma passada em blocos: cada bloco vira códigos do dicionário (as strings são
+        # descartadas) e os pares positivos (usuário, linha TF-IDF) são separados no caminho
+        usuarios, livros, valores, positivas_usuarios, positivas_linhas = [], [], [], [], []
+        for chunk in iter_ratings(conn, chunk_size=self.config.LOAD_CHUNK_SIZE):
+            usuarios.append(self.ids.encode_users(chunk["usuario_id"].to_numpy()))
+            livros.append(self.ids.encode_isbns(chunk["isbn13"].to_numpy()))
+            valores.append(np.ones(len(chunk), dtype=np.float32))
+            positiva = chunk["nota"].to_numpy() >= self.config.NOTA_POSITIVA
+            linhas = lookup(self.codigo_linha, livros[-1][positiva])
+            positivas_usuarios.append(chunk["usuario_id"].to_numpy()[positiva][linhas >= 0])
+            positivas_linhas.append(linhas[linhas >= 0])
+        # Interações implícitas (aluguéis): só na matriz, com o peso gravado pelo ETL
+        for chunk in iter_implicit(conn, chunk_size=self.config.LOAD_CHUNK_SIZE):
+            usuarios.append(self.ids.encode_users(chunk["usuario_id"].to_numpy()))
+            livros.append(self.ids.encode_isbns(chunk["isbn13"].to_numpy()))
+            valores.append(chunk["peso"].to_numpy(dtype=np.float32))
+        usuarios = np.concatenate(usuarios) if usuarios else np.zeros(0, dtype=np.int32)
+        livros = np.concatenate(livros) if livros else np.zeros(0, dtype=np.int32)
+        valores = np.concatenate(valores) if valores else np.zeros(0, dtype=np.float32)
+        self.interacoes = InteractionMatrix.from_codes(usuarios, livros, valores, ids=self.ids)
+        self.perfis = UserProfileStore.from_pairs(
+            self.tfidf_index.docs,
+            np.concatenate(positivas_usuarios) if positivas_usuarios else [],
+            np.concatenate(positivas_linhas) if positivas_linhas else [],
+        )
+
+    def _snapshot_meta(self, version, implicit_version=(0, 0)):
+        """O que precisa bater para um snapshot das notas valer para este motor."""
+        return {
+            "ratings_version": [int(v) for v in version],
+            "implicit_version": [int(v) for v in implicit_version],
+            "catalog_version": [int(v) for v in self.catalog_version or ()],
+            "tfidf_shape": [int(v) for v in self.tfidf_index.docs.shape],
+            "nota_positiva": self.config.NOTA_POSITIVA,
+        }
+
+    def _save_snapshot(self, version, implicit_version=(0, 0)):
+        """
+        Grava a matriz de interações e os perfis TF-IDF recém-carregados em
+        notas/<COUNT>-<MAX(id)> do diretório de execução (com as interações
+        implícitas, seguido da versão delas). O diretório é montado à parte e
+        renomeado, então outro processo nunca abre um snapshot pela metade.
+        """
+        nome = f"{version[0]}-{version[1]}"
+        if _alteracoes(version):
+            nome += f"-a{_alteracoes(version)}"
+        if tuple(implicit_version) != (0, 0):
+            nome += f"-{implicit_version[0]}-{implicit_version[1]}"
+        destino = os.path.join(self.ratings_dir, nome)
+        if os.path.exists(destino):
+            # Gravado por outro processo: só serve se os códigos dele batem com os deste
+            if self._snapshot_ids(destino) is not None:
+                return
+            destino = f"{destino}-{os.getpid()}"
+            if os.path.exists(destino):
+                return
+        self.ids.save(self.ids_dir)
+        meta = self._snapshot_meta(version, implicit_version)
+        meta["n_users"], meta["n_isbns"] = self.ids.n_users, self.ids.n_isbns
+        tmp = f"{destino}.{os.getpid()}.tmp"
+        os.makedirs(tmp, exist_ok=True)
+        # O dicionário vai junto: os códigos da matriz valem para ele, não para o
+        # dicionário salvo em ids/, que outro processo pode ter regravado
+        self.ids.write(os.path.join(tmp, "ids"))
+        self.interacoes.save(tmp)
+        self.perfis.save(tmp)
+        write_atomic(os.path.join(tmp, "snapshot.json"), json.dumps(meta))
+        try:
+            os.rename(tmp, destino)
+        except OSError:
+            shutil.rmtree(tmp, ignore_errors=True)  # outro processo gravou o mesmo snapshot
+            return
+        # Só o snapshot novo e o anterior ficam (quem já abriu um mais antigo segue
+        # lendo); os que vieram com a versão publicada não são tocados
+        antigos = sorted(self._snapshots([self.ratings_dir]), key=self._snapshot_order)[:-2]
+        for _, caminho in antigos:
+            shutil.rmtree(caminho, ignore_errors=True)
+
+    def _snapshots(self, diretorios=None):
+        """(meta, diretório) dos snapshots das notas gravados (publicados e de execução)."""
+        snapshots = []
+        for diretorio in diretorios or self._artifact_dirs("notas"):
+            if not os.path.isdir(diretorio):
+                continue
+            for nome in os.listdir(diretorio):
+                caminho = os.path.join(diretorio, nome)
+                try:
+                    with open(os.path.join(caminho, "snapshot.json"), encoding="utf-8") as f:
+                        snapshots.append((json.load(f), caminho))
+                except (OSError, ValueError):
+                    continue
+        return snapshots
+
+    @staticmethod
+    def _snapshot_order(item):
+        meta = item[0]
+        return meta["ratings_version"][1], meta.get("implicit_version", [0, 0])[1]
+
+    def _snapshot_ids(self, caminho):
+        """
+        Dicionário de ids gravado com o snapshot, se for compatível com o do motor
+        (um prefixo do outro); os códigos que só o snapshot tem são acrescentados
+        ao do motor. None se os códigos divergem ou o snapshot não tem dicionário.
+        """
+        try:
+            ids = IdDictionary.load(os.path.join(caminho, "ids"))
+        except OSError:
+            return None
+        return ids if self.ids.extend(ids) else None
+
+    def _open_snapshot(self, conn, version, implicit_version=(0, 0)):
+        """
+        Abre em memory-map o snapshot mais novo que vale para o catálogo atual e
+        para o dicionário de ids do motor e devolve as notas e as interações
+        implícitas inseridas depois dele (DataFrames, a incorporar), ou None se
+        nenhum snapshot serve.
+        """
+        esperado = self._snapshot_meta(version, implicit_version)
+        validos = [
+            (meta, caminho)
+            for meta, caminho in self._snapshots()
+            if all(meta[k] == esperado[k] for k in ("catalog_version", "tfidf_shape", "nota_positiva"))
+            and meta["ratings_version"][1] <= version[1]
+            and _alteracoes(meta["ratings_version"]) == _alteracoes(version)
+            and meta.get("implicit_version", [0, 0])[1] <= implicit_version[1]
         ]
-    )
+        # Do mais novo ao mais antigo, o primeiro cujos códigos batem com os do motor
+        escolhido = next(
+            (
+                (meta, caminho)
+                for meta, caminho in sorted(validos, key=self._snapshot_order, reverse=True)
+                if self._snapshot_ids(caminho) is not None
+            ),
+            None,
+        )
+        if escolhido is None:
+            return None
+        meta, caminho = escolhido
+        novas = self._inserted_since(conn, load_ratings, tuple(meta["ratings_version"]), version)
+        implicitas = self._inserted_since(
+            conn, load_implicit, tuple(meta.get("implicit_version", [0, 0])), implicit_version
+        )
+        # Linhas apagadas ou alteradas depois do snapshot: ele não serve mais
+        if novas is None or implicitas is None:
+            return None
+        try:
+            interacoes = InteractionMatrix.load(caminho, ids=self.ids)
+            perfis = UserProfileStore.load(caminho, self.tfidf_index.docs)
+        except OSError:
+            return None  # apagado por outro processo depois de listado
+        self.interacoes, self.perfis = interacoes, perfis
+        return novas, implicitas
+
+    def _add_interactions(self, usuario_ids, isbns, values=None):
+        """Acrescenta pares à matriz e ao que depende dela (LSH, ALS); retorna as colunas."""
+        rows, cols = self.interacoes.add_ratings(usuario_ids, isbns, values)
+        if self.lsh is not None:
+            self.lsh.add_many(rows, cols)
+        if self.fatores is not None:
+            for usuario_id in np.unique(usuario_ids).tolist():
+                self._fold_in(usuario_id)
+        return cols
+
+    def _add_ratings(self, novas):
+        if novas.empty:
+            return
+        cols = self._add_interactions(novas["usuario_id"].to_numpy(), novas["isbn13"].to_numpy())
+        linhas = lookup(self.codigo_linha, cols)
+        for usuario_id, linha, nota in zip(
+            novas["usuario_id"].tolist(), linhas.tolist(), novas["nota"].tolist()
+        ):
+            self._update_profile_row(usuario_id, linha, None, nota)
+            self._user_versions[usuario_id] = self._user_versions.get(usuario_id, 0) + 1
+        self._notify(set(novas["usuario_id"].tolist()))
+
+    def _add_implicit(self, implicitas):
+        """Interações implícitas novas (aluguéis): entram só na matriz, com o peso do ETL."""
+        if implicitas.empty:
+            return
+        usuario_ids = implicitas["usuario_id"].to_numpy()
+        self._add_interactions(
+            usuario_ids, implicitas["isbn13"].to_numpy(), implicitas["peso"].to_numpy(dtype=np.float32)
+        )
+        for usuario_id in usuario_ids.tolist():
+            self._user_versions[usuario_id] = self._user_versions.get(usuario_id, 0) + 1
+        self._notify(set(usuario_ids.tolist()))
+
+    def _popularity_changed(self, imediato=False):
+        """
+        Notas novas: agenda a reconstrução do ranking de popularidade em segundo
+        plano, juntando as notas que chegarem até lá numa única reconstrução. Retorna
+        True se ela deve ser feita já (primeira carga, catálogo novo ou
+        POPULARIDADE_INTERVAL = 0): o chamador a faz depois de soltar o lock.
+        """
+        if imediato or self.populares is None or self.config.POPULARIDADE_INTERVAL <= 0:
+            return True
+        if self._popularidade_timer is None:
+            timer = threading.Timer(self.config.POPULARIDADE_INTERVAL, self._rebuild_popularity)
+            timer.daemon = True
+            self._popularidade_timer = timer
+            timer.start()
+        return False
+
+    def _rebuild_popularity(self):
+        """
+        Recalcula o ranking com uma conexão própria e troca a referência no fim; o
+        lock só é tomado para ler o catálogo e para a troca (nunca chamar com ele).
+        """
+        with self._lock:
+            self._popularidade_timer = None
+            index = self.tfidf_index
+            categorias = self.livros.frame(self.linha_livro, ("categories",))["categories"]
+        conn = self._connect()
+        try:
+            soma, contagem = load_rating_totals(
+                conn,
+                index.isbns,
+                peso_interno=self.config.POPULARIDADE_PESO_INTERNO,
+                chunk_size=self.config.LOAD_CHUNK_SIZE,
+            )
+        except sqlite3.Error:
+            return  # mantém o ranking anterior; a próxima nota agenda de novo
+        finally:
+            conn.close()
+        ranking = PopularityRanking.build(soma, contagem, categorias, self.config.POPULARIDADE_PRIOR)
+        with self._lock:
+            # O catálogo pode ter mudado enquanto o ranking era calculado
+            if self.tfidf_index is index:
+                self.populares = ranking
+
+    def _fold_in(self, usuario_id):
+        """Recalcula o vetor latente do usuário com todos os livros dele (ALS)."""
+        row = self.interacoes.user_index[usuario_id]
+        livros = self.interacoes.user_rows([row])
+        self.fatores.fold_in(usuario_id, lookup(self.fator_coluna, livros.indices), livros.data)
+
+    def add_listener(self, callback):
+        """
+        Registra `callback(usuario_ids)`, chamado quando as notas desses usuários mudam
+        (`None` quando todas as notas foram recarregadas).
+        """
+        self._listeners.append(callback)
+
+    def _notify(self, usuario_ids):
+        for callback in self._listeners:
+            callback(usuario_ids)
+
+    def user_version(self, usuario_id):
+        """Versão das notas do usuário; muda sempre que uma nota dele é inserida ou alterada."""
+        self.refresh()
+        with self._lock:
+            return (self._generation, self._user_versions.get(usuario_id, 0))
 
-    # Add jaccard score: 1 for recommended by jaccard, 0 otherwise
-    merged["jaccard"] = merged["isbn13"].isin(jaccard_df["isbn13"]).astype(float)
+    def _update_profile_row(self, usuario_id, row, nota_anterior, nota):
+        if row >= 0:
+            self.perfis.update_rating(
+                usuario_id, row, nota_anterior, nota, self.config.NOTA_POSITIVA
+            )
 
-    # Ajuste os pesos se quiser
-    merged["score"] = 0.3 * merged["jaccard"] + 0.7 * merged["tfidf"]
+    def on_rating_changed(self, usuario_id, isbn13, nota_anterior, nota):
+        """
+        Atualiza o perfil TF-IDF na hora quando uma nota existente é alterada por
+        quem tem o motor em mãos. Sem essa chamada, a alteração ainda chega pelo
+        marcador de alterações da versão das notas: o próximo refresh recarrega tudo.
+        """
+        self.refresh()
+        with self._lock:
+            codigo = self.ids.encode_isbns([isbn13], add=False)
+            row = int(lookup(self.codigo_linha, codigo)[0])
+            self._update_profile_row(usuario_id, row, nota_anterior, nota)
+            self._user_versions[usuario_id] = self._user_versions.get(usuario_id, 0) + 1
+            reconstruir = self._popularity_changed()
+        if reconstruir:
+            self._rebuild_popularity()
+        self._notify({usuario_id})
 
-    # Sort and return top_n
-    recomendados = merged.sort_values("score", ascending=False).head(top_n)
-    return recomendados[
-        ["isbn13", "title", "authors", "categories", "thumbnail", "score"]
-    ].to_json(orient="records")
+    def similar_users(self, usuario_id):
+        """Usuários com similaridade de Jaccard > 0 com o alvo (exata ou via LSH)."""
+        if self.lsh is not None:
+            row = self.interacoes.user_index.get(usuario_id)
+            candidatos = self.lsh.candidates(row) if row is not None else []
+            users, sims = self.interacoes.jaccard_with(usuario_id, candidatos)
+        else:
+            users, sims = self.interacoes.jaccard_similarity(usuario_id)
+        return users[sims > 0]
+
+    def _tfidf_scores(self, usuario_id, top_n, candidatos=None):
+        """Linhas do índice TF-IDF e scores do top-N do usuário (vazios sem perfil)."""
+        if self.lsa is not None:
+            # LSA: perfil denso (média dos embeddings) e um produto matriz x vetor
+            lidos = self.perfis.rated_rows(usuario_id)
+            profile = self.lsa.profile(lidos)
+            if profile is None:
+                return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+            return self.lsa.top_n(
+                profile, top_n=top_n, exclude_rows=lidos, candidate_rows=candidatos
+            )
+
+        # Perfil guardado do usuário: média dos livros avaliados positivamente (nota >= 4)
+        profile = self.perfis.profile(usuario_id)
+        if profile is None:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+
+        # Livros ainda não avaliados pelo usuário, pontuados contra o catálogo
+        # (ou só contra os candidatos do semestre)
+        return self.tfidf_index.top_n(
+            profile,
+            top_n=top_n,
+            exclude_rows=self.perfis.rated_rows(usuario_id),
+            candidate_rows=candidatos,
+        )
+
+    def tfidf_recommendation(self, usuario_id, top_n=5, candidatos=None):
+        self.refresh()
+        with self._lock:
+            rows, scores = self._tfidf_scores(usuario_id, top_n, candidatos)
+            if len(rows) == 0:
+                return pd.DataFrame()
+            posicoes = self.linha_livro[rows]
+            recomendados = self.livros.frame(posicoes[posicoes >= 0])
+            recomendados["tfidf"] = scores[posicoes >= 0]
+            return recomendados
+
+    def affinity_recommendation(self, usuario_id, top_n=5, candidatos=None):
+        self.refresh()
+        with self._lock:
+            # Afinidade com as categorias/autores dos livros avaliados positivamente
+            lidos = self.perfis.rated_rows(usuario_id)
+            affinity = self.afinidade.affinity(lidos)
+            if affinity is None:
+                return pd.DataFrame()
+
+            rows, scores = self.afinidade.score(affinity, candidate_rows=candidatos)
+            keep = ~np.isin(rows, lidos)
+            rows, scores = rows[keep], scores[keep]
+            if len(rows) > top_n:
+                best = np.argpartition(-scores, top_n - 1)[:top_n]
+                rows, scores = rows[best], scores[best]
+            order = np.argsort(-scores, kind="stable")
+            recomendados = self.livros.frame(self.linha_livro[rows[order]])
+            recomendados["afinidade"] = scores[order]
+            return recomendados
+
+    def _affinity_scores(self, usuario_id, codigos):
+        """Score de afinidade dos livros `codigos` (candidatos dos outros sinais)."""
+        affinity = self.afinidade.affinity(self.perfis.rated_rows(usuario_id))
+        rows = lookup(self.codigo_linha, codigos)
+        scores = np.zeros(len(rows))
+        scores[rows >= 0] = self.afinidade.score_rows(affinity, rows[rows >= 0])
+        return scores
+
+    def set_availability(self, disponibilidade):
+        """Só recomenda livros com exemplar disponível (None desliga o filtro)."""
+        with self._lock:
+            self.disponibilidade = disponibilidade
+            self.disponivel = None
+
+    def _update_availability(self):
+        """Aplica ao bitmap as mudanças de disponibilidade desde a última consulta."""
+        versao_atual = self._disponivel_versao if self.disponivel is not None else None
+        versao, mudancas = self.disponibilidade.changes_since(versao_atual)
+        if mudancas == []:
+            return
+        if mudancas is None:
+            versao, isbns = self.disponibilidade.snapshot()
+            self.disponivel = np.zeros(len(self.linha_codigo), dtype=bool)
+            valores = np.ones(len(isbns), dtype=bool)
+        else:
+            isbns = [isbn for isbn, _ in mudancas]
+            valores = np.array([disponivel for _, disponivel in mudancas], dtype=bool)
+        # Na ordem do log: a última mudança de cada ISBN prevalece
+        linhas = lookup(self.codigo_linha, self.ids.encode_isbns(isbns, add=False))
+        self.disponivel[linhas[linhas >= 0]] = valores[linhas >= 0]
+        self._disponivel_versao = versao
+        self._linhas_disponiveis = None
+
+    def _candidates(self, curso=None, semestre=None):
+        """
+        Linhas candidatas: a bibliografia do curso/semestre e, com disponibilidade,
+        só os livros com exemplar disponível (None = catálogo inteiro).
+        """
+        candidatos = self.semestres.rows(curso, semestre)
+        if self.disponibilidade is None:
+            return candidatos
+        self._update_availability()
+        if candidatos is not None:
+            return candidatos[self.disponivel[candidatos]]
+        if self._linhas_disponiveis is None:
+            self._linhas_disponiveis = np.flatnonzero(self.disponivel).astype(np.int32)
+        return self._linhas_disponiveis
+
+    def _candidate_codes(self, candidatos):
+        """Códigos dos ISBNs das linhas candidatas (None = catálogo inteiro)."""
+        if candidatos is None:
+            return None
+        return self.linha_codigo[candidatos]
+
+    def _catalog_positions(self, codigos):
+        """Posições em self.livros dos códigos de ISBN (sem os que não estão no catálogo)."""
+        linhas = lookup(self.codigo_linha, codigos)
+        return self.linha_livro[linhas[linhas >= 0]]
+
+    def _jaccard_codes(self, usuario_id, top_n, candidatos=None):
+        """Códigos dos livros do catálogo mais populares entre os vizinhos do usuário."""
+        # Similaridade de Jaccard só entre o usuário alvo e quem tem livros em comum com ele
+        similar_users = self.similar_users(usuario_id)
+        if len(similar_users) == 0:
+            return np.zeros(0, dtype=np.int64)
+
+        # Recomenda os livros mais populares entre os similares, que o usuário ainda não leu
+        # (colunas da matriz = códigos do dicionário, como os candidatos)
+        livros_lidos = self.interacoes.user_items(usuario_id)
+        cols, _ = self.interacoes.popular_among(
+            similar_users,
+            top_n=top_n,
+            exclude=livros_lidos,
+            allowed=self._candidate_codes(candidatos),
+        )
+        return cols[lookup(self.codigo_linha, cols) >= 0]
+
+    def jaccard_recommendation(self, usuario_id, top_n=5, candidatos=None):
+        self.refresh()
+        colunas = ["isbn13", "title", "authors", "categories", "thumbnail"]
+        with self._lock:
+            codigos = self._jaccard_codes(usuario_id, top_n, candidatos)
+            if len(codigos) == 0:
+                return pd.DataFrame(columns=colunas + ["match_type"])
+            posicoes = np.sort(self._catalog_positions(codigos))
+            recs = self.livros.frame(posicoes, colunas)
+            recs["match_type"] = "jaccard"
+            return recs
+
+    def similar_books(self, isbn13, top_n=10):
+        """
+        Livros mais parecidos com `isbn13` (vizinhos pré-calculados por
+        python -m scripts.item_neighbors), como lista de dicionários com score.
+        Retorna None se o ISBN não está no catálogo.
+        """
+        self.refresh()
+        with self._lock:
+            if self.vizinhos is None:
+                isbns = self.livros["isbn13"].to_numpy(dtype="U13")
+                self.vizinhos = self._open_or_build(
+                    "similares",
+                    lambda d: ItemNeighbors.load_valid(d, isbns),
+                    lambda d: build_item_neighbors(self.livros, self.tfidf_index.docs, d, self.config),
+                )
+            similares = self.vizinhos.similar(isbn13, top_n=top_n)
+            if similares is None:
+                return None
+            # Os vizinhos são calculados na ordem de self.livros (load_or_build confere)
+            rows, scores = similares
+            colunas = ["isbn13", "title", "authors", "categories", "thumbnail"]
+            recomendados = self.livros.frame(rows, colunas)
+            recomendados["score"] = scores
+            return json.loads(recomendados.to_json(orient="records"))
+
+    def _als_scores(self, usuario_id, top_n, candidatos=None):
+        """Códigos e scores (produto interno) do top-N do ALS."""
+        # Um produto (livros x fatores) @ vetor do usuário, sem os livros já lidos
+        lidos = lookup(self.fator_coluna, self.interacoes.user_items(usuario_id))
+        permitidos = self._candidate_codes(candidatos)
+        if permitidos is not None:
+            permitidos = lookup(self.fator_coluna, permitidos)
+            permitidos = permitidos[permitidos >= 0]
+        cols, scores = self.fatores.top_n(
+            usuario_id, top_n=top_n, exclude_cols=lidos[lidos >= 0], candidate_cols=permitidos
+        )
+        if len(cols) == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0)
+        codigos = self.coluna_codigo[cols]
+        no_catalogo = lookup(self.codigo_linha, codigos) >= 0
+        return codigos[no_catalogo], scores[no_catalogo].astype(np.float64)
+
+    def _collaborative_scores(self, usuario_id, top_n, candidatos=None):
+        """Sinal colaborativo configurado em COLABORATIVO: (códigos, scores)."""
+        if self.config.COLABORATIVO == "als":
+            return self._als_scores(usuario_id, top_n, candidatos)
+        # Jaccard: 1 para os recomendados pelos vizinhos
+        codigos = self._jaccard_codes(usuario_id, top_n, candidatos)
+        return codigos, np.ones(len(codigos))
+
+    def _popular_scores(self, usuario_id, top_n, candidatos=None, categoria=None):
+        """Linhas e scores do ranking de popularidade, sem os livros do usuário."""
+        if self.populares is None:
+            return np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.float32)
+        lidos = lookup(self.codigo_linha, self.interacoes.user_items(usuario_id))
+        return self.populares.top(
+            top_n, categoria=categoria, candidatos=candidatos, exclude=lidos[lidos >= 0]
+        )
+
+    def popular_books(self, top_n=10, categoria=None):
+        """
+        Livros mais bem avaliados (média bayesiana das notas externas e internas),
+        opcionalmente de uma categoria, como lista de dicionários com score.
+        """
+        self.refresh()
+        with self._lock:
+            rows, scores = self._popular_scores(
+                None, top_n, self._candidates(), categoria=categoria
+            )
+            return json.loads(self._popular_records(rows, scores).to_json(orient="records"))
+
+    def recomendar_populares(self, usuario_id, top_n=10, curso=None, semestre=None):
+        """
+        Fatia do ranking de popularidade para o usuário (sem os livros dele e, com
+        `curso`/`semestre`, só da bibliografia), no formato de `recomendar`. Não
+        pontua nada: é a resposta de contingência quando o cálculo completo não
+        cabe no prazo.
+        """
+        self.refresh()
+        with self._lock:
+            candidatos = self._candidates(curso, semestre)
+            rows, scores = self._popular_scores(usuario_id, top_n, candidatos)
+            return json.loads(self._popular_records(rows, scores).to_json(orient="records"))
+
+    def _popular_records(self, rows, scores):
+        recomendados = self._catalog_records(self.linha_codigo[rows])
+        recomendados["score"] = scores.astype(np.float64)
+        return recomendados
+
+    def _catalog_records(self, codigos):
+        """Linhas de self.livros (colunas da API) dos códigos, na ordem recebida."""
+        colunas = ["isbn13", "title", "authors", "categories", "thumbnail"]
+        return self.livros.frame(self._catalog_positions(codigos), colunas)
+
+    def als_recommendation(self, usuario_id, top_n=5, candidatos=None):
+        self.refresh()
+        with self._lock:
+            codigos, scores = self._als_scores(usuario_id, top_n, candidatos)
+            recs = self._catalog_records(codigos)
+            # Normalizado pelo melhor score, na mesma escala (0 a 1) do indicador do Jaccard
+            recs["colaborativo"] = scale_by_max(scores)
+            recs["match_type"] = "als"
+            return recs
+
+    def collaborative_recommendation(self, usuario_id, top_n=5, candidatos=None):
+        """Sinal colaborativo configurado em COLABORATIVO, com a coluna `colaborativo` (0 a 1)."""
+        if self.config.COLABORATIVO == "als":
+            return self.als_recommendation(usuario_id, top_n=top_n, candidatos=candidatos)
+        recs = self.jaccard_recommendation(usuario_id, top_n=top_n, candidatos=candidatos)
+        recs["colaborativo"] = 1.0
+        return recs
+
+    def recomendar_livros(self, usuario_id, top_n=10, curso=None, semestre=None):
+        """
+        Recomendação híbrida. Com `curso` (e opcionalmente `semestre`), só os livros
+        da bibliografia daquele curso/semestre são pontuados pelos sinais; com
+        `set_availability`, só os que têm exemplar disponível para aluguel.
+        """
+        self.refresh()
+        # Mesmo snapshot para os dois sinais e para o catálogo
+        with self._lock:
+            candidatos = self._candidates(curso, semestre)
+            return self._recomendar_livros(usuario_id, top_n, candidatos)
+
+    def recomendar(self, usuario_id, top_n=10, curso=None, semestre=None):
+        """
+        Mesmo resultado de recomendar_livros, sempre como lista de dicionários
+        (isbn13, title, authors, categories, thumbnail, score), para a API.
+        """
+        resultado = self.recomendar_livros(
+            usuario_id, top_n=top_n, curso=curso, semestre=semestre
+        )
+        if isinstance(resultado, pd.DataFrame):
+            resultado = resultado.rename(columns={"tfidf": "score"})
+            if "score" not in resultado:
+                resultado["score"] = None
+            resultado = resultado.to_json(orient="records")
+        try:
+            registros = json.loads(resultado)
+        except ValueError:
+            return []  # "Não há recomendações disponíveis."
+        return registros
+
+    def _recomendar_livros(self, usuario_id, top_n, candidatos=None):
+        codigos, scores = self._ranked_codes(usuario_id, top_n, candidatos)
+        if len(codigos) == 0:
+            return "Não há recomendações disponíveis."
+        # Metadados do catálogo só para os vencedores
+        recomendados = self._catalog_records(codigos)
+        recomendados["score"] = scores
+        return recomendados.to_json(orient="records")
+
+    def _ranked_codes(self, usuario_id, top_n, candidatos=None):
+        """
+        Códigos de ISBN e scores do top-N do usuário: o híbrido ou, no cold start,
+        a fatia do ranking de popularidade (vazios se não há o que recomendar).
+        """
+        # Cada sinal fica em arrays (códigos de ISBN, scores); nada de DataFrame até o top-N
+        codigos_colab, colaborativo = self._collaborative_scores(usuario_id, top_n, candidatos)
+        linhas_tfidf, tfidf = self._tfidf_scores(usuario_id, top_n, candidatos)
+        if len(codigos_colab) == 0 and len(linhas_tfidf) == 0:
+            # Cold start: fatia do ranking de popularidade pré-calculado
+            rows, scores = self._popular_scores(usuario_id, top_n, candidatos)
+            return self.linha_codigo[rows], scores.astype(np.float64)
+
+        codigos_tfidf = self.linha_codigo[linhas_tfidf]
+        blend = ScoreBlend(codigos_colab, codigos_tfidf)
+        # Empates ficam na ordem do ISBN
+        desempate = self.ids.isbn_array(blend.codigos)
+
+        # Ajuste os pesos em RecommenderConfig (PESO_JACCARD / PESO_TFIDF / PESO_AFINIDADE);
+        # cada sinal é levado à escala 0 a 1 (dividido pelo melhor) antes do peso, já
+        # que os cossenos do TF-IDF ficam bem abaixo do indicador do Jaccard
+        blend.add(codigos_colab, colaborativo, self.config.PESO_JACCARD, normalizar=True)
+        # Sem TF-IDF (usuário sem perfil), só o sinal colaborativo ordena
+        if len(linhas_tfidf) > 0:
+            blend.add(codigos_tfidf, tfidf, self.config.PESO_TFIDF, normalizar=True)
+            # A afinidade com categorias/autores é calculada só para os candidatos
+            blend.add(
+                blend.codigos,
+                self._affinity_scores(usuario_id, blend.codigos),
+                self.config.PESO_AFINIDADE,
+                normalizar=True,
+            )
+        vencedores = blend.top_n(top_n, desempate)
+        return blend.codigos[vencedores], blend.score[vencedores]
+
+    def batch_inputs(self):
+        """
+        Tudo o que o lote (scripts.batch_recommendations) precisa para pontuar, em
+        blocos e com produtos de matrizes, todos os usuários com alguma nota ou
+        interação implícita, tirado de uma mesma carga dos dados: (usuario_ids,
+        matrizes, parâmetros, estado). As linhas de `gostou` e `fatores_usuario`
+        seguem `usuario_ids`; as demais matrizes estão nos códigos do dicionário de
+        ids (usuários, ISBNs) ou nas linhas do índice TF-IDF.
+        """
+        self.refresh()
+        with self._lock:
+            interacoes = self.interacoes.to_csr()
+            usuarios = np.flatnonzero(np.diff(interacoes.indptr))
+            usuario_ids = self.ids.user_array(usuarios)
+            n_isbns = interacoes.shape[1]
+            matrizes = {
+                "usuarios": usuarios,
+                "interacoes": interacoes,
+                "interacoes_t": self.interacoes.to_csr_t(),
+                "gostou": self.perfis.rated_matrix(usuario_ids),
+                "codigo_linha": lookup(self.codigo_linha, np.arange(n_isbns)),
+                # Empates pelo ISBN, como em _ranked_codes
+                "ordem_isbn": np.argsort(np.argsort(self.tfidf_index.isbns, kind="stable")),
+                "rotulos": self.afinidade.features,
+                "rotulos_t": self.afinidade.postings,
+            }
+            if self.lsa is not None:
+                matrizes["embeddings"] = self.lsa.embeddings
+            else:
+                matrizes["docs"] = self.tfidf_index.docs
+                matrizes["postings"] = self.tfidf_index.postings
+            if self.config.COLABORATIVO == "als":
+                matrizes["fatores_usuario"], matrizes["tem_fatores"] = self.fatores.user_matrix(
+                    usuario_ids.tolist()
+                )
+                matrizes["fatores_item"] = self.fatores.item_factors
+                matrizes["fator_coluna"] = lookup(self.fator_coluna, np.arange(n_isbns))
+                matrizes["coluna_linha"] = lookup(self.codigo_linha, self.coluna_codigo)
+            elif self.lsh is not None:
+                matrizes["pares_lsh"] = self.lsh.candidate_pairs(interacoes.shape[0])
+            if self.populares is not None:
+                matrizes["populares_linhas"] = self.populares.rows
+                matrizes["populares_scores"] = self.populares.scores
+            parametros = {
+                "n_categorias": self.afinidade.n_categorias,
+                "pesos_afinidade": self.afinidade.pesos,
+            }
+            return usuario_ids, matrizes, parametros, self.state()
+
+    def records(self, isbns, scores):
+        """Registros de `recomendar` (lista de dicionários) dos ISBNs, na ordem recebida."""
+        with self._lock:
+            codigos = self.ids.encode_isbns(isbns, add=False)
+            recomendados = self._catalog_records(codigos)
+            recomendados["score"] = np.asarray(scores, dtype=np.float64)
+            return json.loads(recomendados.to_json(orient="records"))
+
+    def state(self):
+        """Versão dos artefatos e dos dados carregados (o que um resultado pré-calculado precisa bater)."""
+        with self._lock:
+            return {
+                "version": self.version,
+                "catalog_version": [int(v) for v in self.catalog_version or ()],
+                "ratings_version": [int(v) for v in self.ratings_version or ()],
+                "implicit_version": [int(v) for v in self.implicit_version or ()],
+                "config": {nome: getattr(self.config, nome) for nome in CONFIG_DO_RANKING},
+            }
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_engine():
+    """Instância compartilhada do motor, criada (sem carregar dados) no primeiro uso."""
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = RecommenderEngine()
+        return _engine
+
+
+def tfidf_recommendation(usuario_id, top_n=5):
+    return get_engine().tfidf_recommendation(usuario_id, top_n=top_n)
+
+
+def jaccard_recommendation(usuario_id, top_n=5):
+    return get_engine().jaccard_recommendation(usuario_id, top_n=top_n)
+
+
+def recomendar_livros(usuario_id, top_n=10, curso=None, semestre=None):
+    return get_engine().recomendar_livros(
+        usuario_id, top_n=top_n, curso=curso, semestre=semestre
+    )
 
 
 def main(id, n):
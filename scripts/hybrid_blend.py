@@ -0,0 +1,113 @@
+import numpy as np
+
+
+def scale_by_max(scores):
+    """
+    Divide cada linha de `scores` (1-D ou usuários x candidatos) pelo seu maior
+    valor, levando o sinal à escala 0 a 1; linhas sem valor positivo viram 0.
+    """
+    scores = np.asarray(scores, dtype=np.float64)
+    if scores.size == 0:
+        return scores
+    melhor = scores.max(axis=-1, keepdims=True)
+    return np.divide(scores, melhor, out=np.zeros_like(scores), where=melhor > 0)
+
+
+def top_n_entries(linhas, scores, desempate, top_n):
+    """
+    Top-N de cada linha a partir de entradas esparsas (triplas alinhadas: linha,
+    score e chave de desempate). Retorna os índices das entradas escolhidas,
+    agrupados por linha e, em cada uma, do maior score para o menor; empates são
+    resolvidos pelo menor `desempate`.
+    """
+    linhas = np.asarray(linhas)
+    if len(linhas) == 0 or top_n <= 0:
+        return np.zeros(0, dtype=np.int64)
+    ordem = np.lexsort((desempate, -np.asarray(scores, dtype=np.float64), linhas))
+    ordenadas = linhas[ordem]
+    inicio = np.searchsorted(ordenadas, ordenadas, side="left")
+    return ordem[np.arange(len(ordem)) - inicio < top_n]
+
+
+def top_n_rows(score, top_n, desempate, validos=None):
+    """
+    Top-N de cada linha de uma matriz densa (usuários x candidatos), só entre as
+    posições com `validos` True. `desempate` é alinhado às colunas. Retorna
+    (linhas, colunas) das posições escolhidas, agrupadas por linha e em ordem de
+    ranking, como `top_n_entries`.
+    """
+    score = np.asarray(score, dtype=np.float64)
+    k = min(top_n, score.shape[1])
+    if k <= 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    if validos is not None:
+        score = np.where(validos, score, -np.inf)
+    # Tudo que empata com o n-ésimo colocado de cada linha entra no desempate
+    limite = np.partition(score, score.shape[1] - k, axis=1)[:, score.shape[1] - k]
+    selecionados = score >= limite[:, None]
+    if validos is not None:
+        selecionados &= validos
+    linhas, colunas = np.nonzero(selecionados)
+    escolhidas = top_n_entries(linhas, score[linhas, colunas], np.asarray(desempate)[colunas], k)
+    return linhas[escolhidas], colunas[escolhidas]
+
+
+class ScoreBlend:
+    """
+    Combinação dos sinais do híbrido só com arrays do numpy.
+
+    Os candidatos são a união dos códigos de ISBN (IdDictionary) trazidos pelos
+    sinais; cada sinal é espalhado num vetor alinhado a esses candidatos,
+    multiplicado pelo seu peso e somado ao score. O top-N sai de um np.partition,
+    e só os vencedores voltam a virar ISBN/título no chamador.
+
+    Com `n_linhas`, o score é uma matriz (uma linha por usuário, mesmos
+    candidatos), e a normalização, os pesos e o desempate são os mesmos do
+    recomendar online: é assim que o lote (scripts.batch_recommendations) combina
+    os sinais de um bloco de usuários.
+    """
+
+    def __init__(self, *codigos, n_linhas=None):
+        partes = [np.asarray(c, dtype=np.int64) for c in codigos]
+        self.codigos = np.unique(np.concatenate(partes)) if partes else np.zeros(0, dtype=np.int64)
+        forma = len(self.codigos) if n_linhas is None else (n_linhas, len(self.codigos))
+        self.score = np.zeros(forma)
+
+    def __len__(self):
+        return len(self.codigos)
+
+    def positions(self, codigos):
+        """Posições dos `codigos` (já presentes) no índice de candidatos."""
+        return np.searchsorted(self.codigos, np.asarray(codigos, dtype=np.int64))
+
+    def add(self, codigos, scores, peso=1.0, normalizar=False):
+        """
+        Soma `peso * scores` nos candidatos `codigos` (os ausentes do sinal contam 0).
+        Com `normalizar`, o sinal é dividido pelo seu maior valor antes (escala 0 a 1).
+        """
+        valores = np.zeros(len(self.codigos))
+        valores[self.positions(codigos)] = np.asarray(scores, dtype=np.float64)
+        self.add_aligned(valores, peso, normalizar)
+
+    def add_aligned(self, scores, peso=1.0, normalizar=False):
+        """
+        Soma `peso * scores`, com os scores já alinhados aos candidatos (a forma de
+        self.score). Com `normalizar`, cada linha é dividida pelo seu maior valor antes.
+        """
+        scores = np.asarray(scores, dtype=np.float64)
+        if normalizar:
+            scores = scale_by_max(scores)
+        self.score += peso * scores
+
+    def top_n(self, top_n, desempate=None, validos=None):
+        """
+        Posições dos `top_n` maiores scores, do maior para o menor. Empates são
+        resolvidos pelo menor valor de `desempate` (alinhado aos candidatos; por
+        padrão, o próprio código). Com score em matriz, retorna (linhas, posições)
+        só entre os `validos`, como `top_n_rows`.
+        """
+        if desempate is None:
+            desempate = self.codigos
+        if self.score.ndim == 2:
+            return top_n_rows(self.score, top_n, desempate, validos)
+        return top_n_rows(self.score[None], top_n, desempate)[1]
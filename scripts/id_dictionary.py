@@ -0,0 +1,248 @@
+import os
+
+import numpy as np
+
+from scripts.artifacts import save_atomic
+from scripts.config import RecommenderConfig
+
+
+def default_ids_dir():
+    return os.path.join(RecommenderConfig.get_instance().ARTIFACTS_DIR, "ids")
+
+
+class _Codes:
+    """
+    Mapa valor externo -> código denso (0, 1, 2, ...), só cresce.
+
+    Os valores já salvos ficam em dois arrays (código -> valor e a ordenação
+    deles), abertos em memory-map e consultados por busca binária, então todos
+    os processos compartilham as mesmas páginas; só os valores acrescentados
+    depois da carga ficam num dicionário do processo.
+    """
+
+    def __init__(self, values=(), dtype=None, order=None):
+        self.dtype = dtype
+        self.saved = np.asarray(values, dtype=dtype)  # código -> valor (prefixo carregado)
+        # Ordenação dos valores salvos: busca binária sem copiar o array
+        self.order = np.argsort(self.saved, kind="stable") if order is None else order
+        self.extra = []  # códigos len(saved), len(saved) + 1, ... -> valor
+        self.extra_index = {}
+        self._extra_array = None
+
+    def __len__(self):
+        return len(self.saved) + len(self.extra)
+
+    @property
+    def keys(self):
+        """Todos os valores, na ordem dos códigos."""
+        return np.concatenate([self.saved, np.asarray(self.extra, dtype=self.saved.dtype)])
+
+    def _find_saved(self, values):
+        """Códigos dos valores entre os salvos (-1 para os que não estão)."""
+        codes = np.full(len(values), -1, dtype=np.int32)
+        if len(self.saved) == 0:
+            return codes
+        pos = np.searchsorted(self.saved, values, sorter=self.order)
+        pos = np.minimum(pos, len(self.saved) - 1)
+        candidatos = np.asarray(self.order[pos])
+        achados = self.saved[candidatos] == values
+        codes[achados] = candidatos[achados]
+        return codes
+
+    def encode(self, values, add=True):
+        """
+        Códigos int32 dos valores; novos valores são registrados (ou viram -1 com
+        add=False). Os novos recebem códigos na ordem em que aparecem em `values`,
+        então a mesma sequência de leituras dá os mesmos códigos em qualquer processo.
+        """
+        values = np.asarray(values, dtype=self.dtype)
+        if len(values) == 0:
+            return np.zeros(0, dtype=np.int32)
+        uniques, first, inverse = np.unique(values, return_index=True, return_inverse=True)
+        codes = self._find_saved(uniques)
+        novos = np.flatnonzero(codes < 0)
+        for i in novos[np.argsort(first[novos], kind="stable")].tolist():
+            value = uniques[i].item()
+            code = self.extra_index.get(value)
+            if code is None:
+                if not add:
+                    continue
+                code = len(self)
+                self.extra_index[value] = code
+                self.extra.append(value)
+                self._extra_array = None
+            codes[i] = code
+        return codes[inverse.reshape(-1)]
+
+    def decode(self, codes):
+        """Valores externos dos códigos (array do numpy)."""
+        codes = np.asarray(codes, dtype=np.int64)
+        n = len(self.saved)
+        if not self.extra:
+            return self.saved[codes]
+        if self._extra_array is None or len(self._extra_array) != len(self.extra):
+            self._extra_array = np.asarray(self.extra, dtype=self.saved.dtype)
+        values = np.empty(len(codes), dtype=self.saved.dtype)
+        salvos = codes < n
+        values[salvos] = self.saved[codes[salvos]]
+        values[~salvos] = self._extra_array[codes[~salvos] - n]
+        return values
+
+
+class _CodeIndex:
+    """Visão somente leitura valor -> código (interface de dicionário) sobre um _Codes."""
+
+    def __init__(self, codes):
+        self._codes = codes
+
+    def get(self, value, default=None):
+        try:
+            code = int(self._codes.encode([value], add=False)[0])
+        except (TypeError, ValueError):
+            return default  # ex.: None, como um dicionário que não tem a chave
+        return default if code < 0 else code
+
+    def __getitem__(self, value):
+        code = self.get(value)
+        if code is None:
+            raise KeyError(value)
+        return code
+
+    def __contains__(self, value):
+        return self.get(value) is not None
+
+    def __len__(self):
+        return len(self._codes)
+
+
+class IdDictionary:
+    """
+    Dicionário compartilhado de ids: ISBN-13 e usuario_id viram índices int32
+    densos, com arrays para a volta. As estruturas do recomendador (matriz de
+    interações, candidatos, fatores) trabalham nesses índices, e o texto só é
+    materializado no top-N final.
+
+    Os códigos só são acrescentados (nunca reaproveitados), então o dicionário
+    salvo continua válido para os artefatos construídos antes de novos livros ou
+    usuários aparecerem.
+    """
+
+    def __init__(self, isbns=(), user_ids=(), isbn_order=None, user_order=None):
+        self._isbns = _Codes(isbns, dtype="U13", order=isbn_order)
+        self._users = _Codes(user_ids, dtype=np.int64, order=user_order)
+        self._saved = (len(self._isbns), len(self._users))
+
+    # Visões usadas pela InteractionMatrix (valor -> código e código -> valor)
+    @property
+    def isbn_index(self):
+        return _CodeIndex(self._isbns)
+
+    @property
+    def isbns(self):
+        return self._isbns.keys
+
+    @property
+    def user_index(self):
+        return _CodeIndex(self._users)
+
+    @property
+    def user_ids(self):
+        return self._users.keys
+
+    @property
+    def n_isbns(self):
+        return len(self._isbns)
+
+    @property
+    def n_users(self):
+        return len(self._users)
+
+    def encode_isbns(self, isbns, add=True):
+        return self._isbns.encode(isbns, add=add)
+
+    def encode_users(self, usuario_ids, add=True):
+        return self._users.encode(usuario_ids, add=add)
+
+    def isbn_array(self, codes):
+        return self._isbns.decode(codes)
+
+    def user_array(self, codes):
+        return self._users.decode(codes)
+
+    @classmethod
+    def load(cls, ids_dir=None):
+        """Abre o dicionário salvo em memory-map (a ordenação é calculada se faltar)."""
+        ids_dir = ids_dir or default_ids_dir()
+        arrays = {}
+        for nome in ("isbn13", "usuario_id"):
+            arrays[nome] = np.load(os.path.join(ids_dir, f"{nome}.npy"), mmap_mode="r")
+            ordem = os.path.join(ids_dir, f"{nome}_order.npy")
+            arrays[f"{nome}_order"] = np.load(ordem, mmap_mode="r") if os.path.exists(ordem) else None
+        return cls(
+            arrays["isbn13"],
+            arrays["usuario_id"],
+            isbn_order=arrays["isbn13_order"],
+            user_order=arrays["usuario_id_order"],
+        )
+
+    @classmethod
+    def load_or_create(cls, ids_dir=None):
+        ids_dir = ids_dir or default_ids_dir()
+        if os.path.exists(os.path.join(ids_dir, "isbn13.npy")):
+            return cls.load(ids_dir)
+        return cls()
+
+    def extend(self, other):
+        """
+        Acrescenta os códigos de `other` (outro dicionário, ex.: o de um snapshot)
+        que faltam neste. Só vale se um for prefixo do outro, nos ISBNs e nos
+        usuários; se os códigos divergem nada muda e retorna False.
+        """
+        pares = ((self._isbns, other.isbns), (self._users, other.user_ids))
+        for codes, valores in pares:
+            n = min(len(codes), len(valores))
+            if not np.array_equal(codes.keys[:n], valores[:n]):
+                return False
+        for codes, valores in pares:
+            codes.encode(valores[len(codes):])
+        return True
+
+    def save(self, ids_dir=None):
+        """Persiste o dicionário, se ele cresceu desde a última gravação."""
+        if self._saved == (len(self._isbns), len(self._users)):
+            return
+        self.write(ids_dir)
+
+    def write(self, ids_dir=None):
+        """Grava o dicionário inteiro em `ids_dir` (arrays código -> valor e a ordenação)."""
+        ids_dir = ids_dir or default_ids_dir()
+        os.makedirs(ids_dir, exist_ok=True)
+        for nome, valores in (
+            ("isbn13", np.asarray(self.isbns, dtype="U13")),
+            ("usuario_id", np.asarray(self.user_ids, dtype=np.int64)),
+        ):
+            save_atomic(os.path.join(ids_dir, f"{nome}.npy"), valores)
+            save_atomic(os.path.join(ids_dir, f"{nome}_order.npy"), np.argsort(valores, kind="stable"))
+        self._saved = (len(self._isbns), len(self._users))
+
+
+def invert_codes(codes, size=None):
+    """
+    Inverte um mapeamento posição -> código: devolve o array código -> posição
+    (-1 para códigos sem posição), ex.: linha do índice TF-IDF de cada ISBN.
+    """
+    codes = np.asarray(codes, dtype=np.int64)
+    size = max(size or 0, int(codes.max()) + 1 if len(codes) else 0)
+    inverse = np.full(size, -1, dtype=np.int32)
+    valid = codes >= 0
+    inverse[codes[valid]] = np.flatnonzero(valid).astype(np.int32)
+    return inverse
+
+
+def lookup(mapping, codes):
+    """`mapping[codes]` tolerando códigos além do fim do array (viram -1)."""
+    codes = np.asarray(codes, dtype=np.int64)
+    result = np.full(len(codes), -1, dtype=np.int64)
+    valid = (codes >= 0) & (codes < len(mapping))
+    result[valid] = mapping[codes[valid]]
+    return result
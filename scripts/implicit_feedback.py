@@ -0,0 +1,117 @@
+import sqlite3
+
+from scripts.availability import normalize_isbn
+
+# Interações implícitas (ex.: aluguéis da API), com peso, gravadas no banco do
+# recomendador por um ETL incremental. O motor as lê junto com NotasLivros: entram
+# na matriz de interações (sinais colaborativos), não nos perfis TF-IDF, que
+# continuam só com as notas positivas.
+CREATE_TABLES = """
+    CREATE TABLE IF NOT EXISTS InteracoesImplicitas (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        usuario_id INTEGER NOT NULL,
+        isbn13 TEXT NOT NULL,
+        peso REAL NOT NULL,
+        origem TEXT NOT NULL,
+        origem_id INTEGER NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS EtlWatermark (
+        origem TEXT PRIMARY KEY,
+        ultimo_id INTEGER NOT NULL
+    );
+"""
+
+
+def table_version(conn):
+    """(COUNT, MAX(id)) de InteracoesImplicitas, ou (0, 0) se a tabela não existe."""
+    try:
+        return tuple(
+            conn.execute(
+                "SELECT COUNT(*), COALESCE(MAX(id), 0) FROM InteracoesImplicitas"
+            ).fetchone()
+        )
+    except sqlite3.OperationalError:
+        return (0, 0)
+
+
+def watermark(conn, origem):
+    """Maior id da origem já processado (0 se o ETL nunca rodou para ela)."""
+    try:
+        linha = conn.execute(
+            "SELECT ultimo_id FROM EtlWatermark WHERE origem = ?", (origem,)
+        ).fetchone()
+    except sqlite3.OperationalError:
+        return 0
+    return linha[0] if linha else 0
+
+
+def _lookup(conn, sql, valores):
+    """Resultado de `sql` (com um IN (...) de `valores`) como dicionário da 1ª para a 2ª coluna."""
+    valores = list(set(valores))
+    resultado = {}
+    # Limite de variáveis por consulta do SQLite
+    for i in range(0, len(valores), 900):
+        parte = valores[i : i + 900]
+        marcadores = ", ".join("?" * len(parte))
+        resultado.update(conn.execute(sql.format(marcadores), parte).fetchall())
+    return resultado
+
+
+def append_interactions(conn, origem, registros, peso):
+    """
+    Grava um bloco da origem numa única transação, junto com o novo watermark:
+    `registros` são tuplas (id na origem, email do usuário, ISBN), em ordem de id.
+    O email vira `usuarios.id` e o ISBN (10 ou 13, com ou sem hífens) vira o
+    isbn13 da Biblioteca; registros sem usuário ou sem livro no catálogo são
+    contados e descartados. Retorna (gravados, sem_usuario, sem_livro).
+    """
+    if not registros:
+        return 0, 0, 0
+    isbns = [normalize_isbn(isbn) for _, _, isbn in registros]
+    usuarios = _lookup(
+        conn,
+        "SELECT email, id FROM usuarios WHERE email IN ({})",
+        [email for _, email, _ in registros if email],
+    )
+    catalogo = _lookup(
+        conn,
+        "SELECT isbn13, isbn13 FROM Biblioteca WHERE isbn13 IN ({})",
+        [isbn for isbn in isbns if isbn],
+    )
+    linhas, sem_usuario, sem_livro = [], 0, 0
+    for (origem_id, email, _), isbn13 in zip(registros, isbns):
+        if email not in usuarios:
+            sem_usuario += 1
+        elif isbn13 not in catalogo:
+            sem_livro += 1
+        else:
+            linhas.append((usuarios[email], isbn13, peso, origem, origem_id))
+    with conn:
+        conn.executemany(
+            "INSERT INTO InteracoesImplicitas (usuario_id, isbn13, peso, origem, origem_id) "
+            "VALUES (?, ?, ?, ?, ?)",
+            linhas,
+        )
+        conn.execute(
+            "INSERT OR REPLACE INTO EtlWatermark (origem, ultimo_id) VALUES (?, ?)",
+            (origem, registros[-1][0]),
+        )
+    return len(linhas), sem_usuario, sem_livro
+
+
+def sync(conn, origem, chunks, peso):
+    """
+    Uma passada do ETL: grava cada bloco de `chunks` (listas de registros depois
+    do watermark, ver append_interactions) e avança o watermark bloco a bloco, então
+    uma passada interrompida continua de onde parou. Retorna os contadores.
+    """
+    conn.executescript(CREATE_TABLES)
+    stats = {"lidos": 0, "gravados": 0, "sem_usuario": 0, "sem_livro": 0}
+    for registros in chunks:
+        gravados, sem_usuario, sem_livro = append_interactions(conn, origem, registros, peso)
+        stats["lidos"] += len(registros)
+        stats["gravados"] += gravados
+        stats["sem_usuario"] += sem_usuario
+        stats["sem_livro"] += sem_livro
+    stats["watermark"] = watermark(conn, origem)
+    return stats
@@ -0,0 +1,286 @@
+import numpy as np
+import scipy.sparse as sp
+
+from scripts.hybrid_blend import top_n_entries
+from scripts.id_dictionary import IdDictionary
+from scripts.tfidf_index import load_csr, save_csr
+
+
+class InteractionMatrix:
+    """
+    Matriz esparsa usuário x livro com ids inteiros (linhas = usuários, colunas = ISBNs),
+    nos códigos de um IdDictionary (compartilhado com o resto do recomendador).
+
+    O valor de cada célula é o número de avaliações do usuário para o livro, como o
+    `pivot_table(aggfunc="count")` antigo, somado ao peso das interações implícitas
+    (aluguéis) do usuário com ele. Novas avaliações entram num buffer pequeno
+    (delta) que é consultado junto com a matriz base e incorporado a ela de tempos em
+    tempos, então atualizar não exige reconstruir a matriz inteira.
+    """
+
+    def __init__(self, compact_min=1024, ids=None):
+        self.ids = ids if ids is not None else IdDictionary()
+        self.compact_min = compact_min
+
+        self._base = sp.csr_matrix((0, 0), dtype=np.float32)
+        self._base_t = sp.csr_matrix((0, 0), dtype=np.float32)
+        self._pending_rows = []
+        self._pending_cols = []
+        self._pending_vals = []
+        self._pending_pairs = set()
+        self._delta = None
+        self._delta_t = None
+        self._degree = np.zeros(0, dtype=np.int64)  # livros distintos por usuário
+
+    # Linhas e colunas são os códigos do dicionário de ids
+    @property
+    def user_index(self):
+        return self.ids.user_index  # usuario_id -> linha
+
+    @property
+    def user_ids(self):
+        return self.ids.user_ids  # linha -> usuario_id
+
+    @property
+    def isbn_index(self):
+        return self.ids.isbn_index  # isbn13 -> coluna
+
+    @property
+    def isbns(self):
+        return self.ids.isbns  # coluna -> isbn13
+
+    @classmethod
+    def from_ratings(cls, notas, **kwargs):
+        """Constrói a matriz a partir de um DataFrame com `usuario_id` e `isbn13`."""
+        return cls.from_chunks([notas], **kwargs)
+
+    @classmethod
+    def from_codes(cls, rows, cols, values=None, **kwargs):
+        """
+        Constrói a matriz a partir de pares (linha, coluna) já codificados no
+        dicionário, com o valor de cada par (1 por padrão).
+        """
+        matrix = cls(**kwargs)
+        if values is None:
+            values = np.ones(len(rows), dtype=np.float32)
+        base = sp.csr_matrix(
+            (np.asarray(values, dtype=np.float32), (rows, cols)), shape=matrix.shape
+        )
+        base.sum_duplicates()
+        matrix._base = base
+        matrix._base_t = base.T.tocsr()
+        matrix._degree = np.diff(base.indptr).astype(np.int64)
+        return matrix
+
+    @classmethod
+    def from_chunks(cls, chunks, **kwargs):
+        """
+        Constrói a matriz a partir de blocos de notas (DataFrames com `usuario_id` e
+        `isbn13`, ex.: loaders.iter_ratings): cada bloco vira códigos int32 e as
+        strings são descartadas antes da leitura do próximo. Blocos com a coluna
+        `peso` (loaders.iter_implicit) entram com esse valor em vez de 1.
+        """
+        ids = kwargs.pop("ids", None)
+        ids = ids if ids is not None else IdDictionary()
+        rows, cols, values = [], [], []
+        for chunk in chunks:
+            rows.append(ids.encode_users(chunk["usuario_id"].to_numpy()))
+            cols.append(ids.encode_isbns(chunk["isbn13"].to_numpy()))
+            if "peso" in chunk:
+                values.append(chunk["peso"].to_numpy(dtype=np.float32))
+            else:
+                values.append(np.ones(len(chunk), dtype=np.float32))
+        rows = np.concatenate(rows) if rows else np.zeros(0, dtype=np.int32)
+        cols = np.concatenate(cols) if cols else np.zeros(0, dtype=np.int32)
+        values = np.concatenate(values) if values else np.zeros(0, dtype=np.float32)
+        return cls.from_codes(rows, cols, values, ids=ids, **kwargs)
+
+    def save(self, directory):
+        """Grava a matriz base (e a transposta) em CSR, para abrir depois em memory-map."""
+        base = self.to_csr()
+        save_csr(directory, "interacoes", base)
+        save_csr(directory, "interacoes_t", self._base_t)
+
+    @classmethod
+    def load(cls, directory, ids, **kwargs):
+        """
+        Abre a base salva por `save` em memory-map (compartilhada entre processos);
+        novas avaliações continuam indo para o buffer, e só a compactação copia a
+        base para a memória do processo.
+        """
+        matrix = cls(ids=ids, **kwargs)
+        matrix._base = load_csr(directory, "interacoes")
+        matrix._base_t = load_csr(directory, "interacoes_t")
+        matrix._degree = np.diff(matrix._base.indptr).astype(np.int64)
+        if matrix._base.shape != matrix.shape:
+            matrix._base.resize(matrix.shape)
+            matrix._base_t.resize(matrix.shape[::-1])
+            matrix._degree = np.concatenate(
+                [matrix._degree, np.zeros(matrix.shape[0] - len(matrix._degree), dtype=np.int64)]
+            )
+        return matrix
+
+    @property
+    def shape(self):
+        return (self.ids.n_users, self.ids.n_isbns)
+
+    @property
+    def nnz(self):
+        return self._base.nnz + len(self._pending_pairs)
+
+    def _in_base(self, row, col):
+        if row >= self._base.shape[0] or col >= self._base.shape[1]:
+            return False
+        start, end = self._base.indptr[row], self._base.indptr[row + 1]
+        pos = np.searchsorted(self._base.indices[start:end], col)
+        return pos < end - start and self._base.indices[start + pos] == col
+
+    def add_rating(self, usuario_id, isbn13, value=1.0):
+        self.add_ratings([usuario_id], [isbn13], [value])
+
+    def add_ratings(self, usuario_ids, isbns, values=None):
+        """
+        Acrescenta avaliações (novas linhas de NotasLivros, ou interações implícitas
+        com `values` = pesos) sem reconstruir a matriz. Retorna as linhas e colunas (códigos inteiros) das avaliações incorporadas.
+        """
+        if len(usuario_ids) == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+        rows = self.ids.encode_users(usuario_ids).astype(np.int64)
+        cols = self.ids.encode_isbns(isbns).astype(np.int64)
+        if values is None:
+            values = np.ones(len(rows), dtype=np.float32)
+
+        if self._base.shape != self.shape:
+            # Usuários ou livros novos: só estende o formato (indptr) da base
+            self._base.resize(self.shape)
+            self._base_t.resize(self.shape[::-1])
+            self._degree = np.concatenate(
+                [self._degree, np.zeros(self.shape[0] - len(self._degree), dtype=np.int64)]
+            )
+        for row, col in zip(rows.tolist(), cols.tolist()):
+            if (row, col) not in self._pending_pairs and not self._in_base(row, col):
+                self._degree[row] += 1
+            self._pending_pairs.add((row, col))
+
+        self._pending_rows.extend(rows.tolist())
+        self._pending_cols.extend(cols.tolist())
+        self._pending_vals.extend(np.asarray(values, dtype=np.float32).tolist())
+        self._delta = None
+        self._delta_t = None
+        if len(self._pending_rows) >= max(self.compact_min, self._base.nnz // 10):
+            self.compact()
+        return rows, cols
+
+    def compact(self):
+        """Incorpora o buffer de novas avaliações à matriz base."""
+        base = self._base
+        if self._pending_rows:
+            base = base + self._delta_matrix()
+        self._base = base.tocsr()
+        self._base.sort_indices()
+        self._base_t = self._base.T.tocsr()
+        self._pending_rows, self._pending_cols, self._pending_vals = [], [], []
+        self._pending_pairs = set()
+        self._delta = None
+        self._delta_t = None
+
+    def to_csr(self):
+        """Matriz completa (usuário x livro) em CSR, já com o buffer incorporado."""
+        if self._pending_rows:
+            self.compact()
+        return self._base
+
+    def to_csr_t(self):
+        """Transposta (livro x usuário) em CSR, já com o buffer incorporado."""
+        self.to_csr()
+        return self._base_t
+
+    def _delta_matrix(self):
+        if self._delta is None:
+            self._delta = sp.csr_matrix(
+                (self._pending_vals, (self._pending_rows, self._pending_cols)),
+                shape=self.shape,
+                dtype=np.float32,
+            )
+            self._delta_t = self._delta.T.tocsr()
+        return self._delta
+
+    def user_rows(self, rows):
+        """Linhas (usuários) da matriz atual, base + buffer."""
+        rows = np.asarray(rows, dtype=np.int64)
+        result = self._base[rows]
+        if self._pending_rows:
+            result = result + self._delta_matrix()[rows]
+        return result.tocsr()
+
+    def item_rows(self, cols):
+        """Linhas da transposta (livro x usuário), base + buffer."""
+        cols = np.asarray(cols, dtype=np.int64)
+        result = self._base_t[cols]
+        if self._pending_rows:
+            self._delta_matrix()
+            result = result + self._delta_t[cols]
+        return result.tocsr()
+
+    def user_items(self, usuario_id):
+        """Colunas (livros) com interação do usuário."""
+        row = self.user_index.get(usuario_id)
+        if row is None:
+            return np.zeros(0, dtype=np.int64)
+        return self.user_rows([row]).indices.astype(np.int64)
+
+    def jaccard_similarity(self, usuario_id):
+        """
+        Similaridade de Jaccard entre o usuário e todos os que compartilham algum livro.
+
+        Só percorre as listas de usuários dos livros avaliados pelo alvo:
+        interseção = número de livros em comum; união = |A| + |B| - interseção.
+        Retorna (linhas dos usuários similares, similaridades), sem o próprio usuário.
+        """
+        row = self.user_index.get(usuario_id)
+        items = self.user_items(usuario_id)
+        if row is None or len(items) == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0)
+
+        postings = self.item_rows(items)
+        users, inter = np.unique(postings.indices, return_counts=True)
+        keep = users != row
+        users, inter = users[keep], inter[keep]
+        union = self._degree[row] + self._degree[users] - inter
+        return users.astype(np.int64), inter / union
+
+    def jaccard_with(self, usuario_id, rows):
+        """Similaridade de Jaccard exata entre o usuário e apenas as linhas `rows`."""
+        row = self.user_index.get(usuario_id)
+        rows = np.asarray(rows, dtype=np.int64)
+        rows = rows[rows != row]
+        if row is None or len(rows) == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0)
+
+        sub = self.user_rows(rows)
+        in_target = np.isin(sub.indices, self.user_items(usuario_id))
+        owner = np.repeat(np.arange(len(rows)), np.diff(sub.indptr))
+        inter = np.bincount(owner[in_target], minlength=len(rows))
+        union = self._degree[row] + self._degree[rows] - inter
+        return rows, inter / union
+
+    def popular_among(self, rows, top_n=5, exclude=(), allowed=None):
+        """
+        Livros com mais avaliações entre os usuários `rows`, sem as colunas de `exclude`.
+        Com `allowed`, só essas colunas são contadas. Empates no corte ficam com o
+        menor código.
+        """
+        if len(rows) == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0)
+        sub = self.user_rows(rows)
+        indices, data = sub.indices, sub.data
+        if allowed is not None:
+            keep = np.isin(indices, allowed)
+            indices, data = indices[keep], data[keep]
+        cols, inverse = np.unique(indices, return_inverse=True)
+        counts = np.bincount(inverse, weights=data, minlength=len(cols))
+        keep = ~np.isin(cols, exclude)
+        cols, counts = cols[keep], counts[keep]
+        # Empates pelo menor código, como no lote (scripts.batch_recommendations)
+        best = top_n_entries(np.zeros(len(cols), dtype=np.int64), counts, cols, top_n)
+        return cols[best].astype(np.int64), counts[best]
@@ -0,0 +1,149 @@
+import argparse
+import os
+from functools import cached_property
+
+import numpy as np
+import scipy.sparse as sp
+
+from scripts.artifacts import save_atomic
+from scripts.book_features import one_hot, normalize_rows
+from scripts.config import RecommenderConfig
+
+
+def default_neighbors_dir():
+    return os.path.join(RecommenderConfig.get_instance().ARTIFACTS_DIR, "similares")
+
+
+def item_features(docs, livros, config=None):
+    """
+    Matriz livro x (termos + categorias + autores) com cada bloco normalizado e
+    multiplicado pela raiz do seu peso, de forma que o produto de duas linhas seja
+    PESO_TFIDF * cos(tfidf) + PESO_CATEGORIA * cos(categorias) + PESO_AUTOR * cos(autores).
+    """
+    config = config or RecommenderConfig.get_instance()
+    categorias, _ = one_hot(livros["categories"])
+    autores, _ = one_hot(livros["authors"])
+    blocos = [
+        np.sqrt(config.SIMILARES_PESO_TFIDF) * normalize_rows(docs),
+        np.sqrt(config.SIMILARES_PESO_CATEGORIA) * normalize_rows(categorias),
+        np.sqrt(config.SIMILARES_PESO_AUTOR) * normalize_rows(autores),
+    ]
+    return sp.hstack(blocos, format="csr", dtype=np.float32)
+
+
+def top_k_neighbors(features, k=20, block_size=None):
+    """
+    Top-k vizinhos de cada linha de `features` (similaridade = produto interno).
+
+    A matriz livro x livro nunca é montada inteira: o produto é feito em blocos de
+    linhas (bloco x B), e de cada bloco só ficam os k melhores por linha. Linhas
+    com menos de k vizinhos são completadas com índice -1 e score 0.
+    Retorna (vizinhos int32 B x k, scores float32 B x k).
+    """
+    n = features.shape[0]
+    k = min(k, max(n - 1, 0))
+    # Por padrão, blocos de ~16M células densas (64 MB em float32)
+    block_size = block_size or max(1, (1 << 24) // max(n, 1))
+    transposta = features.T.tocsc()
+    vizinhos = np.full((n, k), -1, dtype=np.int32)
+    scores = np.zeros((n, k), dtype=np.float32)
+    if k == 0:
+        return vizinhos, scores
+
+    for inicio in range(0, n, block_size):
+        fim = min(inicio + block_size, n)
+        bloco = (features[inicio:fim] @ transposta).toarray()
+        # O próprio livro não é vizinho dele mesmo
+        bloco[np.arange(fim - inicio), np.arange(inicio, fim)] = -np.inf
+        melhores = np.argpartition(-bloco, k - 1, axis=1)[:, :k]
+        valores = np.take_along_axis(bloco, melhores, axis=1)
+        ordem = np.argsort(-valores, axis=1, kind="stable")
+        melhores = np.take_along_axis(melhores, ordem, axis=1)
+        valores = np.take_along_axis(valores, ordem, axis=1)
+        validos = valores > 0
+        vizinhos[inicio:fim] = np.where(validos, melhores, -1)
+        scores[inicio:fim] = np.where(validos, valores, 0)
+    return vizinhos, scores
+
+
+def build_item_neighbors(livros, docs, neighbors_dir=None, config=None):
+    """Calcula e salva os vizinhos (isbn13.npy, neighbors.npy, scores.npy)."""
+    config = config or RecommenderConfig.get_instance()
+    neighbors_dir = neighbors_dir or default_neighbors_dir()
+    os.makedirs(neighbors_dir, exist_ok=True)
+    features = item_features(docs, livros, config)
+    vizinhos, scores = top_k_neighbors(
+        features, k=config.SIMILARES_K, block_size=config.SIMILARES_BLOCK_SIZE or None
+    )
+    # Trocas atômicas (os arquivos antigos podem estar em memory-map em outro
+    # worker); scores.npy, que marca os vizinhos como prontos, por último
+    save_atomic(os.path.join(neighbors_dir, "isbn13.npy"), livros["isbn13"].to_numpy(dtype="U13"))
+    save_atomic(os.path.join(neighbors_dir, "neighbors.npy"), vizinhos)
+    save_atomic(os.path.join(neighbors_dir, "scores.npy"), scores)
+    return ItemNeighbors.load(neighbors_dir)
+
+
+class ItemNeighbors:
+    """Vizinhos pré-calculados por livro ("mais como este"), abertos em memory-map."""
+
+    def __init__(self, isbns, neighbors, scores):
+        self.isbns = isbns
+        self.neighbors = neighbors  # int32 livro x k, -1 = sem vizinho
+        self.scores = scores  # float32 livro x k, em ordem decrescente
+
+    @cached_property
+    def row_of(self):
+        """ISBN -> linha, montado só no primeiro uso (é um dicionário do processo)."""
+        return {isbn: i for i, isbn in enumerate(self.isbns.tolist())}
+
+    @classmethod
+    def load(cls, neighbors_dir=None):
+        neighbors_dir = neighbors_dir or default_neighbors_dir()
+        return cls(
+            np.load(os.path.join(neighbors_dir, "isbn13.npy"), mmap_mode="r"),
+            np.load(os.path.join(neighbors_dir, "neighbors.npy"), mmap_mode="r"),
+            np.load(os.path.join(neighbors_dir, "scores.npy"), mmap_mode="r"),
+        )
+
+    @classmethod
+    def load_valid(cls, neighbors_dir, isbns):
+        """Vizinhos salvos em `neighbors_dir`, se forem deste catálogo (`isbns`); senão None."""
+        if not os.path.exists(os.path.join(neighbors_dir, "scores.npy")):
+            return None
+        vizinhos = cls.load(neighbors_dir)
+        return vizinhos if np.array_equal(vizinhos.isbns, isbns) else None
+
+    @classmethod
+    def load_or_build(cls, livros, docs, neighbors_dir=None, config=None):
+        """Abre os vizinhos salvos; se não existirem ou forem de outro catálogo, recalcula."""
+        neighbors_dir = neighbors_dir or default_neighbors_dir()
+        vizinhos = cls.load_valid(neighbors_dir, livros["isbn13"].to_numpy(dtype="U13"))
+        if vizinhos is not None:
+            return vizinhos
+        return build_item_neighbors(livros, docs, neighbors_dir, config)
+
+    def similar(self, isbn13, top_n=10):
+        """Linhas e scores dos livros mais parecidos com `isbn13` (None se não existir)."""
+        row = self.row_of.get(isbn13)
+        if row is None:
+            return None
+        vizinhos = self.neighbors[row, :top_n]
+        validos = vizinhos >= 0
+        return np.asarray(vizinhos[validos]), np.asarray(self.scores[row, :top_n][validos])
+
+
+if __name__ == "__main__":
+    # Etapa offline: python -m scripts.item_neighbors. Os vizinhos (com o índice de
+    # que dependem) são publicados numa versão nova, como em scripts.publish_artifacts
+    from scripts.publish_artifacts import publish
+
+    parser = argparse.ArgumentParser(description="Calcula os livros similares de cada ISBN.")
+    parser.add_argument("--db", default=RecommenderConfig.get_instance().DB_PATH)
+    parser.add_argument("--k", type=int, default=None)
+    args = parser.parse_args()
+
+    config = RecommenderConfig.with_overrides(
+        DB_PATH=args.db, SIMILARES_K=args.k or RecommenderConfig.get_instance().SIMILARES_K
+    )
+    manifest = publish(config)
+    print(f"Vizinhos publicados na versão {manifest['version']}: {manifest['livros']} livros.")
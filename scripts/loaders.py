@@ -0,0 +1,131 @@
+import sqlite3
+
+import pandas as pd
+
+from scripts.config import RecommenderConfig
+
+# Colunas do catálogo usadas para montar as respostas (sem a descrição, que só
+# é lida em streaming quando o índice TF-IDF precisa ser construído)
+CATALOG_COLUMNS = ("isbn13", "title", "authors", "categories", "thumbnail")
+RATING_COLUMNS = ("usuario_id", "isbn13", "nota")
+IMPLICIT_COLUMNS = ("usuario_id", "isbn13", "peso")
+
+# Marcador de alterações de NotasLivros: um contador mantido por triggers, que entra
+# na versão das notas ao lado de (COUNT, MAX(id)). Inserções continuam sendo lidas
+# de forma incremental; um UPDATE (ou DELETE) muda a versão e força a recarga.
+CREATE_RATINGS_MARKER = """
+    CREATE TABLE IF NOT EXISTS NotasLivrosAlteracoes (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        alteracoes INTEGER NOT NULL
+    );
+    INSERT OR IGNORE INTO NotasLivrosAlteracoes (id, alteracoes) VALUES (1, 0);
+    CREATE TRIGGER IF NOT EXISTS NotasLivrosAlterada AFTER UPDATE ON NotasLivros
+    BEGIN
+        UPDATE NotasLivrosAlteracoes SET alteracoes = alteracoes + 1 WHERE id = 1;
+    END;
+    CREATE TRIGGER IF NOT EXISTS NotasLivrosApagada AFTER DELETE ON NotasLivros
+    BEGIN
+        UPDATE NotasLivrosAlteracoes SET alteracoes = alteracoes + 1 WHERE id = 1;
+    END;
+"""
+
+
+def install_ratings_marker(conn):
+    """Cria o marcador de alterações; False se o banco não aceita escrita."""
+    try:
+        conn.executescript(CREATE_RATINGS_MARKER)
+    except sqlite3.OperationalError:
+        return False
+    return True
+
+
+def ratings_version(conn):
+    """(COUNT, MAX(id), nº de alterações) de NotasLivros; 0 alterações sem o marcador."""
+    count, max_id = conn.execute("SELECT COUNT(*), COALESCE(MAX(id), 0) FROM NotasLivros").fetchone()
+    try:
+        linha = conn.execute("SELECT alteracoes FROM NotasLivrosAlteracoes WHERE id = 1").fetchone()
+    except sqlite3.OperationalError:
+        linha = None
+    return count, max_id, linha[0] if linha else 0
+
+
+def _chunk_size(chunk_size):
+    return chunk_size or RecommenderConfig.get_instance().LOAD_CHUNK_SIZE
+
+
+def iter_chunks(conn, sql, params=(), chunk_size=None):
+    """Executa `sql` e devolve o resultado em DataFrames de até `chunk_size` linhas (fetchmany)."""
+    chunk_size = _chunk_size(chunk_size)
+    cursor = conn.execute(sql, params)
+    colunas = [c[0] for c in cursor.description]
+    try:
+        while True:
+            linhas = cursor.fetchmany(chunk_size)
+            if not linhas:
+                break
+            yield pd.DataFrame.from_records(linhas, columns=colunas)
+    finally:
+        cursor.close()
+
+
+def load_catalog(conn, columns=CATALOG_COLUMNS, chunk_size=None):
+    """Catálogo (Biblioteca) só com as colunas pedidas, na ordem do rowid."""
+    sql = f"SELECT {', '.join(columns)} FROM Biblioteca ORDER BY rowid"
+    partes = list(iter_chunks(conn, sql, chunk_size=chunk_size))
+    if not partes:
+        return pd.DataFrame(columns=list(columns))
+    return pd.concat(partes, ignore_index=True)
+
+
+def iter_descriptions(conn, chunk_size=None, offset=0):
+    """
+    Descrições da Biblioteca uma a uma, na mesma ordem de load_catalog; `offset`
+    pula os primeiros livros (ex.: só os novos, para anexar a um índice existente).
+    """
+    sql = "SELECT description FROM Biblioteca ORDER BY rowid LIMIT -1 OFFSET ?"
+    for chunk in iter_chunks(conn, sql, (offset,), chunk_size=chunk_size):
+        yield from chunk["description"].fillna("").tolist()
+
+
+def _iter_since(conn, table, columns, since_id=None, chunk_size=None):
+    sql = f"SELECT {', '.join(columns)} FROM {table}"
+    params = ()
+    if since_id is not None:
+        sql += " WHERE id > ?"
+        params = (since_id,)
+    return iter_chunks(conn, sql + " ORDER BY id", params, chunk_size)
+
+
+def _concat(partes, columns):
+    if not partes:
+        return pd.DataFrame(columns=list(columns))
+    return pd.concat(partes, ignore_index=True)
+
+
+def iter_ratings(conn, columns=RATING_COLUMNS, since_id=None, chunk_size=None):
+    """Notas (NotasLivros) em blocos, só com as colunas pedidas; `since_id` lê apenas id > since_id."""
+    return _iter_since(conn, "NotasLivros", columns, since_id, chunk_size)
+
+
+def load_ratings(conn, columns=RATING_COLUMNS, since_id=None, chunk_size=None):
+    """Como iter_ratings, mas concatenado num DataFrame (para leituras pequenas)."""
+    return _concat(list(iter_ratings(conn, columns, since_id, chunk_size)), columns)
+
+
+def iter_implicit(conn, columns=IMPLICIT_COLUMNS, since_id=None, chunk_size=None):
+    """
+    Interações implícitas com peso (InteracoesImplicitas, gravadas pelo ETL dos
+    aluguéis) em blocos, como iter_ratings; nenhuma se a tabela não existe.
+    """
+    existe = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'InteracoesImplicitas'"
+    ).fetchone()
+    if not existe:
+        return iter(())
+    return _iter_since(conn, "InteracoesImplicitas", columns, since_id, chunk_size)
+
+
+def load_implicit(conn, columns=IMPLICIT_COLUMNS, since_id=None, chunk_size=None):
+    """Como iter_implicit, mas concatenado num DataFrame (para leituras pequenas)."""
+    return _concat(list(iter_implicit(conn, columns, since_id, chunk_size)), columns)
+
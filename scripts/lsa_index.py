@@ -0,0 +1,128 @@
+import json
+import os
+
+import numpy as np
+from sklearn.decomposition import TruncatedSVD
+
+from scripts.artifacts import save_atomic, write_atomic
+from scripts.config import RecommenderConfig
+from scripts.hybrid_blend import top_n_entries
+
+
+def default_lsa_dir():
+    return os.path.join(RecommenderConfig.get_instance().ARTIFACTS_DIR, "lsa")
+
+
+def build_lsa_index(isbns, docs, lsa_dir=None, dims=None, seed=0):
+    """
+    Projeta a matriz TF-IDF (livro x termo) em `dims` dimensões com TruncatedSVD
+    (LSA) e salva os embeddings por livro como um único array float32 contíguo,
+    com as linhas normalizadas (L2), aberto depois em memory-map.
+
+    Só as colunas com algum termo entram no SVD (no modo hashing a largura é
+    2**18, quase toda vazia), e os componentes não são guardados: o índice é
+    refeito quando o catálogo muda.
+    """
+    lsa_dir = lsa_dir or default_lsa_dir()
+    requested = dims or RecommenderConfig.get_instance().LSA_DIMS
+    os.makedirs(lsa_dir, exist_ok=True)
+    usadas = np.unique(np.asarray(docs.indices))
+    matrix = docs[:, usadas]
+    dims = max(1, min(requested, matrix.shape[0] - 1, matrix.shape[1] - 1))
+    embeddings = TruncatedSVD(n_components=dims, random_state=seed).fit_transform(matrix)
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    embeddings = np.ascontiguousarray(embeddings / norms, dtype=np.float32)
+
+    save_atomic(os.path.join(lsa_dir, "embeddings.npy"), embeddings)
+    save_atomic(os.path.join(lsa_dir, "isbn13.npy"), np.asarray(isbns, dtype="U13"))
+    write_atomic(
+        os.path.join(lsa_dir, "lsa.json"),
+        json.dumps({"dims": int(embeddings.shape[1]), "requested": int(requested)}),
+    )
+    return LsaIndex.load(lsa_dir)
+
+
+class LsaIndex:
+    """
+    Embeddings densos (LSA) das descrições, nas mesmas linhas do índice TF-IDF.
+
+    O perfil do usuário é a média dos embeddings dos livros bem avaliados (um
+    vetor denso de `dims` posições) e pontuar o catálogo inteiro é um único
+    produto matriz x vetor em float32 (BLAS), sem percorrer listas invertidas.
+    """
+
+    def __init__(self, isbns, embeddings):
+        self.isbns = isbns
+        self.embeddings = embeddings  # livro x dims, float32, linhas normalizadas
+
+    @property
+    def dims(self):
+        return self.embeddings.shape[1]
+
+    @classmethod
+    def load(cls, lsa_dir=None):
+        lsa_dir = lsa_dir or default_lsa_dir()
+        return cls(
+            np.load(os.path.join(lsa_dir, "isbn13.npy"), mmap_mode="r"),
+            np.load(os.path.join(lsa_dir, "embeddings.npy"), mmap_mode="r"),
+        )
+
+    @classmethod
+    def load_valid(cls, lsa_dir, isbns, dims):
+        """Embeddings salvos em `lsa_dir`, se forem destes livros e dimensão; senão None."""
+        if not os.path.exists(os.path.join(lsa_dir, "lsa.json")):
+            return None
+        with open(os.path.join(lsa_dir, "lsa.json"), encoding="utf-8") as f:
+            pedido = json.load(f)["requested"]
+        index = cls.load(lsa_dir)
+        if pedido == dims and np.array_equal(index.isbns, np.asarray(isbns, dtype="U13")):
+            return index
+        return None
+
+    @classmethod
+    def load_or_build(cls, isbns, docs, lsa_dir=None, dims=None):
+        """Abre os embeddings salvos; se não existirem ou forem de outro catálogo/dimensão, refaz."""
+        lsa_dir = lsa_dir or default_lsa_dir()
+        dims = dims or RecommenderConfig.get_instance().LSA_DIMS
+        index = cls.load_valid(lsa_dir, isbns, dims)
+        if index is not None:
+            return index
+        return build_lsa_index(isbns, docs, lsa_dir, dims)
+
+    def profile(self, rows):
+        """Perfil denso (normalizado) do usuário, ou None se nenhum livro tem embedding."""
+        rows = np.asarray(rows, dtype=np.int64)
+        if len(rows) == 0:
+            return None
+        profile = self.embeddings[rows].mean(axis=0)
+        norm = np.linalg.norm(profile)
+        if norm == 0:
+            return None
+        return (profile / norm).astype(np.float32)
+
+    def profile_block(self, gostou):
+        """
+        Perfis (usuário x dims, normalizados) de várias linhas de `gostou` (usuário x
+        livro, 0/1) num único produto; quem não tem livro com embedding fica zerado.
+        """
+        perfis = np.asarray(gostou @ self.embeddings, dtype=np.float32)
+        normas = np.linalg.norm(perfis, axis=1, keepdims=True)
+        return np.divide(perfis, normas, out=np.zeros_like(perfis), where=normas > 0)
+
+    def top_n(self, profile, top_n=5, exclude_rows=(), candidate_rows=None):
+        """Linhas e cossenos dos `top_n` livros mais próximos do perfil (só scores > 0)."""
+        if candidate_rows is None:
+            scores = self.embeddings @ profile
+            scores[np.asarray(exclude_rows, dtype=np.int64)] = 0
+            rows = np.flatnonzero(scores > 0)
+            scores = scores[rows]
+        else:
+            rows = np.asarray(candidate_rows, dtype=np.int64)
+            scores = self.embeddings[rows] @ profile
+            keep = scores > 0
+            if len(exclude_rows):
+                keep &= ~np.isin(rows, exclude_rows)
+            rows, scores = rows[keep], scores[keep]
+        best = top_n_entries(np.zeros(len(rows), dtype=np.int64), scores, rows, top_n)
+        return rows[best], scores[best]
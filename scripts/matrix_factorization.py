@@ -0,0 +1,215 @@
+import argparse
+import itertools
+import os
+import sqlite3
+
+import numpy as np
+import scipy.sparse as sp
+
+from scripts.artifacts import save_atomic
+from scripts.config import RecommenderConfig
+from scripts.hybrid_blend import top_n_entries
+from scripts.interaction_matrix import InteractionMatrix
+from scripts.loaders import iter_implicit, iter_ratings
+
+
+def default_factors_dir():
+    return os.path.join(RecommenderConfig.get_instance().ARTIFACTS_DIR, "als")
+
+
+def _solve_rows(matrix, fixed, regularization, alpha):
+    """
+    Um passo do ALS implícito (Hu, Koren e Volinsky): para cada linha u de `matrix`
+    resolve (YᵀY + Yᵀ(Cu - I)Y + λI) x = Yᵀ Cu p(u), com Y = `fixed`,
+    confiança Cu = 1 + alpha * r e preferência p(u) = 1 nos itens com interação.
+
+    YᵀY é calculado uma vez; cada linha só soma a correção dos seus próprios itens.
+    """
+    factors = fixed.shape[1]
+    gram = fixed.T @ fixed + regularization * np.eye(factors, dtype=fixed.dtype)
+    result = np.zeros((matrix.shape[0], factors), dtype=fixed.dtype)
+    for u in range(matrix.shape[0]):
+        start, end = matrix.indptr[u], matrix.indptr[u + 1]
+        if start == end:
+            continue
+        cols = matrix.indices[start:end]
+        conf = alpha * matrix.data[start:end]
+        y = fixed[cols]
+        a = gram + (y.T * conf) @ y
+        b = y.T @ (1.0 + conf)
+        result[u] = np.linalg.solve(a, b)
+    return result
+
+
+def train_als(matrix, factors=64, regularization=0.1, alpha=10.0, iterations=10, seed=0):
+    """
+    Fatora a matriz usuário x livro (valores = nº de avaliações) com ALS implícito.
+    Retorna (fatores dos usuários, fatores dos livros), ambos float32.
+    """
+    matrix = sp.csr_matrix(matrix, dtype=np.float32)
+    transposta = matrix.T.tocsr()
+    rng = np.random.default_rng(seed)
+    users = np.zeros((matrix.shape[0], factors), dtype=np.float32)
+    items = (rng.standard_normal((matrix.shape[1], factors)) * 0.01).astype(np.float32)
+    for _ in range(iterations):
+        users = _solve_rows(matrix, items, regularization, alpha)
+        items = _solve_rows(transposta, users, regularization, alpha)
+    return users, items
+
+
+class FactorModel:
+    """
+    Fatores latentes (float32) de usuários e livros, abertos em memory-map.
+
+    Pontuar um usuário é um único produto matriz-vetor (livros x fatores) @ (fatores)
+    seguido de argpartition. Usuários novos ou com notas novas recebem o vetor por
+    "fold-in": um passo do ALS só para eles, com os fatores dos livros fixos.
+    """
+
+    def __init__(self, user_ids, isbns, user_factors, item_factors, regularization=0.1, alpha=10.0):
+        self.user_ids = user_ids
+        self.isbns = isbns
+        self.user_factors = user_factors
+        self.item_factors = item_factors
+        self.regularization = regularization
+        self.alpha = alpha
+        self.user_row = {u: i for i, u in enumerate(np.asarray(user_ids).tolist())}
+        self.item_col = {isbn: i for i, isbn in enumerate(np.asarray(isbns).tolist())}
+        self._folded = {}  # usuario_id -> vetor recalculado depois do treino
+
+    @classmethod
+    def train(cls, interacoes, factors_dir=None, config=None):
+        """Treina sobre a InteractionMatrix atual e salva os fatores em `factors_dir`."""
+        config = config or RecommenderConfig.get_instance()
+        factors_dir = factors_dir or default_factors_dir()
+        os.makedirs(factors_dir, exist_ok=True)
+        users, items = train_als(
+            interacoes.to_csr(),
+            factors=config.ALS_FACTORS,
+            regularization=config.ALS_REGULARIZATION,
+            alpha=config.ALS_ALPHA,
+            iterations=config.ALS_ITERATIONS,
+        )
+        # item_factors.npy (o que load_or_train procura) por último
+        save_atomic(os.path.join(factors_dir, "user_ids.npy"), np.asarray(interacoes.user_ids, dtype=np.int64))
+        save_atomic(os.path.join(factors_dir, "isbn13.npy"), np.asarray(interacoes.isbns, dtype="U13"))
+        save_atomic(os.path.join(factors_dir, "user_factors.npy"), users)
+        save_atomic(os.path.join(factors_dir, "item_factors.npy"), items)
+        return cls.load(factors_dir, config)
+
+    @classmethod
+    def load(cls, factors_dir=None, config=None):
+        config = config or RecommenderConfig.get_instance()
+        factors_dir = factors_dir or default_factors_dir()
+        return cls(
+            np.load(os.path.join(factors_dir, "user_ids.npy")),
+            np.load(os.path.join(factors_dir, "isbn13.npy"), mmap_mode="r"),
+            np.load(os.path.join(factors_dir, "user_factors.npy"), mmap_mode="r"),
+            np.load(os.path.join(factors_dir, "item_factors.npy"), mmap_mode="r"),
+            regularization=config.ALS_REGULARIZATION,
+            alpha=config.ALS_ALPHA,
+        )
+
+    @classmethod
+    def load_valid(cls, factors_dir, config=None):
+        """Fatores salvos em `factors_dir`, ou None se ainda não foram treinados."""
+        if not os.path.exists(os.path.join(factors_dir, "item_factors.npy")):
+            return None
+        return cls.load(factors_dir, config)
+
+    @classmethod
+    def load_or_train(cls, interacoes, factors_dir=None, config=None):
+        """Abre os fatores salvos; se ainda não existirem, treina com as notas atuais."""
+        factors_dir = factors_dir or default_factors_dir()
+        modelo = cls.load_valid(factors_dir, config)
+        if modelo is not None:
+            return modelo
+        return cls.train(interacoes, factors_dir, config)
+
+    def cols_for(self, isbns):
+        """Colunas dos livros no modelo (ignora os que surgiram depois do treino)."""
+        cols = [self.item_col[isbn] for isbn in isbns if isbn in self.item_col]
+        return np.array(cols, dtype=np.int64)
+
+    def fold_in(self, usuario_id, cols, counts=None):
+        """
+        Recalcula o vetor do usuário a partir de todos os livros com que ele interagiu
+        (`cols` = colunas do modelo; -1 para livros que surgiram depois do treino).
+        """
+        cols = np.asarray(cols, dtype=np.int64)
+        counts = np.ones(len(cols), dtype=np.float32) if counts is None else np.asarray(counts, dtype=np.float32)
+        known = cols >= 0
+        if not known.any():
+            self._folded.pop(usuario_id, None)
+            return
+        cols = cols[known]
+        row = sp.csr_matrix(
+            (counts[known], (np.zeros(len(cols), dtype=np.int64), cols)),
+            shape=(1, len(self.isbns)),
+        )
+        row.sum_duplicates()
+        row.sort_indices()
+        self._folded[usuario_id] = _solve_rows(
+            row, np.asarray(self.item_factors), self.regularization, self.alpha
+        )[0]
+
+    def user_vector(self, usuario_id):
+        vector = self._folded.get(usuario_id)
+        if vector is not None:
+            return vector
+        row = self.user_row.get(usuario_id)
+        if row is None:
+            return None
+        return self.user_factors[row]
+
+    def user_matrix(self, usuario_ids):
+        """
+        Vetores (usuário x fatores) de vários usuários, como `user_vector`, e a
+        máscara de quem tem vetor (as linhas dos demais ficam zeradas).
+        """
+        vetores = np.zeros((len(usuario_ids), self.item_factors.shape[1]), dtype=np.float32)
+        tem = np.zeros(len(usuario_ids), dtype=bool)
+        for i, usuario_id in enumerate(usuario_ids):
+            vector = self.user_vector(usuario_id)
+            if vector is not None:
+                vetores[i], tem[i] = vector, True
+        return vetores, tem
+
+    def top_n(self, usuario_id, top_n=5, exclude_cols=(), candidate_cols=None):
+        """
+        Livros (colunas, scores) com maior produto interno com o vetor do usuário.
+        Com `candidate_cols`, o produto usa só as linhas desses livros.
+        """
+        vector = self.user_vector(usuario_id)
+        if vector is None:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        if candidate_cols is None:
+            cols = np.arange(len(self.item_factors))
+            scores = self.item_factors @ vector
+        else:
+            cols = np.asarray(candidate_cols, dtype=np.int64)
+            scores = self.item_factors[cols] @ vector
+        if len(exclude_cols):
+            keep = ~np.isin(cols, exclude_cols)
+            cols, scores = cols[keep], scores[keep]
+        # Empates no corte ficam com a menor coluna, como no lote
+        best = top_n_entries(np.zeros(len(cols), dtype=np.int64), scores, cols, top_n)
+        return cols[best].astype(np.int64), scores[best]
+
+
+if __name__ == "__main__":
+    # Treino offline: python -m scripts.matrix_factorization
+    parser = argparse.ArgumentParser(description="Treina os fatores latentes (ALS implícito).")
+    parser.add_argument("--db", default=RecommenderConfig.get_instance().DB_PATH)
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.db)
+    interacoes = InteractionMatrix.from_chunks(
+        itertools.chain(iter_ratings(conn, columns=("usuario_id", "isbn13")), iter_implicit(conn))
+    )
+    conn.close()
+    modelo = FactorModel.train(interacoes)
+    print(
+        f"Fatores treinados: {modelo.user_factors.shape[0]} usuários, "
+        f"{modelo.item_factors.shape[0]} livros, {modelo.item_factors.shape[1]} fatores."
+    )
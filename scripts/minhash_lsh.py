@@ -0,0 +1,145 @@
+import numpy as np
+import scipy.sparse as sp
+
+# Primo logo acima de 2^32: com a, b < 2^32 e ids < 2^31, a*x + b cabe em uint64
+PRIME = np.uint64(4294967311)
+EMPTY = np.uint64(np.iinfo(np.uint64).max)
+
+
+class MinHashLSH:
+    """
+    Assinaturas MinHash por usuário (sobre os ids inteiros dos livros avaliados)
+    e buckets LSH em bandas, para achar vizinhos candidatos sem comparar com todos.
+
+    Dois usuários caem no mesmo bucket de uma banda quando as `num_perm / bands`
+    posições daquela banda coincidem; a chance disso cresce com a similaridade
+    de Jaccard. As assinaturas são atualizadas incrementalmente: avaliar um livro
+    custa O(num_perm) e só re-indexa as bandas que mudaram.
+    """
+
+    def __init__(self, num_perm=128, bands=64, seed=1):
+        if num_perm % bands != 0:
+            raise ValueError("num_perm deve ser múltiplo de bands.")
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows_per_band = num_perm // bands
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, 2**32, size=num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, 2**32, size=num_perm, dtype=np.uint64)
+
+        self.signatures = np.full((0, num_perm), EMPTY, dtype=np.uint64)
+        self._buckets = [dict() for _ in range(bands)]  # chave da banda -> usuários
+        self._keys = {}  # usuário -> chaves registradas, uma por banda
+
+    def _hashes(self, items):
+        """Matriz len(items) x num_perm com as permutações aplicadas aos ids."""
+        items = np.asarray(items, dtype=np.uint64).reshape(-1, 1)
+        return (self._a * items + self._b) % PRIME
+
+    def _grow(self, n_users):
+        if n_users > len(self.signatures):
+            extra = np.full((n_users - len(self.signatures), self.num_perm), EMPTY, dtype=np.uint64)
+            self.signatures = np.vstack([self.signatures, extra])
+
+    def _band_keys(self, user):
+        sig = self.signatures[user]
+        return [
+            sig[b * self.rows_per_band : (b + 1) * self.rows_per_band].tobytes()
+            for b in range(self.bands)
+        ]
+
+    def _reindex(self, user):
+        new_keys = self._band_keys(user)
+        old_keys = self._keys.get(user)
+        for band, key in enumerate(new_keys):
+            if old_keys is not None:
+                if old_keys[band] == key:
+                    continue
+                bucket = self._buckets[band].get(old_keys[band])
+                if bucket is not None:
+                    bucket.discard(user)
+                    if not bucket:
+                        del self._buckets[band][old_keys[band]]
+            self._buckets[band].setdefault(key, set()).add(user)
+        self._keys[user] = new_keys
+
+    def add(self, user, items):
+        """Incorpora livros (ids inteiros) à assinatura do usuário `user` (linha inteira)."""
+        if len(items) == 0:
+            return
+        self._grow(user + 1)
+        new_sig = np.minimum(self.signatures[user], self._hashes(items).min(axis=0))
+        if user in self._keys and np.array_equal(new_sig, self.signatures[user]):
+            return
+        self.signatures[user] = new_sig
+        self._reindex(user)
+
+    def add_many(self, users, items):
+        """Atualiza várias avaliações (pares usuário, livro) de uma vez."""
+        users = np.asarray(users, dtype=np.int64)
+        items = np.asarray(items, dtype=np.int64)
+        order = np.argsort(users, kind="stable")
+        users, items = users[order], items[order]
+        starts = np.flatnonzero(np.r_[True, users[1:] != users[:-1]])
+        ends = np.r_[starts[1:], len(users)]
+        for start, end in zip(starts.tolist(), ends.tolist()):
+            self.add(int(users[start]), items[start:end])
+
+    @classmethod
+    def from_csr(cls, matrix, chunk_size=4096, **kwargs):
+        """Constrói as assinaturas de todas as linhas de uma matriz CSR usuário x livro."""
+        lsh = cls(**kwargs)
+        n_users = matrix.shape[0]
+        lsh._grow(n_users)
+        for start in range(0, n_users, chunk_size):
+            block = matrix[start : start + chunk_size]
+            filled = np.flatnonzero(np.diff(block.indptr))
+            if len(filled) == 0:
+                continue
+            hashes = lsh._hashes(block.indices)
+            mins = np.minimum.reduceat(hashes, block.indptr[filled], axis=0)
+            lsh.signatures[start + filled] = mins
+        for user in np.flatnonzero(np.diff(matrix.indptr)).tolist():
+            lsh._reindex(user)
+        return lsh
+
+    def candidates(self, user):
+        """Usuários que compartilham ao menos um bucket com `user` (sem ele mesmo)."""
+        keys = self._keys.get(user)
+        if keys is None:
+            return np.zeros(0, dtype=np.int64)
+        found = set()
+        for band, key in enumerate(keys):
+            found.update(self._buckets[band].get(key, ()))
+        found.discard(user)
+        return np.fromiter(found, dtype=np.int64, count=len(found))
+
+    def candidate_pairs(self, n_users=None):
+        """
+        Matriz CSR usuário x usuário (0/1) com os pares que compartilham algum
+        bucket, como `candidates` para todos os usuários de uma vez (para o lote):
+        em cada banda, os usuários com as mesmas posições formam um grupo, e
+        (usuário x grupo) @ (grupo x usuário) marca os pares.
+        """
+        n_users = len(self.signatures) if n_users is None else n_users
+        users = np.fromiter(self._keys, dtype=np.int64, count=len(self._keys))
+        pares = sp.csr_matrix((n_users, n_users), dtype=np.float32)
+        if len(users) == 0:
+            return pares
+        for band in range(self.bands):
+            fatia = self.signatures[users, band * self.rows_per_band : (band + 1) * self.rows_per_band]
+            _, grupo = np.unique(fatia, axis=0, return_inverse=True)
+            membros = sp.csr_matrix(
+                (np.ones(len(users), dtype=np.float32), (users, grupo.ravel())),
+                shape=(n_users, grupo.max() + 1),
+            )
+            pares = pares + membros @ membros.T
+        pares = sp.csr_matrix(pares - sp.diags(pares.diagonal()))
+        pares.eliminate_zeros()
+        pares.data[:] = 1.0
+        return pares
+
+    def estimate(self, user, others):
+        """Estimativa da similaridade de Jaccard pela fração de posições iguais."""
+        others = np.asarray(others, dtype=np.int64)
+        return (self.signatures[others] == self.signatures[user]).mean(axis=1)
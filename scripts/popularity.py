@@ -0,0 +1,113 @@
+import numpy as np
+import pandas as pd
+
+from scripts.book_features import one_hot
+from scripts.loaders import iter_chunks
+
+
+def load_rating_totals(conn, isbns, peso_interno=1.0, chunk_size=None):
+    """
+    Soma e quantidade de notas de cada livro de `isbns`, juntando as notas externas
+    da Biblioteca (average_rating x ratings_count) com as de NotasLivros (cada nota
+    interna vale `peso_interno` avaliações). Retorna dois arrays float64 alinhados.
+    """
+    linha = pd.Index(isbns)
+    soma = np.zeros(len(linha))
+    contagem = np.zeros(len(linha))
+    consultas = (
+        ("SELECT isbn13, average_rating, ratings_count FROM Biblioteca", 1.0),
+        ("SELECT isbn13, AVG(nota), COUNT(*) FROM NotasLivros GROUP BY isbn13", peso_interno),
+    )
+    for sql, peso in consultas:
+        for chunk in iter_chunks(conn, sql, chunk_size=chunk_size):
+            linhas = linha.get_indexer(chunk["isbn13"])
+            media = pd.to_numeric(chunk.iloc[:, 1], errors="coerce").to_numpy(dtype=np.float64)
+            n = pd.to_numeric(chunk.iloc[:, 2], errors="coerce").fillna(0).to_numpy() * peso
+            validos = (linhas >= 0) & (n > 0) & ~np.isnan(media)
+            np.add.at(soma, linhas[validos], media[validos] * n[validos])
+            np.add.at(contagem, linhas[validos], n[validos])
+    return soma, contagem
+
+
+def bayesian_average(soma, contagem, prior=0):
+    """
+    Média bayesiana (C * m + soma) / (C + n): a média global m pesa como `prior`
+    avaliações (0 = mediana das contagens dos livros avaliados), então livros com
+    poucas notas ficam perto de m em vez de subir com uma única nota 5.
+    """
+    soma = np.asarray(soma, dtype=np.float64)
+    contagem = np.asarray(contagem, dtype=np.float64)
+    avaliados = contagem > 0
+    if not avaliados.any():
+        return np.zeros(len(soma))
+    media_global = soma.sum() / contagem.sum()
+    prior = prior or float(np.median(contagem[avaliados]))
+    return (prior * media_global + soma) / (prior + contagem)
+
+
+class PopularityRanking:
+    """
+    Ranking de popularidade pré-calculado para quem ainda não tem notas (cold start).
+
+    As linhas do índice TF-IDF ficam ordenadas uma vez pela média bayesiana; cada
+    categoria guarda a sua fatia já ordenada (CSC livro x categoria sobre as
+    posições do ranking). Servir o top-N é uma fatia de array; com candidatos
+    (curso/semestre), só eles são ordenados pela posição pré-calculada.
+    """
+
+    def __init__(self, rows, scores, categorias=None, rotulos=()):
+        self.rows = np.asarray(rows, dtype=np.int32)  # linhas em ordem de popularidade
+        self.scores = np.asarray(scores, dtype=np.float32)  # score de cada posição
+        self.posicao = np.empty(len(self.rows), dtype=np.int32)  # linha -> posição no ranking
+        self.posicao[self.rows] = np.arange(len(self.rows), dtype=np.int32)
+        self.categorias = categorias  # CSC posição x categoria
+        self.coluna_categoria = {rotulo: i for i, rotulo in enumerate(list(rotulos))}
+
+    def __len__(self):
+        return len(self.rows)
+
+    @classmethod
+    def build(cls, soma, contagem, categorias=None, prior=0):
+        """
+        Ordena os livros (linhas do índice TF-IDF) pela média bayesiana; `categorias`
+        é a coluna categories dos livros nessas mesmas linhas.
+        """
+        scores = bayesian_average(soma, contagem, prior)
+        rows = np.argsort(-scores, kind="stable")
+        if categorias is None:
+            return cls(rows, scores[rows])
+        matriz, rotulos = one_hot(categorias)
+        return cls(rows, scores[rows], matriz[rows].tocsc(), rotulos)
+
+    def _posicoes(self, categoria=None, candidatos=None):
+        """Posições do ranking elegíveis, em ordem (None = todas)."""
+        posicoes = None
+        if categoria is not None:
+            coluna = self.coluna_categoria.get(categoria)
+            if coluna is None or self.categorias is None:
+                return np.zeros(0, dtype=np.int32)
+            indptr = self.categorias.indptr
+            posicoes = self.categorias.indices[indptr[coluna] : indptr[coluna + 1]]
+        if candidatos is not None:
+            candidatas = np.sort(self.posicao[np.asarray(candidatos, dtype=np.int64)])
+            if posicoes is not None:
+                candidatas = candidatas[np.isin(candidatas, posicoes)]
+            posicoes = candidatas
+        return posicoes
+
+    def top(self, top_n, categoria=None, candidatos=None, exclude=None):
+        """
+        Linhas e scores dos `top_n` livros mais populares (da categoria e/ou entre os
+        candidatos), sem as linhas de `exclude`.
+        """
+        exclude = np.zeros(0, dtype=np.int64) if exclude is None else np.asarray(exclude)
+        posicoes = self._posicoes(categoria, candidatos)
+        fim = top_n + len(exclude)
+        if posicoes is None:
+            rows, scores = self.rows[:fim], self.scores[:fim]
+        else:
+            rows, scores = self.rows[posicoes[:fim]], self.scores[posicoes[:fim]]
+        if len(exclude):
+            manter = ~np.isin(rows, exclude)
+            rows, scores = rows[manter], scores[manter]
+        return rows[:top_n], scores[:top_n]
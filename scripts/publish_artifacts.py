@@ -0,0 +1,118 @@
+import argparse
+import datetime
+import os
+import shutil
+
+from scripts.artifacts import (
+    current_version,
+    list_versions,
+    runtime_dir,
+    set_current,
+    version_dir,
+    write_manifest,
+)
+from scripts.config import RecommenderConfig
+from scripts.getRecommendations import RecommenderEngine
+from scripts.item_neighbors import ItemNeighbors
+from scripts.matrix_factorization import FactorModel
+
+
+def _files(directory):
+    """Arquivos da versão (caminho relativo -> tamanho em bytes), para o manifesto."""
+    arquivos = {}
+    for raiz, _, nomes in os.walk(directory):
+        for nome in sorted(nomes):
+            caminho = os.path.join(raiz, nome)
+            arquivos[os.path.relpath(caminho, directory)] = os.path.getsize(caminho)
+    return dict(sorted(arquivos.items()))
+
+
+def publish(config=None, version=None, activate=True, als=False):
+    """
+    Constrói todos os artefatos (dicionário de ids, índice TF-IDF, vizinhos dos
+    livros e, com `als` ou COLABORATIVO = "als", os fatores) numa versão nova em
+    ARTIFACTS_DIR/versions/<versão>, grava o manifesto e, com `activate`, aponta
+    CURRENT para ela. A versão é montada num diretório temporário e só aparece
+    completa (rename), então nenhum worker abre uma versão pela metade.
+    """
+    config = config or RecommenderConfig.get_instance()
+    version = version or datetime.datetime.now().strftime("%Y%m%dT%H%M%S")
+    destino = version_dir(config.ARTIFACTS_DIR, version)
+    if os.path.exists(destino):
+        raise ValueError(f"Versão de artefatos já existe: {version}")
+    # Fora de versions/, para não aparecer em list_versions enquanto é montada
+    tmp = os.path.join(config.ARTIFACTS_DIR, f".building-{version}")
+    shutil.rmtree(tmp, ignore_errors=True)
+
+    # Motor apontado para o diretório temporário (layout sem versões): a carga
+    # constrói e salva tudo o que ele usa
+    build_config = RecommenderConfig.with_overrides(**{**vars(config), "ARTIFACTS_DIR": tmp})
+    engine = RecommenderEngine(build_config)
+    engine.refresh(force=True)
+    ItemNeighbors.load_or_build(
+        engine.livros, engine.tfidf_index.docs, engine.neighbors_dir, build_config
+    )
+    if als and engine.fatores is None:
+        FactorModel.train(engine.interacoes, engine.factors_dir, build_config)
+
+    manifest = {
+        "version": version,
+        "created_at": datetime.datetime.now().isoformat(timespec="seconds"),
+        "catalog_version": list(engine.catalog_version),
+        "ratings_version": list(engine.ratings_version),
+        "implicit_version": list(engine.implicit_version),
+        "tfidf_mode": build_config.TFIDF_MODE,
+        "livros": int(engine.tfidf_index.docs.shape[0]),
+        "usuarios": int(engine.ids.n_users),
+        "files": _files(tmp),
+    }
+    write_manifest(tmp, manifest)
+    os.makedirs(os.path.dirname(destino), exist_ok=True)
+    os.rename(tmp, destino)
+    if activate:
+        set_current(config.ARTIFACTS_DIR, version)
+    return manifest
+
+
+def prune(artifacts_dir, keep):
+    """
+    Apaga as versões mais antigas (com o que os workers gravaram em runtime/ para
+    elas), mantendo as `keep` mais novas e a atual.
+    """
+    atual = current_version(artifacts_dir)
+    versoes = [m["version"] for m in list_versions(artifacts_dir)]
+    removidas = [v for v in versoes[: max(len(versoes) - keep, 0)] if v != atual]
+    for versao in removidas:
+        shutil.rmtree(version_dir(artifacts_dir, versao))
+        shutil.rmtree(runtime_dir(artifacts_dir, versao), ignore_errors=True)
+    return removidas
+
+
+if __name__ == "__main__":
+    # python -m scripts.publish_artifacts                 -> nova versão e CURRENT nela
+    # python -m scripts.publish_artifacts --list          -> versões publicadas
+    # python -m scripts.publish_artifacts --use <versão>  -> rollback (só troca o ponteiro)
+    parser = argparse.ArgumentParser(description="Publica versões dos artefatos do recomendador.")
+    parser.add_argument("--version", default=None, help="nome da versão (padrão: data e hora)")
+    parser.add_argument("--no-activate", action="store_true", help="não aponta CURRENT para a versão nova")
+    parser.add_argument("--als", action="store_true", help="treina também os fatores ALS")
+    parser.add_argument("--list", action="store_true")
+    parser.add_argument("--use", default=None, metavar="VERSAO")
+    parser.add_argument("--keep", type=int, default=0, help="apaga versões antigas além das N mais novas")
+    args = parser.parse_args()
+
+    config = RecommenderConfig.get_instance()
+    if args.list:
+        atual = current_version(config.ARTIFACTS_DIR)
+        for m in list_versions(config.ARTIFACTS_DIR):
+            marca = "*" if m["version"] == atual else " "
+            print(f"{marca} {m['version']}  {m['created_at']}  livros={m['livros']} usuarios={m['usuarios']}")
+    elif args.use:
+        set_current(config.ARTIFACTS_DIR, args.use)
+        print(f"CURRENT -> {args.use}")
+    else:
+        manifest = publish(config, args.version, activate=not args.no_activate, als=args.als)
+        print(f"Versão publicada: {manifest['version']} ({len(manifest['files'])} arquivos).")
+    if args.keep:
+        for versao in prune(config.ARTIFACTS_DIR, args.keep):
+            print(f"Versão removida: {versao}")
@@ -0,0 +1,87 @@
+import sqlite3
+
+import numpy as np
+import pandas as pd
+
+from scripts.book_features import one_hot
+
+# Bibliografia por curso/semestre (tabela BibliografiaSemestre, criada por
+# bd/connect.py): cada linha indica um livro (isbn13) ou uma categoria inteira da
+# Biblioteca (categoria) recomendada naquele semestre
+
+
+def table_version(conn):
+    """(COUNT, MAX(rowid)) de BibliografiaSemestre, ou None se a tabela não existe."""
+    try:
+        return conn.execute(
+            "SELECT COUNT(*), COALESCE(MAX(rowid), 0) FROM BibliografiaSemestre"
+        ).fetchone()
+    except sqlite3.OperationalError:
+        return None
+
+
+class SemesterIndex:
+    """
+    Conjuntos de candidatos por curso/semestre, pré-calculados como arrays int32
+    ordenados de linhas do índice TF-IDF. Com um curso (e semestre) informado, as
+    recomendações pontuam apenas essa fatia do catálogo em vez do acervo inteiro.
+    """
+
+    def __init__(self, slices=None):
+        self.slices = slices or {}  # (curso, semestre) -> linhas int32 ordenadas
+
+    @classmethod
+    def from_table(cls, bibliografia, livros):
+        """
+        Monta as fatias a partir das linhas de BibliografiaSemestre e dos livros na
+        ordem do índice TF-IDF (colunas isbn13 e categories).
+        """
+        if bibliografia is None or bibliografia.empty:
+            return cls()
+        linha_isbn = pd.Index(livros["isbn13"])
+        categorias, nomes = one_hot(livros["categories"])
+        por_categoria = categorias.T.tocsr()  # categoria x livro
+        coluna_categoria = {nome: i for i, nome in enumerate(nomes.tolist())}
+
+        partes = {}
+        for curso, semestre, isbn13, categoria in bibliografia[
+            ["curso", "semestre", "isbn13", "categoria"]
+        ].itertuples(index=False, name=None):
+            semestre = None if pd.isna(semestre) else int(semestre)
+            linhas = partes.setdefault((curso, semestre), [])
+            if isinstance(isbn13, str):
+                linha = linha_isbn.get_indexer([isbn13])[0]
+                if linha >= 0:
+                    linhas.append(np.array([linha]))
+            if isinstance(categoria, str) and categoria.strip() in coluna_categoria:
+                c = coluna_categoria[categoria.strip()]
+                linhas.append(por_categoria.indices[por_categoria.indptr[c] : por_categoria.indptr[c + 1]])
+
+        slices = {}
+        for chave, linhas in partes.items():
+            slices[chave] = np.unique(np.concatenate(linhas)).astype(np.int32) if linhas else np.zeros(0, dtype=np.int32)
+        # Curso inteiro (todos os semestres), para pedidos sem semestre
+        for curso in {curso for curso, _ in slices}:
+            slices[(curso, None)] = np.unique(
+                np.concatenate([rows for (c, _), rows in slices.items() if c == curso])
+            ).astype(np.int32)
+        return cls(slices)
+
+    @classmethod
+    def from_db(cls, conn, livros):
+        """Lê BibliografiaSemestre; sem a tabela, não há fatias (catálogo inteiro)."""
+        if table_version(conn) is None:
+            return cls()
+        bibliografia = pd.read_sql(
+            "SELECT curso, semestre, isbn13, categoria FROM BibliografiaSemestre", conn
+        )
+        return cls.from_table(bibliografia, livros)
+
+    def rows(self, curso=None, semestre=None):
+        """
+        Linhas candidatas do curso/semestre; None quando não há filtro (catálogo
+        inteiro). Curso ou semestre sem bibliografia cadastrada dá um array vazio.
+        """
+        if curso is None:
+            return None
+        return self.slices.get((curso, semestre), np.zeros(0, dtype=np.int32))
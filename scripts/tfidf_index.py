@@ -0,0 +1,311 @@
+import json
+import os
+from functools import cached_property
+
+import numpy as np
+import scipy.sparse as sp
+from sklearn.feature_extraction.text import HashingVectorizer, TfidfVectorizer
+
+from scripts.artifacts import save_atomic, write_atomic
+from scripts.book_features import normalize_rows
+from scripts.config import RecommenderConfig
+from scripts.hybrid_blend import top_n_entries
+
+
+# Arquivos .npy de cada matriz salva por save_csr ({nome}_{parte}.npy)
+CSR_PARTS = ("data", "indices", "indptr", "shape")
+
+
+def default_index_dir():
+    return os.path.join(RecommenderConfig.get_instance().ARTIFACTS_DIR, "tfidf")
+
+
+def save_csr(directory, name, matrix):
+    """
+    Salva uma matriz CSR em arquivos .npy separados (data, indices, indptr e shape),
+    para que possa ser aberta depois com memory-map, sem copiar para a memória.
+    Cada arquivo é trocado de uma vez: quem já abriu a versão anterior em
+    memory-map (outro worker) continua lendo o arquivo antigo.
+    """
+    matrix = sp.csr_matrix(matrix)
+    matrix.sort_indices()
+    save_atomic(os.path.join(directory, f"{name}_data.npy"), matrix.data)
+    save_atomic(os.path.join(directory, f"{name}_indices.npy"), matrix.indices)
+    save_atomic(os.path.join(directory, f"{name}_indptr.npy"), matrix.indptr)
+    save_atomic(os.path.join(directory, f"{name}_shape.npy"), np.array(matrix.shape))
+
+
+def load_csr(directory, name, mmap_mode="r"):
+    """Abre uma matriz salva por `save_csr`, por padrão em modo memory-map (somente leitura)."""
+    shape = tuple(int(x) for x in np.load(os.path.join(directory, f"{name}_shape.npy")))
+    data = np.load(os.path.join(directory, f"{name}_data.npy"), mmap_mode=mmap_mode)
+    indices = np.load(os.path.join(directory, f"{name}_indices.npy"), mmap_mode=mmap_mode)
+    indptr = np.load(os.path.join(directory, f"{name}_indptr.npy"), mmap_mode=mmap_mode)
+    return sp.csr_matrix((data, indices, indptr), shape=shape, copy=False)
+
+
+def _remove(index_dir, *names):
+    for name in names:
+        path = os.path.join(index_dir, name)
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def build_tfidf_index(livros, index_dir=None, descricoes=None, mode=None, n_features=None):
+    """
+    Ajusta o TfidfVectorizer uma única vez sobre todas as descrições da Biblioteca
+    e salva vocabulário, pesos IDF e a matriz documento x termo em disco.
+
+    `descricoes` pode ser um iterável (ex.: loaders.iter_descriptions) na ordem de
+    `livros`, para não manter todas as descrições em memória; sem ele, usa a
+    coluna description de `livros`.
+
+    Além da matriz por livro, salva a transposta (termo x livro), usada como
+    índice invertido: pontuar um perfil só percorre as listas dos termos do perfil.
+
+    Com `mode="hashing"` (ou TFIDF_MODE), delega para build_hashing_index.
+    """
+    config = RecommenderConfig.get_instance()
+    if (mode or config.TFIDF_MODE) == "hashing":
+        return build_hashing_index(livros, index_dir, descricoes, n_features)
+    index_dir = index_dir or default_index_dir()
+    os.makedirs(index_dir, exist_ok=True)
+    if descricoes is None:
+        descricoes = livros["description"].fillna("").tolist()
+
+    tfidf = TfidfVectorizer(stop_words="english")
+    matrix = tfidf.fit_transform(descricoes).astype(np.float32)
+
+    # Cada arquivo é trocado de uma vez (outros processos podem tê-lo aberto em
+    # memory-map), e isbn13.npy, que marca o índice como pronto, vai por último
+    vocabulary = {termo: int(idx) for termo, idx in tfidf.vocabulary_.items()}
+    write_atomic(os.path.join(index_dir, "vocabulary.json"), json.dumps(vocabulary))
+    save_atomic(os.path.join(index_dir, "idf.npy"), tfidf.idf_.astype(np.float32))
+    save_csr(index_dir, "docs", matrix)
+    save_csr(index_dir, "postings", matrix.T.tocsr())
+    _remove(index_dir, "hashing.json", "df.npy", *(f"counts_{p}.npy" for p in CSR_PARTS))
+    save_atomic(os.path.join(index_dir, "isbn13.npy"), livros["isbn13"].to_numpy(dtype="U13"))
+    return TfidfIndex.load(index_dir)
+
+
+def hashing_vectorizer(n_features):
+    """
+    Termos -> colunas por hash, com a mesma tokenização do TfidfVectorizer acima.
+    Não aprende vocabulário: a largura é fixa e novos textos não exigem refit.
+    Devolve contagens brutas (sem sinal alternado nem normalização).
+    """
+    return HashingVectorizer(
+        n_features=n_features, stop_words="english", alternate_sign=False, norm=None
+    )
+
+
+def smooth_idf(df, n_docs):
+    """IDF suavizado do TfidfVectorizer: ln((1 + n) / (1 + df)) + 1."""
+    return (np.log((1.0 + n_docs) / (1.0 + np.asarray(df, dtype=np.float64))) + 1.0).astype(
+        np.float32
+    )
+
+
+def _save_hashing_index(index_dir, isbns, counts, df, n_features):
+    """Salva contagens, frequência dos termos (df) e a matriz TF-IDF ponderada por elas."""
+    os.makedirs(index_dir, exist_ok=True)
+    idf = smooth_idf(df, counts.shape[0])
+    weighted = counts.copy()
+    weighted.data = weighted.data * idf[weighted.indices]
+    matrix = normalize_rows(weighted)
+
+    # Como em build_tfidf_index: trocas atômicas e isbn13.npy por último
+    write_atomic(os.path.join(index_dir, "hashing.json"), json.dumps({"n_features": int(n_features)}))
+    save_atomic(os.path.join(index_dir, "df.npy"), np.asarray(df, dtype=np.int64))
+    save_atomic(os.path.join(index_dir, "idf.npy"), idf)
+    save_csr(index_dir, "counts", counts)
+    save_csr(index_dir, "docs", matrix)
+    save_csr(index_dir, "postings", matrix.T.tocsr())
+    _remove(index_dir, "vocabulary.json")
+    save_atomic(os.path.join(index_dir, "isbn13.npy"), np.asarray(isbns, dtype="U13"))
+    return TfidfIndex.load(index_dir)
+
+
+def _hashed_counts(descricoes, n_features):
+    counts = hashing_vectorizer(n_features).transform(descricoes)
+    return sp.csr_matrix(counts, dtype=np.float32)
+
+
+def build_hashing_index(livros, index_dir=None, descricoes=None, n_features=None):
+    """
+    Variante de build_tfidf_index com termos por hash (HASHING_N_FEATURES colunas fixas).
+
+    O IDF é mantido à parte, como contagem de documentos por coluna (df.npy), e as
+    contagens brutas ficam salvas: livros novos são vetorizados e anexados por
+    TfidfIndex.append sem reprocessar o catálogo, e a memória do vocabulário não
+    cresce com ele.
+    """
+    index_dir = index_dir or default_index_dir()
+    n_features = n_features or RecommenderConfig.get_instance().HASHING_N_FEATURES
+    if descricoes is None:
+        descricoes = livros["description"].fillna("").tolist()
+    counts = _hashed_counts(descricoes, n_features)
+    df = np.bincount(counts.indices, minlength=n_features)
+    return _save_hashing_index(index_dir, livros["isbn13"].to_numpy(dtype="U13"), counts, df, n_features)
+
+
+class TfidfIndex:
+    """Índice TF-IDF pré-construído do catálogo, aberto em memory-map."""
+
+    def __init__(self, isbns, docs, postings, idf=None, counts=None, df=None, n_features=None):
+        self.isbns = isbns
+        self.docs = docs  # livro x termo, linhas normalizadas (L2)
+        self.postings = postings  # termo x livro (índice invertido)
+        self.idf = idf
+        # Só no modo "hashing": contagens brutas, df por coluna e largura do hash
+        self.counts = counts
+        self.df = df
+        self.n_features = n_features
+
+    @cached_property
+    def row_of(self):
+        """ISBN -> linha, montado só no primeiro uso (é um dicionário do processo)."""
+        return {isbn: i for i, isbn in enumerate(self.isbns.tolist())}
+
+    @property
+    def mode(self):
+        return "vocabulary" if self.n_features is None else "hashing"
+
+    @classmethod
+    def load(cls, index_dir=None):
+        index_dir = index_dir or default_index_dir()
+        isbns = np.load(os.path.join(index_dir, "isbn13.npy"), mmap_mode="r")
+        idf = np.load(os.path.join(index_dir, "idf.npy"), mmap_mode="r")
+        hashing = {}
+        if os.path.exists(os.path.join(index_dir, "hashing.json")):
+            with open(os.path.join(index_dir, "hashing.json"), encoding="utf-8") as f:
+                hashing = dict(
+                    n_features=json.load(f)["n_features"],
+                    counts=load_csr(index_dir, "counts"),
+                    df=np.load(os.path.join(index_dir, "df.npy")),
+                )
+        return cls(
+            isbns,
+            load_csr(index_dir, "docs"),
+            load_csr(index_dir, "postings"),
+            idf=idf,
+            **hashing,
+        )
+
+    @classmethod
+    def load_valid(cls, index_dir, mode, n_features, isbns=None):
+        """
+        Índice salvo em `index_dir`, se existir e tiver sido construído no mesmo
+        TFIDF_MODE / largura de hash (e, com `isbns`, para esses livros); senão None.
+        """
+        if not os.path.exists(os.path.join(index_dir, "isbn13.npy")):
+            return None
+        index = cls.load(index_dir)
+        if index.mode != mode or (mode == "hashing" and index.n_features != n_features):
+            return None
+        if isbns is not None and not np.array_equal(index.isbns, isbns):
+            return None
+        return index
+
+    @classmethod
+    def load_or_build(cls, livros, index_dir=None, descricoes=None, mode=None, n_features=None):
+        """
+        Abre o índice salvo; se ainda não existir (ou foi construído em outro
+        TFIDF_MODE / largura de hash), constrói a partir de `livros`.
+        """
+        config = RecommenderConfig.get_instance()
+        index_dir = index_dir or default_index_dir()
+        mode = mode or config.TFIDF_MODE
+        n_features = n_features or config.HASHING_N_FEATURES
+        index = cls.load_valid(index_dir, mode, n_features)
+        if index is not None:
+            return index
+        return build_tfidf_index(livros, index_dir, descricoes, mode=mode, n_features=n_features)
+
+    def append(self, livros, descricoes, index_dir=None):
+        """
+        Modo "hashing": anexa os livros novos (`livros` com isbn13, `descricoes` na
+        mesma ordem) vetorizando só eles. O df é somado, e as linhas existentes só
+        são reponderadas com o novo IDF (as contagens salvas não são re-tokenizadas).
+        """
+        if self.mode != "hashing":
+            raise ValueError("Só índices no modo hashing aceitam livros novos sem refit.")
+        index_dir = index_dir or default_index_dir()
+        novos = _hashed_counts(descricoes, self.n_features)
+        counts = sp.vstack([self.counts, novos], format="csr", dtype=np.float32)
+        df = self.df + np.bincount(novos.indices, minlength=self.n_features)
+        isbns = np.concatenate([np.asarray(self.isbns), livros["isbn13"].to_numpy(dtype="U13")])
+        return _save_hashing_index(index_dir, isbns, counts, df, self.n_features)
+
+    def rows_for(self, isbns):
+        """Converte ISBNs em linhas do índice, ignorando os que não estão no catálogo."""
+        rows = [self.row_of[isbn] for isbn in isbns if isbn in self.row_of]
+        return np.array(rows, dtype=np.int64)
+
+    def user_profile(self, isbns):
+        """
+        Perfil do usuário: média das linhas dos livros informados.
+        O custo depende apenas de quantos livros o usuário avaliou.
+        Retorna None se nenhum dos livros tiver descrição vetorizada.
+        """
+        rows = self.rows_for(isbns)
+        if len(rows) == 0:
+            return None
+        weights = sp.csr_matrix(np.full((1, len(rows)), 1.0 / len(rows)))
+        profile = weights @ self.docs[rows]
+        if profile.nnz == 0:
+            return None
+        return profile
+
+    def score(self, profile):
+        """
+        Similaridade de cosseno entre o perfil e os livros do catálogo.
+
+        Percorre só as listas invertidas dos termos do perfil, então apenas os livros
+        que compartilham algum termo com ele são tocados. Retorna (linhas, scores).
+        """
+        scores = self.score_block(profile)
+        return scores.indices.astype(np.int64), scores.data.astype(np.float64)
+
+    def score_block(self, profiles):
+        """
+        Cossenos (CSR perfil x livro) de vários perfis (linhas esparsas, ex.: um
+        bloco de usuários do lote) com o catálogo, num único produto com o índice
+        invertido; como em `score`, só aparecem os livros com algum termo em comum.
+        """
+        return sp.csr_matrix(normalize_rows(profiles) @ self.postings)
+
+    def score_rows(self, profile, rows):
+        """Cosseno entre o perfil e apenas os livros das linhas `rows` (fatia do catálogo)."""
+        rows = np.asarray(rows, dtype=np.int64)
+        norm = np.sqrt(profile.multiply(profile).sum())
+        scores = np.asarray((self.docs[rows] @ profile.T).todense()).ravel() / norm
+        keep = scores > 0
+        return rows[keep], scores[keep]
+
+    def top_n(self, profile, top_n=5, exclude=(), exclude_rows=None, candidate_rows=None):
+        """
+        Seleciona os `top_n` livros mais similares ao perfil, sem os de `exclude` (ISBNs).
+        Com `candidate_rows`, só essas linhas são pontuadas.
+        """
+        if candidate_rows is None:
+            rows, scores = self.score(profile)
+        else:
+            rows, scores = self.score_rows(profile, candidate_rows)
+        if exclude_rows is None:
+            exclude_rows = self.rows_for(exclude)
+        if len(exclude_rows):
+            keep = ~np.isin(rows, exclude_rows)
+            rows, scores = rows[keep], scores[keep]
+        best = top_n_entries(np.zeros(len(rows), dtype=np.int64), scores, rows, top_n)
+        return rows[best], scores[best]
+
+
+if __name__ == "__main__":
+    # Etapa de construção do índice: python -m scripts.tfidf_index. O índice é
+    # publicado numa versão nova (como python -m scripts.publish_artifacts), nunca
+    # regravado no lugar de uma versão que os workers estão servindo
+    from scripts.publish_artifacts import publish
+
+    manifest = publish()
+    print(f"Índice TF-IDF publicado na versão {manifest['version']}: {manifest['livros']} livros.")
@@ -0,0 +1,192 @@
+import os
+
+import numpy as np
+import scipy.sparse as sp
+
+from scripts.artifacts import save_atomic
+from scripts.tfidf_index import load_csr, save_csr
+
+
+class UserProfileStore:
+    """
+    Perfis TF-IDF por usuário guardados como soma dos vetores dos livros bem
+    avaliados + quantidade de livros, em vez de recalcular a média a cada pedido.
+
+    A carga inicial monta todas as somas com um único produto esparso
+    (usuário x livro) @ (livro x termo). Depois, cada nota positiva nova (ou
+    alterada) soma ou subtrai a linha do livro no perfil do usuário, em O(nnz)
+    da linha. O perfil servido é soma / quantidade.
+
+    A carga inicial fica em matrizes CSR (gravadas por `save` e abertas em
+    memory-map por `load`); só os usuários alterados depois dela ganham uma
+    cópia própria em dicionário.
+    """
+
+    def __init__(self, docs, base=None, positivas=None, usuarios=None):
+        self.docs = docs  # livro x termo (índice TF-IDF do catálogo)
+        # Carga inicial em arrays (abertos em memory-map quando vêm de save):
+        # soma dos vetores e nº de notas positivas por (usuário, livro), com as
+        # linhas na ordem de `usuarios` (ids ordenados, busca binária)
+        self._base = base if base is not None else sp.csr_matrix((0, docs.shape[1]), dtype=np.float32)
+        self._positivas = (
+            positivas if positivas is not None else sp.csr_matrix((0, docs.shape[0]), dtype=np.float32)
+        )
+        self._usuarios = usuarios if usuarios is not None else np.zeros(0, dtype=np.int64)
+        self._sums = {}  # usuario_id -> {termo: peso}, perfis alterados depois da carga
+        self._books = {}  # usuario_id -> {linha do livro: nº de notas positivas}, idem
+
+    @classmethod
+    def from_pairs(cls, docs, usuario_ids, rows):
+        """Carga inicial a partir de pares (usuário, linha do livro) com nota positiva."""
+        usuario_ids = np.asarray(usuario_ids, dtype=np.int64)
+        rows = np.asarray(rows, dtype=np.int64)
+        if len(rows) == 0:
+            return cls(docs)
+        usuarios, codes = np.unique(usuario_ids, return_inverse=True)
+        positivas = sp.csr_matrix(
+            (np.ones(len(rows), dtype=np.float32), (codes, rows)),
+            shape=(len(usuarios), docs.shape[0]),
+        )
+        positivas.sum_duplicates()
+        # Cada livro conta uma vez por usuário, como na média antiga
+        indicador = positivas.copy()
+        indicador.data[:] = 1.0
+        return cls(docs, (indicador @ docs).tocsr(), positivas, usuarios)
+
+    def save(self, directory):
+        """Grava a carga inicial (somas, notas positivas e usuários) para abrir em memory-map."""
+        save_csr(directory, "perfis", self._base)
+        save_csr(directory, "positivas", self._positivas)
+        save_atomic(os.path.join(directory, "perfis_usuarios.npy"), self._usuarios)
+
+    @classmethod
+    def load(cls, directory, docs):
+        return cls(
+            docs,
+            load_csr(directory, "perfis"),
+            load_csr(directory, "positivas"),
+            np.load(os.path.join(directory, "perfis_usuarios.npy"), mmap_mode="r"),
+        )
+
+    def _base_row(self, usuario_id):
+        """Linha do usuário na carga inicial, ou None."""
+        pos = int(np.searchsorted(self._usuarios, usuario_id))
+        if pos < len(self._usuarios) and self._usuarios[pos] == usuario_id:
+            return pos
+        return None
+
+    def _base_books(self, usuario_id):
+        """Linhas dos livros e nº de notas positivas do usuário na carga inicial."""
+        row = self._base_row(usuario_id)
+        if row is None:
+            return np.zeros(0, dtype=np.int64), np.zeros(0)
+        start, end = self._positivas.indptr[row], self._positivas.indptr[row + 1]
+        return self._positivas.indices[start:end].astype(np.int64), self._positivas.data[start:end]
+
+    def rated_rows(self, usuario_id):
+        """Linhas dos livros que compõem o perfil do usuário."""
+        books = self._books.get(usuario_id)
+        if books is None:
+            return self._base_books(usuario_id)[0]
+        return np.fromiter(books.keys(), dtype=np.int64, count=len(books))
+
+    def rated_matrix(self, usuario_ids):
+        """
+        Indicador (CSR usuário x livro, 0/1) das linhas de `rated_rows` de cada
+        usuário de `usuario_ids`, para pontuar vários usuários com produtos de
+        matrizes (lote). Só os usuários alterados depois da carga são lidos um a um.
+        """
+        usuario_ids = np.asarray(usuario_ids, dtype=np.int64)
+        pos = np.searchsorted(self._usuarios, usuario_ids)
+        pos = np.minimum(pos, max(len(self._usuarios) - 1, 0))
+        na_base = np.zeros(len(usuario_ids), dtype=bool)
+        if len(self._usuarios):
+            na_base = np.asarray(self._usuarios)[pos] == usuario_ids
+        alterados = np.isin(usuario_ids, np.fromiter(self._books, dtype=np.int64, count=len(self._books)))
+        da_base = np.flatnonzero(na_base & ~alterados)
+        sub = self._positivas[pos[da_base]].tocoo()
+        linhas, cols = [da_base[sub.row]], [sub.col.astype(np.int64)]
+        for i in np.flatnonzero(alterados).tolist():
+            books = self._books[int(usuario_ids[i])]
+            linhas.append(np.full(len(books), i, dtype=np.int64))
+            cols.append(np.fromiter(books.keys(), dtype=np.int64, count=len(books)))
+        linhas, cols = np.concatenate(linhas), np.concatenate(cols)
+        return sp.csr_matrix(
+            (np.ones(len(linhas), dtype=np.float32), (linhas, cols)),
+            shape=(len(usuario_ids), self.docs.shape[0]),
+        )
+
+    def _editable_books(self, usuario_id):
+        """Livros do usuário como dicionário, copiando da carga inicial na primeira alteração."""
+        books = self._books.get(usuario_id)
+        if books is None:
+            rows, counts = self._base_books(usuario_id)
+            books = dict(zip(rows.tolist(), [int(c) for c in counts.tolist()]))
+            self._books[usuario_id] = books
+        return books
+
+    def _editable(self, usuario_id):
+        """Soma do usuário como dicionário, copiando da carga inicial na primeira alteração."""
+        soma = self._sums.get(usuario_id)
+        if soma is None:
+            soma = {}
+            base_row = self._base_row(usuario_id)
+            if base_row is not None:
+                linha = self._base[base_row]
+                soma = dict(zip(linha.indices.tolist(), linha.data.tolist()))
+            self._sums[usuario_id] = soma
+        return soma
+
+    def _accumulate(self, usuario_id, row, sign):
+        soma = self._editable(usuario_id)
+        start, end = self.docs.indptr[row], self.docs.indptr[row + 1]
+        for termo, peso in zip(
+            self.docs.indices[start:end].tolist(), self.docs.data[start:end].tolist()
+        ):
+            soma[termo] = soma.get(termo, 0.0) + sign * peso
+
+    def add(self, usuario_id, row):
+        """Registra uma nota positiva do usuário para o livro da linha `row`."""
+        books = self._editable_books(usuario_id)
+        books[row] = books.get(row, 0) + 1
+        if books[row] == 1:
+            self._accumulate(usuario_id, row, 1.0)
+
+    def remove(self, usuario_id, row):
+        """Desfaz uma nota positiva (ex.: a nota foi alterada para menos de 4)."""
+        books = self._editable_books(usuario_id)
+        if row not in books:
+            return
+        books[row] -= 1
+        if books[row] == 0:
+            del books[row]
+            self._accumulate(usuario_id, row, -1.0)
+
+    def update_rating(self, usuario_id, row, nota_anterior, nota, nota_positiva=4):
+        """Ajusta o perfil quando uma linha de NotasLivros é inserida (nota_anterior=None) ou alterada."""
+        era_positiva = nota_anterior is not None and nota_anterior >= nota_positiva
+        if era_positiva and nota < nota_positiva:
+            self.remove(usuario_id, row)
+        elif not era_positiva and nota >= nota_positiva:
+            self.add(usuario_id, row)
+
+    def profile(self, usuario_id):
+        """Perfil médio (1 x termos) do usuário, ou None se ele não tem livros positivos."""
+        count = len(self.rated_rows(usuario_id))
+        if count == 0:
+            return None
+        soma = self._sums.get(usuario_id)
+        if soma is None:
+            profile = self._base[self._base_row(usuario_id)] / count
+        else:
+            termos = np.fromiter(soma.keys(), dtype=np.int64, count=len(soma))
+            pesos = np.fromiter(soma.values(), dtype=np.float64, count=len(soma))
+            keep = np.abs(pesos) > 1e-9
+            profile = sp.csr_matrix(
+                (pesos[keep] / count, (np.zeros(keep.sum(), dtype=np.int64), termos[keep])),
+                shape=(1, self.docs.shape[1]),
+            )
+        profile = sp.csr_matrix(profile)
+        if profile.nnz == 0:
+            return None
+        return profile